@@ -0,0 +1,80 @@
+"""
+Compares images/second of the per-frame `SybilModel.detect()` path against
+batched `SybilModel.infer_batch()`.
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m benchmarks.batch_inference --weights PATH/TO/best.onnx --batch-sizes 1 2 4 8
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from models.SYBIL import SybilModel
+
+
+def load_frames(image_dir, count, height=480, width=640):
+    """Loads up to `count` images from a folder, or makes synthetic frames if no folder is given."""
+    if image_dir is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+    import cv2
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    frames = [cv2.imread(str(p)) for p in paths[:count]]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        raise FileNotFoundError(f"No readable images found in: {image_dir}")
+    return frames
+
+
+def time_per_frame(model, frames, conf):
+    model.detect(frames[0], conf_threshold=conf)  # Warm-up
+    t0 = time.perf_counter()
+    for frame in frames:
+        model.detect(frame, conf_threshold=conf)
+    return len(frames) / (time.perf_counter() - t0)
+
+
+def time_batched(model, frames, conf, batch_size=None, latency_budget_ms=None):
+    model.infer_batch(frames[:batch_size or 1], conf_threshold=conf, batch_size=batch_size)  # Warm-up
+    t0 = time.perf_counter()
+    model.infer_batch(frames, conf_threshold=conf, batch_size=batch_size,
+                      latency_budget_ms=latency_budget_ms)
+    return len(frames) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched SYBIL inference")
+    parser.add_argument("--weights", required=True, help="path to .pt or .onnx weights")
+    parser.add_argument("--backend", default="auto", choices=["auto", "ultralytics", "onnxruntime"])
+    parser.add_argument("--images", default=None, help="folder of images (default: synthetic 640x480 frames)")
+    parser.add_argument("--frames", type=int, default=64, help="number of frames to run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency-budget", type=float, default=None,
+                        help="also benchmark the adaptive batch size for this budget (ms)")
+    parser.add_argument("--conf", type=float, default=0.531)
+    args = parser.parse_args()
+
+    model = SybilModel(args.weights, backend=args.backend)
+    frames = load_frames(args.images, args.frames)
+
+    rows = [("per-frame detect()", time_per_frame(model, frames, args.conf))]
+    for batch_size in args.batch_sizes:
+        rows.append((f"infer_batch(batch_size={batch_size})",
+                     time_batched(model, frames, args.conf, batch_size=batch_size)))
+    if args.latency_budget is not None:
+        ips = time_batched(model, frames, args.conf, latency_budget_ms=args.latency_budget)
+        rows.append((f"infer_batch(budget={args.latency_budget:g} ms) -> size {model._batch_sizer.size}", ips))
+
+    baseline = rows[0][1]
+    print(f"\n{len(frames)} frames, backend={model.backend}")
+    print(f"{'mode':<45}{'images/s':>10}{'speed-up':>10}")
+    for name, ips in rows:
+        print(f"{name:<45}{ips:>10.2f}{ips / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmarks the batch deprojection functions in utils/depth_ops against the
+per-box loop used by the nodes. If pyrealsense2 is installed, the batch
+results are also checked against the SDK.
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m benchmarks.deprojection --boxes 50 --model inverse_brown_conrady
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+try:
+    import pyrealsense2 as rs
+except ImportError:
+    rs = None
+
+from utils.depth_ops import (
+    PinholeIntrinsics,
+    bbox_to_xyz_xywh,
+    bbox_real_world_size,
+    bboxes_to_xyz,
+    bboxes_real_world_size
+)
+
+
+def make_inputs(num_boxes, seed=0):
+    rng = np.random.default_rng(seed)
+    depth = rng.integers(300, 4000, (480, 640)).astype(np.uint16)
+    depth[rng.random((480, 640)) < 0.05] = 0  # Holes, like a real depth map
+
+    centers = rng.uniform([20, 20], [620, 460], (num_boxes, 2))
+    sizes = rng.uniform(10, 80, (num_boxes, 2))
+    boxes_xywh = np.concatenate([centers, sizes], axis=1).astype(np.float32)
+    boxes_xyxy = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1).astype(np.float32)
+    return depth, boxes_xyxy, boxes_xywh
+
+
+def to_rs_intrinsics(intrinsics):
+    rs_intrinsics = rs.intrinsics()
+    rs_intrinsics.width, rs_intrinsics.height = intrinsics.width, intrinsics.height
+    rs_intrinsics.fx, rs_intrinsics.fy = intrinsics.fx, intrinsics.fy
+    rs_intrinsics.ppx, rs_intrinsics.ppy = intrinsics.ppx, intrinsics.ppy
+    rs_intrinsics.model = getattr(rs.distortion, intrinsics.model)
+    rs_intrinsics.coeffs = intrinsics.coeffs
+    return rs_intrinsics
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch deprojection")
+    parser.add_argument("--boxes", type=int, default=50)
+    parser.add_argument("--model", default="inverse_brown_conrady",
+                        choices=["none", "brown_conrady", "inverse_brown_conrady", "ftheta", "kannala_brandt4"])
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    coeffs = [0.02, -0.05, 0.001, -0.001, 0.01] if args.model != "ftheta" else [0.9, 0, 0, 0, 0]
+    intrinsics = PinholeIntrinsics(640, 480, 615.0, 615.0, 320.0, 240.0, args.model, coeffs)
+    depth, boxes_xyxy, boxes_xywh = make_inputs(args.boxes)
+    depth_scale = 0.001
+
+    def batch():
+        bboxes_to_xyz(boxes_xywh, depth, intrinsics, depth_scale)
+        bboxes_real_world_size(boxes_xyxy, boxes_xywh, depth, intrinsics, depth_scale)
+
+    batch_ms = best_of(batch, args.repeats)
+    print(f"{args.boxes} boxes, distortion model '{args.model}'")
+    print(f"  batch (NumPy):       {batch_ms:8.3f} ms")
+
+    if rs is None:
+        print("  per-box (SDK):       skipped, pyrealsense2 is not installed")
+        return
+
+    rs_intrinsics = to_rs_intrinsics(intrinsics)
+
+    def per_box():
+        for xyxy, xywh in zip(boxes_xyxy, boxes_xywh):
+            bbox_to_xyz_xywh(xywh, depth, rs_intrinsics, depth_scale)
+            bbox_real_world_size(xyxy, xywh, depth, rs_intrinsics, depth_scale)
+
+    loop_ms = best_of(per_box, args.repeats)
+    print(f"  per-box (SDK):       {loop_ms:8.3f} ms  ({loop_ms / batch_ms:.1f}x slower)")
+
+    # Agreement with the SDK on the boxes that have valid depth
+    xyz = bboxes_to_xyz(boxes_xywh, depth, intrinsics, depth_scale)
+    sizes = bboxes_real_world_size(boxes_xyxy, boxes_xywh, depth, intrinsics, depth_scale)
+    max_err = 0.0
+    for i, (xyxy, xywh) in enumerate(zip(boxes_xyxy, boxes_xywh)):
+        ref_xyz = bbox_to_xyz_xywh(xywh, depth, rs_intrinsics, depth_scale)
+        if ref_xyz is None:
+            continue
+        ref_size = bbox_real_world_size(xyxy, xywh, depth, rs_intrinsics, depth_scale)
+        max_err = max(max_err, np.abs(xyz[i] - ref_xyz).max(), np.abs(sizes[i] - ref_size).max())
+    print(f"  max abs difference vs SDK: {max_err:.2e} m")
+
+
+if __name__ == "__main__":
+    main()
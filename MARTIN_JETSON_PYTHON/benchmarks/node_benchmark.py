@@ -0,0 +1,273 @@
+"""
+End-to-end latency and throughput benchmark for the SYBIL node.
+
+Drives the node loop (serial or pipelined) from recorded or synthetic frames.
+It reports per-stage latency percentiles, frame-to-detection latency,
+sustained FPS and dropped frames. Results are saved as JSON and can be
+compared against a stored baseline.
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m benchmarks.node_benchmark --weights PATH/TO/best.onnx --source replay \
+        --recording recordings/roadside_01 --replay-rate max --out bench.json
+    python -m benchmarks.node_benchmark --weights PATH/TO/best.onnx --baseline bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from sensors.frame_source import add_source_arguments, open_source
+from models.SYBIL import SybilModel
+from models.detections import Detections
+from utils.depth_ops import (
+    bboxes_to_xyz,
+    bboxes_real_world_size,
+    DepthStats
+)
+from utils.pipeline import SybilPipeline, model_stage_timings
+
+STAGES = ["acquire", "align", "preprocess", "forward", "nms", "deproject", "render"]
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(values_ms):
+    """Returns mean and p50/p95/p99 (ms) for a list of samples."""
+    if not values_ms:
+        return None
+    values = np.asarray(values_ms, dtype=np.float64)
+    summary = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    summary["mean"] = float(values.mean())
+    summary["count"] = int(values.size)
+    return summary
+
+
+def render(rgb, detections):
+    """Draws the detections on a copy of the frame, as the camera node does (no window)."""
+    import cv2
+    canvas = rgb.copy()
+    for (x1, y1, x2, y2), conf in zip(detections.xyxy.astype(int), detections.conf):
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(canvas, f"litter {conf:.2f}", (x1, max(0, y1 - 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    return canvas
+
+
+class FrameLog:
+    """Collects per-frame stage timings and end-to-end latency, skipping warm-up frames."""
+
+    def __init__(self, warmup: int):
+        self.warmup = warmup
+        self.seen = 0
+        self.stages = {stage: [] for stage in STAGES}
+        self.end_to_end = []
+        self.done_times = []
+
+    def add(self, timings, captured_at, done_at):
+        self.seen += 1
+        if self.seen <= self.warmup:
+            return
+        for stage, value in timings.items():
+            if stage in self.stages:
+                self.stages[stage].append(value)
+        self.end_to_end.append((done_at - captured_at) * 1000)
+        self.done_times.append(done_at)
+
+    def fps(self):
+        if len(self.done_times) < 2:
+            return 0.0
+        return (len(self.done_times) - 1) / (self.done_times[-1] - self.done_times[0])
+
+
+def run_serial(source, model, args, log):
+    intrinsics = source.get_intrinsics()
+    depth_scale = source.get_depth_scale()
+    aligner = source.get_depth_aligner()
+
+    while True:
+        t0 = time.perf_counter()
+        rgb, depth = source.get_frames()
+        captured_at = time.perf_counter()
+        if rgb is None:
+            if source.finished:
+                return 0
+            continue
+
+        timings = {"acquire": (captured_at - t0) * 1000}
+        timings.update(source.last_timings)
+
+        detections = model.detect(rgb, conf_threshold=args.conf)
+        timings.update(model_stage_timings(detections.speed))
+
+        if aligner is not None:
+            t1 = time.perf_counter()
+            depth = aligner.align_boxes(depth, detections.xyxy)
+            timings["align"] = (time.perf_counter() - t1) * 1000
+
+        t1 = time.perf_counter()
+        depths_m = DepthStats(depth, depth_scale).robust_depth(detections.xyxy) if args.roi_depth else None
+        bboxes_to_xyz(detections.xywh, depth, intrinsics, depth_scale, depths_m)
+        bboxes_real_world_size(detections.xyxy, detections.xywh, depth, intrinsics, depth_scale, depths_m)
+        t2 = time.perf_counter()
+        timings["deproject"] = (t2 - t1) * 1000
+
+        if args.render:
+            render(rgb, detections)
+            timings["render"] = (time.perf_counter() - t2) * 1000
+
+        log.add(timings, captured_at, time.perf_counter())
+
+
+def run_pipelined(source, model, args, log):
+    def on_frame(packet, detections):
+        if args.render:
+            t0 = time.perf_counter()
+            render(packet["rgb"], Detections(packet["boxes_xyxy"], packet["conf"]))
+            packet["timings"]["render"] = (time.perf_counter() - t0) * 1000
+        log.add(packet["timings"], packet["captured_at"], time.perf_counter())
+
+    pipeline = SybilPipeline(source, model, source.get_intrinsics(), source.get_depth_scale(),
+                             queue_size=args.queue_size, conf_threshold=args.conf,
+                             roi_depth=args.roi_depth, on_frame=on_frame,
+                             lossless=args.replay_rate == "max")
+    pipeline.start()
+    while pipeline.is_running():
+        time.sleep(0.05)
+    pipeline.stop()
+
+    stats = pipeline.stats()
+    return stats["dropped_before_inference"] + stats["dropped_before_postprocess"]
+
+
+def build_report(args, model, log, dropped):
+    return {
+        "meta": {
+            "mode": args.mode,
+            "source": args.source,
+            "recording": args.recording,
+            "weights": args.weights,
+            "backend": model.backend,
+            "roi_depth": args.roi_depth,
+            "align": args.align,
+            "render": args.render,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages_ms": {stage: summarize(values) for stage, values in log.stages.items() if values},
+        "end_to_end_ms": summarize(log.end_to_end),
+        "fps": log.fps(),
+        "frames_processed": len(log.end_to_end),
+        "dropped_frames": dropped,
+    }
+
+
+def compare(report, baseline, tolerance, min_delta_ms=0.5):
+    """
+    Compares a report against a baseline report. Latencies count as
+    regressions only if they grow by more than `tolerance` (relative)
+    and by more than `min_delta_ms`, so sub-millisecond noise is ignored.
+
+    Returns
+    -------
+    rows : list
+        (metric, baseline, current, change, regressed) tuples.
+    """
+    rows = []
+
+    def check(name, base, current, higher_is_better=False):
+        if base is None or current is None or base == 0:
+            return
+        change = (current - base) / base
+        if higher_is_better:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance and current - base > min_delta_ms
+        rows.append((name, base, current, change, regressed))
+
+    for stage, summary in report["stages_ms"].items():
+        base = baseline["stages_ms"].get(stage)
+        if base:
+            check(f"{stage} p95 (ms)", base["p95"], summary["p95"])
+
+    if report["end_to_end_ms"] and baseline.get("end_to_end_ms"):
+        for p in ("p50", "p95", "p99"):
+            check(f"end-to-end {p} (ms)", baseline["end_to_end_ms"][p], report["end_to_end_ms"][p])
+    check("FPS", baseline.get("fps"), report["fps"], higher_is_better=True)
+    return rows
+
+
+def print_report(report):
+    print(f"\nFrames processed: {report['frames_processed']}   "
+          f"FPS: {report['fps']:.2f}   Dropped frames: {report['dropped_frames']}")
+    print(f"{'stage':<14}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}")
+    rows = list(report["stages_ms"].items()) + [("end-to-end", report["end_to_end_ms"])]
+    for name, summary in rows:
+        if summary:
+            print(f"{name:<14}{summary['p50']:>9.2f}{summary['p95']:>9.2f}"
+                  f"{summary['p99']:>9.2f}{summary['mean']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SYBIL node end to end")
+    parser.add_argument("--weights", required=True, help="path to .pt or .onnx weights")
+    parser.add_argument("--backend", default="auto", choices=["auto", "ultralytics", "onnxruntime"])
+    parser.add_argument("--mode", default="serial", choices=["serial", "pipeline"])
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--conf", type=float, default=0.531)
+    parser.add_argument("--roi-depth", action="store_true")
+    parser.add_argument("--render", action="store_true", help="also time annotating the frame")
+    parser.add_argument("--warmup", type=int, default=10, help="frames excluded from the statistics")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative change that counts as a regression (default 10%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="latency increases smaller than this are never regressions")
+    add_source_arguments(parser)
+    parser.set_defaults(source="synthetic", replay_rate="max")
+    args = parser.parse_args()
+
+    source = open_source(args)
+    model = SybilModel(args.weights, backend=args.backend)
+    log = FrameLog(args.warmup)
+
+    try:
+        if args.mode == "pipeline":
+            dropped = run_pipelined(source, model, args, log)
+        else:
+            dropped = run_serial(source, model, args, log)
+    finally:
+        source.stop()
+    dropped += getattr(source, "frames_skipped", 0)
+
+    report = build_report(args, model, log, dropped)
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.tolerance, args.min_delta_ms)
+
+        print(f"\nComparison with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for name, base, current, change, regressed in rows:
+            flag = "REGRESSION" if regressed else "ok"
+            print(f"  {name:<24}{base:>10.2f} -> {current:>10.2f}  ({change:+.1%})  {flag}")
+
+        if any(row[-1] for row in rows):
+            print("❌ Performance regression detected")
+            sys.exit(1)
+        print("✅ No regression")
+
+
+if __name__ == "__main__":
+    main()
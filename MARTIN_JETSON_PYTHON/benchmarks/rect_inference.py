@@ -0,0 +1,188 @@
+"""
+Compares square (letterboxed to 640x640) and rectangular (480x640)
+inference on replayed RealSense frames.
+
+For each path it reports the mean and p95 `detect()` latency. It also
+reports how closely the rectangular detections agree with the square ones:
+the share of square detections matched at --iou, extra detections, the
+mean IoU and confidence change of matched boxes, and the median distance
+between their 3D positions (deprojected with the recording's depth). The
+last one checks that boxes still map onto the right depth pixels. With
+--split, recall and precision against the test labels (letterboxed into
+640x480 frames) are added.
+
+Two ways to get a rectangular model:
+    --square best.onnx --rect best_480x640.onnx   two exports of the same weights
+    --square best_dynamic.onnx                    one dynamic export, run both ways
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m benchmarks.rect_inference --square PATH/TO/best.onnx \
+        --rect PATH/TO/best_480x640.onnx --recording recordings/roadside_01 --out rect.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.sliced_inference import letterbox, load_labels, load_split
+from models.SYBIL import SybilModel
+from sensors.recording import ReplaySource
+from utils.depth_ops import bboxes_to_xyz
+from utils.filtering import iou_matrix, linear_assignment
+
+
+def load_frames(recording, limit=None, step=1):
+    """Returns every `step`-th (rgb, depth) pair of a recording, plus its intrinsics and depth scale."""
+    source = ReplaySource(recording, rate="max")
+    frames = []
+    index = 0
+    while limit is None or len(frames) < limit:
+        rgb, depth = source.get_frames()
+        if rgb is None:
+            break
+        if index % step == 0:
+            frames.append((rgb, depth))
+        index += 1
+    return frames, source.get_intrinsics(), source.get_depth_scale()
+
+
+def input_shape(model, frame_shape):
+    """(height, width) of the model input used for a frame, when the backend tells."""
+    shape_for = getattr(model.model, "input_shape_for", None)
+    return list(shape_for(frame_shape)) if shape_for else None
+
+
+def run(model, images, conf):
+    """Runs `detect()` on every image; returns the detections and latencies (ms)."""
+    model.detect(images[0], conf_threshold=conf)  # Warm-up
+    detections, latencies = [], []
+    for image in images:
+        t0 = time.perf_counter()
+        detections.append(model.detect(image, conf_threshold=conf))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies = np.asarray(latencies)
+    return detections, {"mean": float(latencies.mean()), "p95": float(np.percentile(latencies, 95))}
+
+
+def match(reference_xyxy, candidate_xyxy, iou_threshold):
+    """Matches two box sets one-to-one by IoU; returns (rows, cols, ious)."""
+    if not len(reference_xyxy) or not len(candidate_xyxy):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    ious = iou_matrix(reference_xyxy, candidate_xyxy)
+    rows, cols = linear_assignment(1.0 - ious, 1.0 - iou_threshold)
+    return rows, cols, ious[rows, cols]
+
+
+def agreement(reference, candidate, frames, intrinsics, depth_scale, iou_threshold):
+    """How closely `candidate` detections reproduce `reference` ones, frame by frame."""
+    matched = ref_total = extra = 0
+    ious, conf_deltas, xyz_deltas = [], [], []
+    for ref, cand, (_, depth) in zip(reference, candidate, frames):
+        rows, cols, pair_ious = match(ref.xyxy, cand.xyxy, iou_threshold)
+        matched += len(rows)
+        ref_total += len(ref)
+        extra += len(cand) - len(cols)
+        ious.extend(pair_ious.tolist())
+        conf_deltas.extend((cand.conf[cols] - ref.conf[rows]).tolist())
+        if len(rows):
+            ref_xyz = bboxes_to_xyz(ref.xywh[rows], depth, intrinsics, depth_scale)
+            cand_xyz = bboxes_to_xyz(cand.xywh[cols], depth, intrinsics, depth_scale)
+            distance = np.linalg.norm(cand_xyz - ref_xyz, axis=1)
+            xyz_deltas.extend(distance[np.isfinite(distance)].tolist())
+
+    return {
+        "matched": matched / ref_total if ref_total else None,
+        "extra": extra,
+        "mean_iou": float(np.mean(ious)) if ious else None,
+        "mean_conf_delta": float(np.mean(conf_deltas)) if conf_deltas else None,
+        "median_xyz_delta_mm": float(np.median(xyz_deltas)) * 1000 if xyz_deltas else None,
+    }
+
+
+def label_scores(detections, truths, iou_threshold):
+    """Recall and precision of detections against labelled boxes."""
+    hits = found = predicted = 0
+    for dets, truth in zip(detections, truths):
+        rows, _, _ = match(truth, dets.xyxy, iou_threshold)
+        hits += len(rows)
+        found += len(truth)
+        predicted += len(dets)
+    return {"recall": hits / found if found else None, "precision": hits / predicted if predicted else None}
+
+
+def _fmt(value, spec, width):
+    return ("-" if value is None else format(value, spec)).rjust(width)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark square vs rectangular (640x480-native) inference")
+    parser.add_argument("--square", required=True, help="square-input .onnx (or a dynamic export, run both ways)")
+    parser.add_argument("--rect", default=None,
+                        help="rectangular .onnx, e.g. exported with --imgsz 480 640 (default: --square run rectangular)")
+    parser.add_argument("--recording", required=True, help="recording folder to replay")
+    parser.add_argument("--limit", type=int, default=300, help="most frames used")
+    parser.add_argument("--step", type=int, default=1, help="use every N-th frame")
+    parser.add_argument("--dataset", default=None, help="folder holding images/ and labels/ for the label check")
+    parser.add_argument("--split", default=None, help="split file for the label check, e.g. ../SYBIL/splits/test.txt")
+    parser.add_argument("--split-limit", type=int, default=None, help="only use the first N labelled images")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    parser.add_argument("--conf", type=float, default=0.531)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for two boxes to count as the same object")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    frames, intrinsics, depth_scale = load_frames(args.recording, args.limit, args.step)
+    if not frames:
+        raise ValueError(f"No frames in {args.recording}")
+    images = [rgb for rgb, _ in frames]
+
+    square = SybilModel(args.square, backend="onnxruntime", intra_op_threads=args.threads, rect=False)
+    rect = SybilModel(args.rect or args.square, backend="onnxruntime", intra_op_threads=args.threads, rect=True)
+
+    labelled = None
+    if args.split:
+        import cv2
+        labelled = []
+        for image_path, label_path in load_split(args.split, args.dataset or "../SYBIL", args.split_limit):
+            image = cv2.imread(str(image_path))
+            if image is not None:
+                labelled.append(letterbox(image, load_labels(label_path)))
+
+    report = {"frames": len(frames), "iou": args.iou, "paths": {}}
+    results = {}
+    for name, model in (("square", square), ("rect", rect)):
+        print(f"Running {name}...")
+        results[name], latency = run(model, images, args.conf)
+        row = {"input": input_shape(model, images[0].shape), "latency_ms": latency}
+        if labelled:
+            detections, _ = run(model, [frame for frame, _ in labelled], args.conf)
+            row.update(label_scores(detections, [truth for _, truth in labelled], args.iou))
+        report["paths"][name] = row
+    report["agreement"] = agreement(results["square"], results["rect"], frames, intrinsics, depth_scale, args.iou)
+
+    base = report["paths"]["square"]["latency_ms"]["mean"]
+    print(f"\n{len(frames)} replayed frames of {images[0].shape[1]}x{images[0].shape[0]}")
+    print(f"{'path':<8}{'input':>10}{'mean ms':>9}{'p95 ms':>9}{'speed-up':>10}{'recall':>8}{'precision':>11}")
+    for name, row in report["paths"].items():
+        shape = "x".join(str(v) for v in row["input"]) if row["input"] else "-"
+        print(f"{name:<8}{shape:>10}{row['latency_ms']['mean']:>9.1f}{row['latency_ms']['p95']:>9.1f}"
+              f"{base / row['latency_ms']['mean']:>9.2f}x"
+              f"{_fmt(row.get('recall'), '.3f', 8)}{_fmt(row.get('precision'), '.3f', 11)}")
+
+    agree = report["agreement"]
+    print(f"\nRectangular vs square: {_fmt(agree['matched'], '.1%', 0)} of square detections matched, "
+          f"{agree['extra']} extra, mean IoU {_fmt(agree['mean_iou'], '.3f', 0)}, "
+          f"mean conf change {_fmt(agree['mean_conf_delta'], '+.3f', 0)}, "
+          f"median 3D shift {_fmt(agree['median_xyz_delta_mm'], '.1f', 0)} mm")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
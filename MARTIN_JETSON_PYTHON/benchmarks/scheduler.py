@@ -0,0 +1,129 @@
+"""
+Measures what detect-then-track scheduling buys and costs.
+
+The same frames are run twice: with detection on every frame, and with
+the adaptive `DetectionScheduler`. Both runs go through the same tracker.
+Reports the effective FPS of each run, how often the detector ran, and the
+recall of the scheduled tracks against the every-frame tracks (a track box
+counts as recalled when a scheduled box of the same frame overlaps it with
+IoU >= --iou).
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m benchmarks.scheduler --weights PATH/TO/best.onnx --source replay \
+        --recording recordings/roadside_01 --max-interval 10 --out scheduler.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from sensors.frame_source import add_source_arguments, open_source
+from models.SYBIL import SybilModel
+from utils.depth_ops import bboxes_to_xyz, bboxes_real_world_size
+from utils.filtering import MultiObjectTracker, iou_matrix
+from utils.scheduler import DetectionScheduler
+
+
+def run(args, model, scheduler_kwargs):
+    """Runs one pass over the source; returns per-frame track boxes, elapsed seconds and stats."""
+    source = open_source(args)
+    intrinsics = source.get_intrinsics()
+    depth_scale = source.get_depth_scale()
+    aligner = source.get_depth_aligner()
+    scheduler = DetectionScheduler(model, MultiObjectTracker(), conf_threshold=args.conf, **scheduler_kwargs)
+
+    frames = []
+    t0 = None
+    try:
+        while True:
+            rgb, depth = source.get_frames()
+            if rgb is None:
+                if source.finished:
+                    break
+                continue
+            if t0 is None:
+                t0 = time.perf_counter()
+
+            def measure(detections):
+                frame_depth = depth if aligner is None else aligner.align_boxes(depth, detections.xyxy)
+                return (bboxes_to_xyz(detections.xywh, frame_depth, intrinsics, depth_scale),
+                        bboxes_real_world_size(detections.xyxy, detections.xywh, frame_depth,
+                                               intrinsics, depth_scale))
+
+            events, _ = scheduler.step(rgb, source.get_timestamp(), measure)
+            tracks = events["born"] + events["updated"]
+            frames.append(np.array([t["xyxy"] for t in tracks], dtype=np.float32).reshape(-1, 4))
+    finally:
+        source.stop()
+
+    elapsed = time.perf_counter() - t0 if t0 is not None else 0.0
+    return frames, elapsed, scheduler.stats()
+
+
+def recall(reference, scheduled, iou_threshold):
+    """Fraction of reference boxes, over all frames, matched by a scheduled box of the same frame."""
+    total = matched = 0
+    for ref_boxes, boxes in zip(reference, scheduled):
+        total += len(ref_boxes)
+        if len(ref_boxes) and len(boxes):
+            matched += int((iou_matrix(ref_boxes, boxes).max(axis=1) >= iou_threshold).sum())
+    return matched / total if total else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detect-then-track scheduling")
+    parser.add_argument("--weights", required=True, help="path to .pt or .onnx weights")
+    parser.add_argument("--backend", default="auto", choices=["auto", "ultralytics", "onnxruntime"])
+    parser.add_argument("--conf", type=float, default=0.531)
+    parser.add_argument("--max-interval", type=int, default=10)
+    parser.add_argument("--target-latency", type=float, default=None, help="per-frame budget (ms)")
+    parser.add_argument("--max-detect-rate", type=float, default=None, help="detector runs per second")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a box to count as recalled")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    add_source_arguments(parser)
+    parser.set_defaults(source="synthetic", replay_rate="max")
+    args = parser.parse_args()
+    if args.record or args.loop:
+        parser.error("--record and --loop are not supported: both passes must see the same frames")
+
+    model = SybilModel(args.weights, backend=args.backend)
+
+    print("Every-frame detection...")
+    reference, reference_s, reference_stats = run(args, model, {"max_interval": 1})
+    print("Scheduled detection...")
+    scheduled, scheduled_s, scheduled_stats = run(args, model, {
+        "max_interval": args.max_interval,
+        "target_latency_ms": args.target_latency,
+        "max_detections_per_s": args.max_detect_rate,
+    })
+
+    frames = min(len(reference), len(scheduled))
+    report = {
+        "frames": frames,
+        "every_frame": {"fps": len(reference) / reference_s if reference_s else 0.0, **reference_stats},
+        "scheduled": {"fps": len(scheduled) / scheduled_s if scheduled_s else 0.0, **scheduled_stats},
+        "recall": recall(reference[:frames], scheduled[:frames], args.iou),
+    }
+
+    print(f"\n{frames} frames")
+    print(f"{'mode':<14}{'FPS':>9}{'detector runs':>15}{'fraction':>10}")
+    for name in ("every_frame", "scheduled"):
+        row = report[name]
+        print(f"{name:<14}{row['fps']:>9.2f}{row['detections_run']:>15}{row['detection_fraction']:>10.2f}")
+    speedup = report["scheduled"]["fps"] / report["every_frame"]["fps"] if report["every_frame"]["fps"] else 0.0
+    if report["recall"] is None:
+        print(f"Speed-up: {speedup:.2f}x   (no tracks in the every-frame run to compute recall)")
+    else:
+        print(f"Speed-up: {speedup:.2f}x   Recall vs every-frame: {report['recall']:.3f} "
+              f"(lost {1 - report['recall']:.1%})")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
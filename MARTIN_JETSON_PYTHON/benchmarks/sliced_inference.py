@@ -0,0 +1,173 @@
+"""
+Measures the latency cost of sliced inference against the small-object
+recall it buys, on the SYBIL test split.
+
+Each test image is letterboxed into a 640x480 frame, as the RealSense
+delivers it, and run full-frame and with every tile grid given. Recall at
+--iou is reported per object size in that frame (small < 32x32 px, medium
+< 96x96 px, large otherwise), together with the mean and p95 latency.
+
+The split lists image paths as they were on the training machine; only the
+file names are used, looked up in DATASET/images with labels in
+DATASET/labels (YOLO format).
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m benchmarks.sliced_inference --weights PATH/TO/best.onnx \
+        --dataset PATH/TO/SYBIL --tiles 2x2 3x3 --out sliced.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from models.SYBIL import SybilModel
+from models.slicing import parse_tiles
+from utils.filtering import iou_matrix, linear_assignment
+
+SIZE_BUCKETS = {"small": 32 ** 2, "medium": 96 ** 2, "large": float("inf")}
+
+
+def load_split(split, dataset, limit=None):
+    """Returns (image path, label path) pairs for a split file."""
+    dataset = Path(dataset)
+    pairs = []
+    for line in Path(split).read_text().splitlines():
+        name = line.strip().replace("\\", "/").rsplit("/", 1)[-1]
+        if not name:
+            continue
+        image = dataset / "images" / name
+        pairs.append((image, (dataset / "labels" / name).with_suffix(".txt")))
+    return pairs[:limit] if limit else pairs
+
+
+def letterbox(image, labels, width=640, height=480):
+    """
+    Fits an image into a width x height frame and maps its YOLO labels to
+    pixel xyxy boxes in that frame.
+    """
+    import cv2
+    h, w = image.shape[:2]
+    scale = min(width / w, height / h)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    left, top = (width - new_w) // 2, (height - new_h) // 2
+
+    frame = np.full((height, width, 3), 114, dtype=np.uint8)
+    frame[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    boxes = np.zeros((0, 4), dtype=np.float32)
+    if len(labels):
+        cx, cy, bw, bh = (labels[:, 1] * new_w + left, labels[:, 2] * new_h + top,
+                          labels[:, 3] * new_w, labels[:, 4] * new_h)
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1).astype(np.float32)
+    return frame, boxes
+
+
+def load_labels(path):
+    """Reads a YOLO label file as an (N, 5) array; empty if missing."""
+    if not path.exists():
+        return np.zeros((0, 5), dtype=np.float32)
+    return np.loadtxt(path, dtype=np.float32, ndmin=2).reshape(-1, 5)
+
+
+def size_bucket(boxes):
+    """Names the size bucket of each box by its pixel area."""
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    limits = np.array(list(SIZE_BUCKETS.values()))
+    return np.array(list(SIZE_BUCKETS))[np.searchsorted(limits, areas, side="right")]
+
+
+def evaluate(model, samples, conf, iou_threshold, slicing):
+    """Runs every sample through `model.detect()`; returns latencies (ms) and per-bucket hit counts."""
+    if slicing:
+        model.enable_slicing(**slicing)
+    else:
+        model.enable_slicing(tiles=None)
+    model.detect(samples[0][0], conf_threshold=conf)  # Warm-up
+
+    latencies = []
+    found = {name: 0 for name in SIZE_BUCKETS}
+    total = {name: 0 for name in SIZE_BUCKETS}
+    for frame, truth in samples:
+        t0 = time.perf_counter()
+        detections = model.detect(frame, conf_threshold=conf)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        if not len(truth):
+            continue
+        buckets = size_bucket(truth)
+        hit = np.zeros(len(truth), dtype=bool)
+        if len(detections):
+            rows, _ = linear_assignment(1.0 - iou_matrix(truth, detections.xyxy), 1.0 - iou_threshold)
+            hit[rows] = True
+        for name in SIZE_BUCKETS:
+            in_bucket = buckets == name
+            total[name] += int(in_bucket.sum())
+            found[name] += int((hit & in_bucket).sum())
+
+    latencies = np.asarray(latencies)
+    return {
+        "latency_ms": {"mean": float(latencies.mean()), "p95": float(np.percentile(latencies, 95))},
+        "recall": {name: found[name] / total[name] if total[name] else None for name in SIZE_BUCKETS},
+        "objects": total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sliced inference: latency vs small-object recall")
+    parser.add_argument("--weights", required=True, help="path to .pt or .onnx weights")
+    parser.add_argument("--backend", default="auto", choices=["auto", "ultralytics", "onnxruntime"])
+    parser.add_argument("--dataset", default="../SYBIL", help="folder holding images/ and labels/")
+    parser.add_argument("--split", default="../SYBIL/splits/test.txt", help="split file listing the images")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N images")
+    parser.add_argument("--tiles", type=parse_tiles, nargs="+", default=[(2, 2), (3, 3)],
+                        metavar="ROWSxCOLS", help="tile grids to compare against full-frame inference")
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--no-full-frame", action="store_true",
+                        help="run the tiles only, without the full-frame pass")
+    parser.add_argument("--conf", type=float, default=0.531)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a label to count as found")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    import cv2
+    samples = []
+    for image_path, label_path in load_split(args.split, args.dataset, args.limit):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            print(f"⚠️ Skipping unreadable image: {image_path}")
+            continue
+        samples.append(letterbox(image, load_labels(label_path)))
+    if not samples:
+        raise FileNotFoundError(f"No readable images for {args.split} in {args.dataset}")
+
+    model = SybilModel(args.weights, backend=args.backend)
+
+    configs = [("full frame", None)]
+    for rows, cols in args.tiles:
+        configs.append((f"{rows}x{cols} tiles", {"tiles": (rows, cols), "overlap": args.overlap,
+                                                 "include_full_frame": not args.no_full_frame}))
+
+    report = {"images": len(samples), "iou": args.iou, "configs": {}}
+    for name, slicing in configs:
+        print(f"Running {name}...")
+        report["configs"][name] = evaluate(model, samples, args.conf, args.iou, slicing)
+
+    baseline = report["configs"]["full frame"]["latency_ms"]["mean"]
+    print(f"\n{len(samples)} images, objects per size: {report['configs']['full frame']['objects']}")
+    print(f"{'mode':<16}{'mean ms':>9}{'p95 ms':>9}{'cost':>7}" + "".join(f"{b:>9}" for b in SIZE_BUCKETS))
+    for name, row in report["configs"].items():
+        recalls = "".join(f"{r:>9.3f}" if r is not None else f"{'-':>9}" for r in row["recall"].values())
+        print(f"{name:<16}{row['latency_ms']['mean']:>9.1f}{row['latency_ms']['p95']:>9.1f}"
+              f"{row['latency_ms']['mean'] / baseline:>6.1f}x{recalls}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
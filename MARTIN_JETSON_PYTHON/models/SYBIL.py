@@ -1,14 +1,44 @@
-from ultralytics import YOLO
 from pathlib import Path
+import time
 import numpy as np
 
+from models.detections import Detections
+from utils.metrics import REGISTRY
+
+class AdaptiveBatchSizer:
+    """
+    Picks the largest batch size whose measured forward-pass latency
+    stays within a latency budget. The size grows by one while there is
+    headroom and halves as soon as a batch runs over budget.
+    """
+
+    def __init__(self, latency_budget_ms: float, min_size: int = 1, max_size: int = 32):
+        self.latency_budget_ms = latency_budget_ms
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = min_size
+
+    def update(self, batch_size: int, latency_ms: float):
+        """Adjusts the batch size from the latency of a batch of `batch_size` frames."""
+        if latency_ms > self.latency_budget_ms:
+            self.size = max(self.min_size, batch_size // 2)
+        elif batch_size >= self.size:
+            # Assume latency scales linearly and grow if one more frame still fits
+            per_frame_ms = latency_ms / batch_size
+            if latency_ms + per_frame_ms <= self.latency_budget_ms:
+                self.size = min(self.max_size, batch_size + 1)
+        return self.size
+
+
 class SybilModel:
     """
     A wrapper class for the SYBIL computer vision model used in MARTIN.
     Encapsulates model loading and inference logic for modular reuse.
     """
 
-    def __init__(self, weights_path: str):
+    def __init__(self, weights_path: str, backend: str = "auto", providers=None,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0, server: str = None,
+                 session_cache: str = None, rect: bool = True):
         """
         Initializes the SYBIL model by loading the YOLOv8 weights.
 
@@ -16,18 +46,98 @@ class SybilModel:
         ----------
         weights_path : str
             Path to the trained YOLOv8 model weights (.pt or .onnx).
+        backend : str, optional
+            "ultralytics", "onnxruntime" or "auto" (default). "auto" runs
+            `.onnx` weights with ONNX Runtime and everything else with ultralytics.
+        providers : list, optional
+            ONNX Runtime execution providers (onnxruntime backend only).
+        intra_op_threads : int, optional
+            ONNX Runtime intra-op thread count; 0 lets ONNX Runtime decide.
+        inter_op_threads : int, optional
+            ONNX Runtime inter-op thread count; 0 lets ONNX Runtime decide.
+        server : str, optional
+            Unix socket of a running `models.inference_server`. The model is
+            then used through the server and no weights are loaded locally.
+        session_cache : str, optional
+            Folder caching the optimized ONNX Runtime session between runs
+            (onnxruntime backend only, default is None).
+        rect : bool, optional
+            Size the input of dynamic-shape ONNX models to the frame instead
+            of padding it square (default is True). Ultralytics already does
+            this for `.pt` weights; fixed-shape exports use their own size.
 
         Why it's useful:
         ----------------
         - Keeps model loading encapsulated and reusable.
         - Allows easy swapping of model weights without changing inference logic.
         - Supports future extension (e.g., loading different YOLO variants).
+        - The ONNX Runtime backend never imports ultralytics or PyTorch.
         """
+        if server is not None:
+            from models.inference_server import InferenceClient
+            self.model = InferenceClient(server)
+            self.backend = "server"
+            self.names = self.model.names
+            self._batch_sizer = None
+            self.slicing = None
+            return
+
         resolved_path = Path(weights_path)
         if not resolved_path.exists():
             raise FileNotFoundError(f"Model weights not found at: {resolved_path}")
-        self.model = YOLO(resolved_path)
 
+        if backend == "auto":
+            backend = "onnxruntime" if resolved_path.suffix == ".onnx" else "ultralytics"
+
+        if backend == "onnxruntime":
+            from models.onnx_backend import OnnxSybilBackend
+            self.model = OnnxSybilBackend(resolved_path, providers=providers,
+                                          intra_op_threads=intra_op_threads,
+                                          inter_op_threads=inter_op_threads,
+                                          cache_dir=session_cache, rect=rect)
+        elif backend == "ultralytics":
+            from ultralytics import YOLO
+            self.model = YOLO(resolved_path)
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+
+        self.backend = backend
+        self.names = self.model.names
+        self._batch_sizer = None
+        self.slicing = None
+
+    def warmup(self, frame_shape=(480, 640, 3), runs: int = 2):
+        """
+        Runs the full detection path on blank frames before the first real one.
+
+        Parameters
+        ----------
+        frame_shape : tuple, optional
+            (height, width, channels) of the camera frames (default is 480x640x3).
+        runs : int, optional
+            Forward passes to run (default is 2).
+
+        Returns
+        -------
+        times_ms : list of float
+            Duration of each warm-up pass; the first is the cold-start cost.
+
+        Why it's useful:
+        ----------------
+        - Lazy initialization (kernel selection, memory arenas, input buffers,
+          ultralytics' model fusing) happens before the camera delivers frames,
+          not on the first piece of litter.
+        - Can run in parallel with the camera's own warm-up.
+        """
+        frame = np.zeros(frame_shape, dtype=np.uint8)
+        times_ms = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            self.detect(frame)
+            times_ms.append((time.perf_counter() - t0) * 1000)
+        return times_ms
+
+    @REGISTRY.timed("sybil_model_infer_seconds", "Time spent in SybilModel.infer")
     def infer(self, frame: np.ndarray, conf_threshold: float = 0.531):
         """
         Runs inference on a single RGB frame using the SYBIL model.
@@ -42,7 +152,8 @@ class SybilModel:
         Returns
         -------
         results : list
-            A list of detection results from the YOLO model.
+            A list of detection results from the YOLO model. The onnxruntime
+            and server backends return a one-element list of `Detections`.
 
         Why it's useful:
         ----------------
@@ -52,3 +163,143 @@ class SybilModel:
         """
         results = self.model(frame, conf=conf_threshold)
         return results
+
+    def detect(self, frame: np.ndarray, conf_threshold: float = 0.531, timestamp: float = None):
+        """
+        Runs inference on a single frame and returns host-side arrays.
+        `timestamp` (capture time, seconds) is not used here; it is accepted
+        so loops can pass it to any detector, e.g. a `MotionGatedModel`.
+
+        Returns
+        -------
+        detections : Detections
+            xyxy / xywh / conf / cls NumPy arrays for the frame, fetched
+            to the host once regardless of the backend. Uses sliced
+            inference once `enable_slicing()` has been called.
+        """
+        if self.slicing is not None:
+            return self.infer_sliced(frame, conf_threshold=conf_threshold, **self.slicing)
+        result = self.infer(frame, conf_threshold=conf_threshold)[0]
+        if isinstance(result, Detections):
+            return result
+        return Detections.from_results(result)
+
+    def enable_slicing(self, tiles=(2, 2), overlap: float = 0.2, roi=None, include_full_frame: bool = True):
+        """
+        Makes `detect()` use sliced inference (see `infer_sliced`) with these
+        settings, so nodes, pipelines and schedulers pick it up unchanged.
+        Pass `tiles=None` to turn it off again.
+        """
+        if tiles is None:
+            self.slicing = None
+        else:
+            self.slicing = {"tiles": tuple(tiles), "overlap": overlap, "roi": roi,
+                            "include_full_frame": include_full_frame}
+
+    @REGISTRY.timed("sybil_model_infer_sliced_seconds", "Time spent in SybilModel.infer_sliced")
+    def infer_sliced(self, frame: np.ndarray, conf_threshold: float = 0.531, tiles=(2, 2),
+                     overlap: float = 0.2, roi=None, include_full_frame: bool = True,
+                     ios_threshold: float = 0.5):
+        """
+        Runs sliced (tiled) inference for small, distant litter.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            BGR frame.
+        conf_threshold : float, optional
+            Confidence threshold for filtering detections (default is 0.531).
+        tiles : tuple, optional
+            (rows, columns) of overlapping tiles (default is (2, 2)).
+        overlap : float, optional
+            Fraction of a tile shared with its neighbour (default is 0.2).
+        roi : tuple, optional
+            (x1, y1, x2, y2) region to tile, e.g. the ground plane (default is the whole frame).
+        include_full_frame : bool, optional
+            Also run the whole frame, so large objects cut by tile borders
+            are still found whole (default is True).
+        ios_threshold : float, optional
+            Overlap (intersection over the smaller box) above which boxes
+            from different tiles are merged (default is 0.5).
+
+        Returns
+        -------
+        detections : Detections
+            Merged detections in frame coordinates.
+
+        Why it's useful:
+        ----------------
+        - Each tile is upscaled to the model's input size, so litter covering
+          only a few pixels of the frame is seen at the scale it was trained on.
+        - All tiles go through one batched forward pass.
+        """
+        from models.slicing import tile_windows, merge_tile_detections
+
+        windows = tile_windows(frame.shape[:2], tiles, overlap, roi)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+        if include_full_frame:
+            crops.append(frame)
+            windows = np.concatenate([windows, [[0, 0, frame.shape[1], frame.shape[0]]]])
+
+        tile_detections = self._forward_batch(crops, conf_threshold)
+        return merge_tile_detections(tile_detections, windows, frame.shape[:2], ios_threshold)
+
+    @REGISTRY.timed("sybil_model_infer_batch_seconds", "Time spent in SybilModel.infer_batch")
+    def infer_batch(self, frames, conf_threshold: float = 0.531, batch_size: int = None,
+                    latency_budget_ms: float = None):
+        """
+        Runs inference on several frames, stacking them into batched forward passes.
+
+        Parameters
+        ----------
+        frames : list of np.ndarray
+            BGR frames to run inference on.
+        conf_threshold : float, optional
+            Confidence threshold for filtering detections (default is 0.531).
+        batch_size : int, optional
+            Frames per forward pass (default is all frames in one pass).
+        latency_budget_ms : float, optional
+            If given, the batch size adapts so that each forward pass stays
+            within this budget; `batch_size` is then only the starting size.
+
+        Returns
+        -------
+        detections : list of Detections
+            Compact per-frame detection arrays, in input order.
+
+        Why it's useful:
+        ----------------
+        - Offline evaluation, replay and multi-camera input pay for one
+          forward pass per batch instead of one per image.
+        - Returns plain NumPy arrays rather than heavyweight `Results` objects.
+        """
+        frames = list(frames)
+        if latency_budget_ms is not None:
+            sizer = self._batch_sizer
+            if sizer is None or sizer.latency_budget_ms != latency_budget_ms:
+                sizer = AdaptiveBatchSizer(latency_budget_ms)
+                if batch_size:
+                    sizer.size = batch_size
+                self._batch_sizer = sizer
+        else:
+            sizer = None
+
+        detections = []
+        start = 0
+        while start < len(frames):
+            size = sizer.size if sizer else (batch_size or len(frames))
+            batch = frames[start:start + size]
+
+            t0 = time.perf_counter()
+            detections.extend(self._forward_batch(batch, conf_threshold))
+            if sizer:
+                sizer.update(len(batch), (time.perf_counter() - t0) * 1000)
+
+            start += len(batch)
+        return detections
+
+    def _forward_batch(self, frames, conf_threshold):
+        if self.backend in ("onnxruntime", "server"):
+            return self.model.infer_batch(frames, conf=conf_threshold)
+        results = self.model(frames, conf=conf_threshold)
+        return [Detections.from_results(result) for result in results]
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class Detections:
+    """
+    Compact, host-side container for the detections of a single frame.
+    Holds plain NumPy arrays so downstream code never touches the
+    model framework (PyTorch tensors, ultralytics Results, ...).
+    """
+
+    __slots__ = ("xyxy", "xywh", "conf", "cls", "speed")
+
+    def __init__(self, xyxy, conf, cls=None, speed=None):
+        """
+        Parameters
+        ----------
+        xyxy : np.ndarray
+            (N, 4) boxes as (x1, y1, x2, y2) in frame pixel coordinates.
+        conf : np.ndarray
+            (N,) confidence scores.
+        cls : np.ndarray, optional
+            (N,) integer class ids (default is all zeros).
+        speed : dict, optional
+            Per-step timings in milliseconds for the frame.
+        """
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        if cls is None:
+            cls = np.zeros(len(self.conf), dtype=np.int64)
+        self.cls = np.asarray(cls).astype(np.int64, copy=False).reshape(-1)
+        self.xywh = xyxy_to_xywh(self.xyxy)
+        self.speed = speed if speed is not None else {}
+
+    def __len__(self):
+        return len(self.conf)
+
+    @property
+    def boxes(self):
+        """Mirrors `results[0].boxes` so existing attribute access keeps working."""
+        return self
+
+    @classmethod
+    def empty(cls):
+        """Returns a container with no detections."""
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def from_results(cls, result):
+        """
+        Converts one ultralytics `Results` object into `Detections`.
+        Boxes, scores and classes are fetched to the host in a single
+        transfer instead of one per attribute (or per box).
+        """
+        data = result.boxes.data.cpu().numpy()
+        return cls(data[:, :4], data[:, 4], data[:, 5], speed=dict(result.speed))
+
+
+def xyxy_to_xywh(xyxy):
+    """Converts (N, 4) corner boxes to (N, 4) center/size boxes."""
+    xywh = np.empty_like(xyxy)
+    xywh[:, 0] = (xyxy[:, 0] + xyxy[:, 2]) / 2
+    xywh[:, 1] = (xyxy[:, 1] + xyxy[:, 3]) / 2
+    xywh[:, 2] = xyxy[:, 2] - xyxy[:, 0]
+    xywh[:, 3] = xyxy[:, 3] - xyxy[:, 1]
+    return xywh
+
+
+def xywh_to_xyxy(xywh):
+    """Converts (N, 4) center/size boxes to (N, 4) corner boxes."""
+    xyxy = np.empty_like(xywh)
+    half_w = xywh[:, 2] / 2
+    half_h = xywh[:, 3] / 2
+    xyxy[:, 0] = xywh[:, 0] - half_w
+    xyxy[:, 1] = xywh[:, 1] - half_h
+    xyxy[:, 2] = xywh[:, 0] + half_w
+    xyxy[:, 3] = xywh[:, 1] + half_h
+    return xyxy
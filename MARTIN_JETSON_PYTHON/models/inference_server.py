@@ -0,0 +1,489 @@
+"""
+Local inference server: one process owns the SYBIL model and serves
+detections to every node on the machine.
+
+Frames travel through shared memory (one segment per client, no pickling);
+a Unix socket carries the small control messages. Requests from different
+clients that arrive together are run as one batch.
+
+Run from the MARTIN_JETSON_PYTHON folder:
+    python -m models.inference_server --weights PATH/TO/best.onnx --socket /tmp/sybil_inference.sock
+and point the nodes at it:
+    python -m nodes.SYBIL_node --server /tmp/sybil_inference.sock
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from models.detections import Detections
+from utils.metrics import REGISTRY, add_metrics_arguments, start_metrics
+
+DEFAULT_SOCKET = "/tmp/sybil_inference.sock"
+
+# Control message: header length, payload length, JSON header, binary payload
+MESSAGE_PREFIX = struct.Struct("<II")
+
+# Frames are placed in a client's segment at offsets aligned to this many bytes
+FRAME_ALIGNMENT = 64
+
+SERVER_REQUESTS = REGISTRY.counter("sybil_server_requests_total", "Detection requests served")
+SERVER_FRAMES = REGISTRY.counter("sybil_server_frames_total", "Frames run by the inference server")
+SERVER_BATCH = REGISTRY.histogram("sybil_server_batch_frames", "Frames per server forward pass",
+                                  buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32))
+SERVER_QUEUE = REGISTRY.histogram("sybil_server_queue_seconds", "Time requests wait for a server batch")
+
+
+def send_message(sock, header, payload=b""):
+    """Sends one control message (JSON header plus optional binary payload)."""
+    data = json.dumps(header).encode()
+    sock.sendall(MESSAGE_PREFIX.pack(len(data), len(payload)) + data + payload)
+
+
+def recv_message(sock):
+    """Receives one control message; returns (header, payload) or (None, None) once the peer hangs up."""
+    prefix = _recv_exact(sock, MESSAGE_PREFIX.size)
+    if prefix is None:
+        return None, None
+    header_size, payload_size = MESSAGE_PREFIX.unpack(prefix)
+    header = _recv_exact(sock, header_size)
+    payload = _recv_exact(sock, payload_size) if payload_size else b""
+    if header is None or payload is None:
+        return None, None
+    return json.loads(header), payload
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def attach_shared_memory(name):
+    """
+    Opens a segment created by another process without taking ownership:
+    only its creator (the client) unlinks it.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    # Python < 3.13 registers every attach and would unlink the segment at exit
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class _Client:
+    """Server-side state of one connected client."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.shm = None
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+
+class InferenceServer:
+    """
+    Serves one `SybilModel` to local clients.
+    One thread per client reads requests; a single batching thread owns the
+    model, gathers whatever requests are waiting (up to `max_batch` frames)
+    and runs them as one forward pass.
+    """
+
+    def __init__(self, model, socket_path: str = DEFAULT_SOCKET, max_batch: int = 8,
+                 batch_window_ms: float = 1.0):
+        """
+        Parameters
+        ----------
+        model : SybilModel
+            The model every client shares.
+        socket_path : str, optional
+            Unix socket the server listens on (default is /tmp/sybil_inference.sock).
+        max_batch : int, optional
+            Most frames per forward pass (default is 8).
+        batch_window_ms : float, optional
+            How long the first request of a batch waits for requests from
+            other clients (default is 1 ms). 0 only batches requests that are
+            already queued.
+
+        Why it's useful:
+        ----------------
+        - A viewer, a logger and the main node share one copy of the weights
+          and pay the warm-up once.
+        - Frames are never pickled or copied through the socket.
+        - Concurrent clients are served by batched forward passes.
+        """
+        self.model = model
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_window_ms = batch_window_ms
+
+        self._requests = queue.Queue()
+        self._carry = None
+        # Segments of detached clients, appended by client threads and closed by the batching thread
+        self._stale_segments = []
+        self._segments_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+        self._threads = []
+
+        self.requests_served = 0
+        self.frames_served = 0
+        self.batches = 0
+
+    def start(self):
+        """Binds the socket and starts the accept and batching threads."""
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise RuntimeError(f"An inference server is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)  # Left behind by a server that crashed
+            finally:
+                probe.close()
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen()
+        self._listener.settimeout(0.5)
+
+        self._threads = [
+            threading.Thread(target=self._accept_loop, name="sybil-server-accept", daemon=True),
+            threading.Thread(target=self._batch_loop, name="sybil-server-batch", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def serve_forever(self):
+        """Starts the server and blocks until `stop()` or Ctrl+C."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stops accepting clients, finishes the running batch and removes the socket."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._close_stale_segments()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def stats(self):
+        """Returns request, frame and batch counts."""
+        return {
+            "requests": self.requests_served,
+            "frames": self.frames_served,
+            "batches": self.batches,
+            "mean_batch_frames": self.frames_served / self.batches if self.batches else 0.0,
+        }
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._client_loop, args=(_Client(conn),),
+                             name="sybil-server-client", daemon=True).start()
+
+    def _client_loop(self, client):
+        try:
+            while not self._stop.is_set():
+                header, _ = recv_message(client.conn)
+                if header is None:
+                    break
+                op = header.get("op")
+                if op == "attach":
+                    self._release_segment(client)
+                    client.shm = attach_shared_memory(header["shm"])
+                    self._send(client, {"op": "ready", "names": self.model.names,
+                                        "max_batch": self.max_batch})
+                elif op == "detect":
+                    self._enqueue(client, header)
+                else:
+                    self._send(client, {"id": header.get("id"), "error": f"unknown op {op!r}"})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            client.closed = True
+            self._release_segment(client)
+            client.conn.close()
+
+    def _enqueue(self, client, header):
+        if client.shm is None:
+            self._send(client, {"id": header["id"], "error": "no shared memory attached"})
+            return
+        frames = []
+        for spec in header["frames"]:
+            frames.append(np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]),
+                                     buffer=client.shm.buf, offset=spec["offset"]))
+        self._requests.put((client, header, frames, time.perf_counter()))
+
+    def _next_batch(self):
+        # Block for the first request, then take whatever else fits in the window
+        first = self._carry
+        self._carry = None
+        if first is None:
+            try:
+                first = self._requests.get(timeout=0.2)
+            except queue.Empty:
+                return []
+        batch = [first]
+        count = len(first[2])
+        deadline = time.perf_counter() + self.batch_window_ms / 1000
+        while count < self.max_batch:
+            try:
+                request = self._requests.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if count + len(request[2]) > self.max_batch:
+                self._carry = request  # Opens the next batch
+                break
+            batch.append(request)
+            count += len(request[2])
+        return batch
+
+    def _batch_loop(self):
+        while not self._stop.is_set():
+            batch = [r for r in self._next_batch() if not r[0].closed]
+            if batch:
+                self._run(batch)
+            self._close_stale_segments()
+
+    def _run(self, batch):
+        t0 = time.perf_counter()
+        frames = [frame for _, _, request_frames, _ in batch for frame in request_frames]
+        # One pass at the lowest threshold asked for; each request is filtered to its own below
+        conf = min(header.get("conf", 0.531) for _, header, _, _ in batch)
+        try:
+            detections = self.model.infer_batch(frames, conf_threshold=conf, batch_size=self.max_batch)
+        except Exception as error:
+            for client, header, _, _ in batch:
+                self._send(client, {"id": header["id"], "error": repr(error)})
+            return
+        batch_ms = (time.perf_counter() - t0) * 1000
+
+        self.batches += 1
+        self.frames_served += len(frames)
+        self.requests_served += len(batch)
+        if REGISTRY.enabled:
+            SERVER_BATCH.observe(len(frames))
+            SERVER_FRAMES.inc(len(frames))
+            SERVER_REQUESTS.inc(len(batch))
+
+        start = 0
+        for client, header, request_frames, received_at in batch:
+            results = detections[start:start + len(request_frames)]
+            start += len(request_frames)
+
+            request_conf = header.get("conf", 0.531)
+            rows, counts, speeds = [], [], []
+            for result in results:
+                keep = result.conf >= request_conf
+                rows.append(np.column_stack([result.xyxy[keep], result.conf[keep],
+                                             result.cls[keep].astype(np.float32)]).astype(np.float32))
+                counts.append(int(keep.sum()))
+                speeds.append({k: float(v) for k, v in result.speed.items()})
+
+            queue_s = t0 - received_at
+            if REGISTRY.enabled:
+                SERVER_QUEUE.observe(queue_s)
+            payload = np.concatenate(rows).tobytes() if rows else b""
+            self._send(client, {"id": header["id"], "counts": counts, "speed": speeds,
+                                "queue_ms": queue_s * 1000, "batch_ms": batch_ms,
+                                "batch_frames": len(frames)}, payload)
+
+    def _send(self, client, header, payload=b""):
+        if client.closed:
+            return
+        try:
+            with client.send_lock:
+                send_message(client.conn, header, payload)
+        except OSError:
+            client.closed = True
+
+    def _release_segment(self, client):
+        # Closed later by the batching thread, which owns the frame views
+        if client.shm is not None:
+            with self._segments_lock:
+                self._stale_segments.append(client.shm)
+            client.shm = None
+
+    def _close_stale_segments(self):
+        # A segment can only be closed once no queued frame views it any more
+        with self._segments_lock:
+            for shm in list(self._stale_segments):
+                try:
+                    shm.close()
+                    self._stale_segments.remove(shm)
+                except (BufferError, ValueError):
+                    pass
+
+
+class InferenceClient:
+    """
+    Client side of `InferenceServer`. Has the same `__call__` / `infer_batch`
+    interface as the ONNX backend, so `SybilModel(..., server=PATH)` uses it
+    transparently.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, capacity_bytes: int = 640 * 480 * 3,
+                 timeout: float = 30.0):
+        """
+        Parameters
+        ----------
+        socket_path : str, optional
+            Unix socket of the server (default is /tmp/sybil_inference.sock).
+        capacity_bytes : int, optional
+            Initial size of this client's shared-memory segment (default is
+            one 640x480 BGR frame). It grows when a request needs more.
+        timeout : float, optional
+            Seconds to wait for a reply before giving up (default is 30).
+        """
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.shm = None
+        self.names = {}
+        self.max_batch = None
+        self.last_latency_ms = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._attach(capacity_bytes)
+
+    def _attach(self, capacity_bytes):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity_bytes)
+        send_message(self.sock, {"op": "attach", "shm": self.shm.name})
+        header, _ = recv_message(self.sock)
+        if header is None or header.get("op") != "ready":
+            raise ConnectionError(f"Inference server at {self.socket_path} did not accept the client: {header}")
+        self.names = {int(k): v for k, v in header["names"].items()}
+        self.max_batch = header["max_batch"]
+
+    def __call__(self, frame: np.ndarray, conf: float = 0.531):
+        """Runs detection on one frame; returns a one-element list of `Detections`."""
+        return self.infer_batch([frame], conf=conf)
+
+    def infer_batch(self, frames, conf: float = 0.531):
+        """
+        Runs detection on frames through the server.
+
+        Returns
+        -------
+        detections : list of Detections
+            One entry per frame. `speed` holds the server's per-image model
+            timings plus "queue" (waiting for a batch), "batch" (the whole
+            server forward pass) and "request" (client round trip), in ms.
+        """
+        frames = [np.ascontiguousarray(frame) for frame in frames]
+        with self._lock:
+            t0 = time.perf_counter()
+
+            # Lay the frames out in the segment, growing it if needed
+            specs, offset = [], 0
+            for frame in frames:
+                specs.append({"offset": offset, "shape": list(frame.shape), "dtype": frame.dtype.str})
+                offset += -(-frame.nbytes // FRAME_ALIGNMENT) * FRAME_ALIGNMENT
+            if offset > self.shm.size:
+                self._attach(offset)
+            for frame, spec in zip(frames, specs):
+                target = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=spec["offset"])
+                target[...] = frame
+                del target
+
+            request_id = self._next_id
+            self._next_id += 1
+            send_message(self.sock, {"op": "detect", "id": request_id, "conf": conf, "frames": specs})
+            header, payload = recv_message(self.sock)
+            if header is None:
+                raise ConnectionError(f"Inference server at {self.socket_path} closed the connection")
+            if "error" in header:
+                raise RuntimeError(f"Inference server error: {header['error']}")
+            self.last_latency_ms = (time.perf_counter() - t0) * 1000
+
+        rows = np.frombuffer(payload, dtype=np.float32).reshape(-1, 6)
+        detections, start = [], 0
+        for count, speed in zip(header["counts"], header["speed"]):
+            chunk = rows[start:start + count]
+            start += count
+            speed = dict(speed, queue=header["queue_ms"], batch=header["batch_ms"],
+                         request=self.last_latency_ms)
+            detections.append(Detections(chunk[:, :4], chunk[:, 4], chunk[:, 5], speed=speed))
+        return detections
+
+    def close(self):
+        """Disconnects and frees the shared-memory segment."""
+        self.sock.close()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def main():
+    from models.SYBIL import SybilModel
+
+    parser = argparse.ArgumentParser(description="Serve one SYBIL model to local nodes")
+    parser.add_argument("--weights", required=True, help="path to the SYBIL weights (.pt or .onnx)")
+    parser.add_argument("--backend", default="auto", choices=["auto", "ultralytics", "onnxruntime"])
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ONNX Runtime intra-op threads (0 lets ONNX Runtime decide)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    parser.add_argument("--max-batch", type=int, default=8, help="most frames per forward pass")
+    parser.add_argument("--batch-window", type=float, default=1.0,
+                        help="ms the first request waits for requests from other clients")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    exporter = start_metrics(args)
+    model = SybilModel(args.weights, backend=args.backend, intra_op_threads=args.threads)
+
+    # Warm up once here, so no client pays for it
+    model.infer_batch([np.zeros((480, 640, 3), dtype=np.uint8)])
+
+    server = InferenceServer(model, args.socket, max_batch=args.max_batch, batch_window_ms=args.batch_window)
+    print(f"🚀 SYBIL inference server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        print(f"\nServer stats: {server.stats()}")
+        if exporter is not None:
+            exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
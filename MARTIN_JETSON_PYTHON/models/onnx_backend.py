@@ -0,0 +1,416 @@
+import ast
+import hashlib
+import math
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from models.detections import Detections, xywh_to_xyxy
+
+# Letterbox padding value used by ultralytics (114 grey)
+PAD_VALUE = 114 / 255.0
+
+# Class offset used to run per-class NMS in a single pass (matches ultralytics)
+MAX_WH = 7680
+
+
+def session_cache_path(weights_path, cache_dir, providers, ort_version):
+    """
+    Where the optimized copy of an ONNX model is cached.
+    The file name hashes everything the optimized graph depends on: the
+    weights file (path, size and modification time), the ONNX Runtime
+    version and the execution providers. Any change gives a new file, so a
+    stale cache is never loaded.
+    """
+    weights_path = Path(weights_path).resolve()
+    stat = weights_path.stat()
+    provider_names = [p[0] if isinstance(p, tuple) else p for p in providers]
+    key = f"{weights_path}|{stat.st_size}|{stat.st_mtime_ns}|{ort_version}|{','.join(provider_names)}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return Path(cache_dir) / f"{weights_path.stem}.{digest}.optimized.onnx"
+
+
+def letterbox_params(frame_shape, input_shape):
+    """
+    Computes the letterbox geometry used to fit a frame into the model input.
+
+    Parameters
+    ----------
+    frame_shape : tuple
+        (height, width) of the source frame.
+    input_shape : tuple
+        (height, width) of the model input.
+
+    Returns
+    -------
+    ratio : float
+        Scale applied to the frame.
+    new_shape : tuple
+        (height, width) of the resized frame.
+    pad : tuple
+        (left, top) padding in pixels.
+    """
+    h0, w0 = frame_shape
+    h, w = input_shape
+    ratio = min(h / h0, w / w0)
+    new_h, new_w = int(round(h0 * ratio)), int(round(w0 * ratio))
+    pad_w, pad_h = (w - new_w) / 2, (h - new_h) / 2
+    left, top = int(round(pad_w - 0.1)), int(round(pad_h - 0.1))
+    return ratio, (new_h, new_w), (left, top)
+
+
+def rect_input_shape(frame_shape, input_shape, stride=32):
+    """
+    Smallest model input that holds a frame letterboxed into `input_shape`:
+    the resized frame rounded up to a multiple of `stride`, as ultralytics
+    does for PyTorch models. A 480x640 frame into 640x640 gives 480x640, with
+    no padding rows at all.
+    """
+    ratio, (new_h, new_w), _ = letterbox_params(frame_shape, input_shape)
+    return math.ceil(new_h / stride) * stride, math.ceil(new_w / stride) * stride
+
+
+def letterbox_into(frame, out, ratio, new_shape, pad):
+    """
+    Writes a BGR uint8 frame into a preallocated (3, H, W) input tensor.
+    The BGR to RGB swap, HWC to CHW transpose and 1/255 scaling happen in
+    a single strided NumPy pass. The padding area of `out` is not touched,
+    so it only needs to be filled once per input geometry.
+    """
+    new_h, new_w = new_shape
+    left, top = pad
+    if frame.shape[:2] != (new_h, new_w):
+        import cv2
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    np.multiply(frame[..., ::-1].transpose(2, 0, 1), out.dtype.type(1 / 255.0),
+                out=out[:, top:top + new_h, left:left + new_w], casting="unsafe")
+
+
+def nms(boxes, scores, iou_threshold):
+    """
+    Greedy non-maximum suppression over (N, 4) xyxy boxes.
+    Each iteration suppresses every remaining box against the current
+    best one in a single vectorized IoU computation.
+
+    Returns
+    -------
+    keep : np.ndarray
+        Indices of the kept boxes, sorted by descending score.
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.asarray(keep, dtype=np.intp)
+
+
+def decode_predictions(pred, conf_threshold, iou_threshold=0.7, max_det=300, max_nms=30000):
+    """
+    Decodes a raw YOLOv8 output of shape (4 + nc, anchors) into boxes.
+
+    Parameters
+    ----------
+    pred : np.ndarray
+        Raw model output for one image; rows are (cx, cy, w, h, class scores...).
+    conf_threshold : float
+        Minimum class score for a candidate box.
+    iou_threshold : float, optional
+        IoU threshold for NMS (default is 0.7, as in ultralytics).
+    max_det : int, optional
+        Maximum number of detections kept (default is 300).
+    max_nms : int, optional
+        Maximum number of candidates passed into NMS (default is 30000).
+
+    Returns
+    -------
+    xyxy, conf, cls : np.ndarray
+        Boxes in model input coordinates, scores and class ids.
+    """
+    scores = pred[4:]
+    cls = scores.argmax(axis=0)
+    conf = scores.max(axis=0)
+
+    candidates = np.flatnonzero(conf > conf_threshold)
+    if candidates.size > max_nms:
+        candidates = candidates[np.argsort(conf[candidates])[::-1][:max_nms]]
+
+    boxes = xywh_to_xyxy(pred[:4, candidates].T.astype(np.float32))
+    conf = conf[candidates].astype(np.float32)
+    cls = cls[candidates]
+
+    # Offset boxes by class so one NMS pass never suppresses across classes
+    keep = nms(boxes + cls[:, None] * MAX_WH, conf, iou_threshold)[:max_det]
+    return boxes[keep], conf[keep], cls[keep]
+
+
+def scale_boxes(boxes, ratio, pad, frame_shape):
+    """Maps xyxy boxes from model input coordinates back onto the source frame."""
+    left, top = pad
+    boxes[:, [0, 2]] -= left
+    boxes[:, [1, 3]] -= top
+    boxes /= ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+    return boxes
+
+
+class OnnxSybilBackend:
+    """
+    Standalone ONNX Runtime backend for SYBIL.
+    Runs exported YOLOv8 models with NumPy pre- and post-processing,
+    without importing ultralytics or PyTorch.
+    """
+
+    def __init__(self, weights_path: str, providers=None,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 iou_threshold: float = 0.7, max_det: int = 300, cache_dir: str = None,
+                 rect: bool = True):
+        """
+        Creates the ONNX Runtime session. Input tensors are preallocated
+        per batch size on first use.
+
+        Parameters
+        ----------
+        weights_path : str
+            Path to the exported `.onnx` model.
+        providers : list, optional
+            ONNX Runtime execution providers in priority order
+            (default is ["CPUExecutionProvider"]).
+        intra_op_threads : int, optional
+            Threads used inside an operator; 0 lets ONNX Runtime decide.
+        inter_op_threads : int, optional
+            Threads used across operators; 0 lets ONNX Runtime decide.
+        iou_threshold : float, optional
+            IoU threshold used by NMS (default is 0.7).
+        max_det : int, optional
+            Maximum detections returned per frame (default is 300).
+        cache_dir : str, optional
+            Folder for the optimized session cache. The first run saves the
+            fully optimized graph there; later runs load it with graph
+            optimization turned off. TensorRT engines are cached in the same
+            folder. Default is None (no cache).
+        rect : bool, optional
+            For models exported with a dynamic input size, size each input
+            to the frame (480x640 for the RealSense) instead of padding it to
+            the square export size (default is True). Models exported with a
+            fixed rectangular size, e.g. `imgsz=(480, 640)`, need no padding
+            either way.
+
+        Why it's useful:
+        ----------------
+        - Starts fast and keeps the Jetson node free of PyTorch.
+        - Thread and provider settings can be tuned per device.
+        - The input buffer is reused on every call instead of reallocated.
+        - With `cache_dir`, graph optimization (and TensorRT engine building)
+          is paid once per model instead of on every start.
+        - Rectangular inputs skip the grey padding rows that take about a
+          quarter of a square 640x640 forward pass on 640x480 frames.
+        """
+        import onnxruntime as ort
+
+        providers = list(providers or ["CPUExecutionProvider"])
+        self.cache_path = None
+        # "hit" / "miss" when the session cache is used, None otherwise
+        self.cache_status = None
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+
+        model_path = Path(weights_path)
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            providers = [self._with_engine_cache(p, cache_dir) for p in providers]
+            # Graphs holding TensorRT-compiled nodes cannot be saved; TensorRT
+            # caches its engines itself (above)
+            if "TensorrtExecutionProvider" not in [p[0] if isinstance(p, tuple) else p for p in providers]:
+                self.cache_path = session_cache_path(model_path, cache_dir, providers, ort.__version__)
+
+        if self.cache_path is not None and self.cache_path.exists():
+            try:
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+                self.session = ort.InferenceSession(str(self.cache_path), sess_options=options, providers=providers)
+                self.cache_status = "hit"
+            except Exception:
+                # Unreadable cache (e.g. an interrupted write): rebuild it below
+                os.remove(self.cache_path)
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        if self.cache_status is None:
+            staging_path = None
+            if self.cache_path is not None:
+                # Written next to the cache and renamed once complete, so a
+                # crash mid-write never leaves a half-written cache behind
+                staging_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+                options.optimized_model_filepath = str(staging_path)
+            self.session = ort.InferenceSession(str(model_path), sess_options=options, providers=providers)
+            if staging_path is not None and staging_path.exists():
+                os.replace(staging_path, self.cache_path)
+                self.cache_status = "miss"
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {0: "litter"}
+
+        # Static exports fix the batch size; dynamic exports accept any batch
+        self.max_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+        # Static exports carry their input size; fall back to the export metadata otherwise
+        height, width = model_input.shape[2], model_input.shape[3]
+        self.dynamic_shape = not isinstance(height, int) or not isinstance(width, int)
+        if self.dynamic_shape:
+            imgsz = ast.literal_eval(metadata.get("imgsz", "[640, 640]"))
+            height, width = imgsz
+        self.input_shape = (height, width)
+        self.stride = int(metadata.get("stride", 32))
+        self.rect = rect
+
+        self.input_dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+
+        # One preallocated input tensor per (batch size, input shape), plus the
+        # frame shape last written into each slot (padding is only refilled when it changes)
+        self._inputs = {}
+        self._slot_shapes = {}
+
+    @staticmethod
+    def _with_engine_cache(provider, cache_dir):
+        """Turns on TensorRT's engine cache in `cache_dir`; other providers are returned unchanged."""
+        name, provider_options = provider if isinstance(provider, tuple) else (provider, {})
+        if name != "TensorrtExecutionProvider":
+            return provider
+        provider_options = dict(provider_options)
+        provider_options.setdefault("trt_engine_cache_enable", True)
+        provider_options.setdefault("trt_engine_cache_path", str(cache_dir))
+        return name, provider_options
+
+    def _input_buffer(self, batch_size: int, input_shape):
+        key = (batch_size, input_shape)
+        if key not in self._inputs:
+            height, width = input_shape
+            self._inputs[key] = np.full((batch_size, 3, height, width), PAD_VALUE, dtype=self.input_dtype)
+            self._slot_shapes[key] = [None] * batch_size
+        return self._inputs[key], self._slot_shapes[key]
+
+    def input_shape_for(self, frame_shape):
+        """
+        (height, width) of the model input used for a frame of `frame_shape`:
+        the export size, or the rectangular size for dynamic models with `rect`.
+        """
+        if self.dynamic_shape and self.rect:
+            return rect_input_shape(frame_shape[:2], self.input_shape, self.stride)
+        return self.input_shape
+
+    def preprocess(self, frames):
+        """
+        Letterboxes BGR frames into the preallocated input tensor.
+
+        Parameters
+        ----------
+        frames : list of np.ndarray
+            Frames to place in the batch, one per slot.
+
+        Returns
+        -------
+        tensor : np.ndarray
+            (N, 3, H, W) model input.
+        geometry : list
+            (ratio, pad) per frame, needed to map boxes back onto the frame.
+        """
+        # Frames of one batch share a tensor, so it must hold the largest of them
+        shapes = [self.input_shape_for(frame.shape) for frame in frames]
+        input_shape = (max(h for h, _ in shapes), max(w for _, w in shapes))
+
+        tensor, slot_shapes = self._input_buffer(len(frames), input_shape)
+        geometry = []
+        for i, frame in enumerate(frames):
+            ratio, new_shape, pad = letterbox_params(frame.shape[:2], input_shape)
+            if slot_shapes[i] != frame.shape[:2]:
+                tensor[i].fill(PAD_VALUE)
+                slot_shapes[i] = frame.shape[:2]
+            letterbox_into(frame, tensor[i], ratio, new_shape, pad)
+            geometry.append((ratio, pad))
+        return tensor, geometry
+
+    def __call__(self, frame: np.ndarray, conf: float = 0.25):
+        """
+        Runs detection on a single BGR frame.
+
+        Returns
+        -------
+        results : list
+            A one-element list holding the frame's `Detections`,
+            mirroring the list returned by ultralytics.
+        """
+        return self.infer_batch([frame], conf=conf)
+
+    def infer_batch(self, frames, conf: float = 0.25):
+        """
+        Runs detection on several BGR frames in a single forward pass.
+        Models exported with a fixed batch size are run in chunks of that size.
+
+        Returns
+        -------
+        detections : list of Detections
+            One entry per input frame, in order.
+        """
+        if not frames:
+            return []
+        chunk = self.max_batch or len(frames)
+        results = []
+        for start in range(0, len(frames), chunk):
+            batch = list(frames[start:start + chunk])
+            count = len(batch)
+
+            # Fixed-batch models need a full batch; repeat the last frame and drop its results
+            if self.max_batch:
+                batch += [batch[-1]] * (self.max_batch - count)
+            results.extend(self._run(batch, conf)[:count])
+        return results
+
+    def _run(self, frames, conf):
+        t0 = time.perf_counter()
+        tensor, geometry = self.preprocess(frames)
+
+        t1 = time.perf_counter()
+        pred = self.session.run([self.output_name], {self.input_name: tensor})[0]
+
+        t2 = time.perf_counter()
+        decoded = []
+        for i, frame in enumerate(frames):
+            xyxy, scores, cls = decode_predictions(pred[i], conf, self.iou_threshold, self.max_det)
+            ratio, pad = geometry[i]
+            decoded.append((scale_boxes(xyxy, ratio, pad, frame.shape[:2]), scores, cls))
+        t3 = time.perf_counter()
+
+        # Timings are per image, as in ultralytics
+        n = len(frames)
+        speed = {
+            "preprocess": (t1 - t0) * 1000 / n,
+            "inference": (t2 - t1) * 1000 / n,
+            "postprocess": (t3 - t2) * 1000 / n,
+        }
+        return [Detections(xyxy, scores, cls, speed=dict(speed)) for xyxy, scores, cls in decoded]
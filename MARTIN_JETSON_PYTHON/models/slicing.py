@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+
+from models.detections import Detections
+from models.onnx_backend import MAX_WH
+
+
+def parse_tiles(text):
+    """Parses a "ROWSxCOLS" tile grid, e.g. "2x3" -> (2, 3)."""
+    rows, cols = (int(n) for n in text.lower().split("x"))
+    if rows < 1 or cols < 1:
+        raise ValueError(f"tile grid must be at least 1x1, got {text!r}")
+    return rows, cols
+
+
+def tile_windows(frame_shape, tiles=(2, 2), overlap: float = 0.2, roi=None):
+    """
+    Splits a frame (or a region of it) into a grid of overlapping tiles.
+
+    Parameters
+    ----------
+    frame_shape : tuple
+        (height, width) of the frame.
+    tiles : tuple, optional
+        (rows, columns) of the grid (default is (2, 2)).
+    overlap : float, optional
+        Fraction of a tile shared with its neighbour (default is 0.2).
+    roi : tuple, optional
+        (x1, y1, x2, y2) region to tile, e.g. the ground plane (default is the whole frame).
+
+    Returns
+    -------
+    windows : np.ndarray
+        (rows * columns, 4) integer tile windows as (x1, y1, x2, y2).
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError(f"overlap must be in [0, 1), got {overlap}")
+    height, width = frame_shape[:2]
+    x0, y0, x1, y1 = roi if roi is not None else (0, 0, width, height)
+    x0, x1 = max(0, int(x0)), min(width, int(x1))
+    y0, y1 = max(0, int(y0)), min(height, int(y1))
+    rows, cols = tiles
+
+    def spans(start, stop, count):
+        # count tiles of equal size covering [start, stop), neighbours overlapping by `overlap`
+        size = (stop - start) / (count - (count - 1) * overlap)
+        step = size * (1 - overlap)
+        lo = np.round(start + step * np.arange(count)).astype(np.int64)
+        hi = np.minimum(np.round(lo + size).astype(np.int64), stop)
+        hi[-1] = stop
+        return lo, hi
+
+    xs_lo, xs_hi = spans(x0, x1, cols)
+    ys_lo, ys_hi = spans(y0, y1, rows)
+    windows = [(xl, yl, xh, yh) for yl, yh in zip(ys_lo, ys_hi) for xl, xh in zip(xs_lo, xs_hi)]
+    return np.asarray(windows, dtype=np.int64)
+
+
+def merge_ios(boxes, scores, threshold):
+    """
+    Greedy non-maximum merging on intersection over the smaller box (IoS).
+    Works like NMS, but each kept box grows to the union of the boxes it
+    suppresses. An object split by a tile border comes back whole, and a
+    fragment inside its full-size counterpart overlaps it almost entirely
+    (IoS close to 1, IoU only about 0.5).
+
+    Returns
+    -------
+    keep : np.ndarray
+        Indices of the kept boxes, sorted by descending score.
+    merged : np.ndarray
+        (len(keep), 4) merged boxes, one per kept index.
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep, merged = [], []
+    while order.size > 0:
+        i = order[0]
+        rest = order[1:]
+
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        ios = inter_w * inter_h / (np.minimum(areas[i], areas[rest]) + 1e-7)
+
+        group = np.concatenate([[i], rest[ios > threshold]])
+        keep.append(i)
+        merged.append([x1[group].min(), y1[group].min(), x2[group].max(), y2[group].max()])
+        order = rest[ios <= threshold]
+
+    return np.asarray(keep, dtype=np.intp), np.asarray(merged, dtype=np.float32).reshape(-1, 4)
+
+
+def merge_tile_detections(tile_detections, windows, frame_shape, ios_threshold: float = 0.5,
+                          max_det: int = 300):
+    """
+    Maps per-tile detections back to frame coordinates and merges them.
+
+    Parameters
+    ----------
+    tile_detections : list of Detections
+        One entry per tile (and optionally the full frame last).
+    windows : np.ndarray
+        (K, 4) windows (x1, y1, x2, y2) the detections were found in; the
+        full frame is the window (0, 0, width, height).
+    frame_shape : tuple
+        (height, width) of the frame.
+    ios_threshold : float, optional
+        Same-class boxes overlapping more than this (intersection over the
+        smaller box) are merged into one box with the highest score (default is 0.5).
+    max_det : int, optional
+        Maximum detections returned (default is 300).
+
+    Returns
+    -------
+    detections : Detections
+        Merged detections in frame coordinates. `speed` sums the tiles'
+        per-image timings, plus the merge under "postprocess".
+    """
+    t0 = time.perf_counter()
+
+    xyxy = [d.xyxy + np.tile(window[:2], 2).astype(np.float32) for d, window in zip(tile_detections, windows)]
+    xyxy = np.concatenate(xyxy) if xyxy else np.zeros((0, 4), dtype=np.float32)
+    conf = np.concatenate([d.conf for d in tile_detections]) if tile_detections else np.zeros(0, np.float32)
+    cls = np.concatenate([d.cls for d in tile_detections]) if tile_detections else np.zeros(0, np.int64)
+
+    height, width = frame_shape[:2]
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+
+    # Offset boxes by class so one pass never merges across classes
+    offsets = cls[:, None].astype(np.float32) * MAX_WH
+    keep, merged = merge_ios(xyxy + offsets, conf, ios_threshold)
+    keep, merged = keep[:max_det], merged[:max_det] - offsets[keep[:max_det]]
+
+    speed = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}
+    for d in tile_detections:
+        for key in speed:
+            speed[key] += d.speed.get(key, 0.0)
+    speed["postprocess"] += (time.perf_counter() - t0) * 1000
+    return Detections(merged, conf[keep], cls[keep], speed=speed)
@@ -1,58 +1,333 @@
-from sensors.RealSense import RealSenseCamera
+import time
+
+# Taken before the project imports below, so the startup report includes them
+STARTED_AT = time.perf_counter()
+
+from sensors.frame_source import add_source_arguments, open_source
 from models.SYBIL import SybilModel
+from models.slicing import parse_tiles
 from utils.depth_ops import (
-    depth_at_pixel,
-    bbox_to_xyz_xywh,
-    bbox_real_world_size
+    bboxes_to_xyz,
+    bboxes_real_world_size,
+    row_or_none,
+    DepthStats
 )
+from utils.filtering import MultiObjectTracker
+from utils.litter_map import LitterMap, camera_to_world
+from utils.motion_gate import MotionGate, MotionGatedModel
+from utils.scheduler import DetectionScheduler
+from utils.pipeline import SybilPipeline, FRAMES_PROCESSED, DETECTIONS, FRAME_AGE
+from utils.metrics import REGISTRY, add_metrics_arguments, start_metrics
+from utils.startup import StartupTimer
 
-import time
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import math
+import os
 import numpy as np
 
-def main():
+DEFAULT_MODEL_PATH = r"C:\Users\brand\Documents\College\2025\MARTIN\SYBIL\runs\final\yolov8m_best_full_retrain\weights\best.pt"
 
-    # Initialize RealSense
-    camera = RealSenseCamera()
+# Optimized ONNX Runtime sessions (and TensorRT engines) are cached here with --fast-start
+DEFAULT_SESSION_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "sybil", "sessions")
 
-    # Load SYBIL model
-    model_path = r"C:\Users\brand\Documents\College\2025\MARTIN\SYBIL\runs\final\yolov8m_best_full_retrain\weights\best.pt"
-    SYBIL = SybilModel(model_path)
 
-    intrinsics = camera.get_intrinsics()
-    depth_scale = camera.get_depth_scale()
+def print_detections(detections):
+    for det in detections:
+        print("\nDetection:")
+        print(f"  Captured at: {det['timestamp']:.3f} s (frame {det['seq']})")
+        print(f"  2D bbox (xyxy): {det['xyxy']}")
+        print(f"  3D position (m): {det['xyz']}")
+        print(f"  Real-world size (m): {det['size']}")
+
+
+def print_tracks(events):
+    for track in events["born"]:
+        print(f"\nNew litter #{track['id']}: position (m) {track['xyz']}, size (m) {track['size']}")
+    for track in events["died"]:
+        print(f"\nLost litter #{track['id']} after {track['age']} frames")
+
+
+def print_map_events(events, litter_map):
+    for item in litter_map.get(events["new"]):
+        print(f"\nMapped litter #{item['id']}: world position (m) {item['xyz']}, size (m) {item['size']}")
 
-    print("SYBIL node running...")
+
+def open_litter_map(args):
+    if args.map_file and os.path.exists(args.map_file):
+        litter_map = LitterMap.load(args.map_file, max_age_s=args.map_max_age)
+        print(f"🗺️ Loaded {len(litter_map)} mapped litter items from {args.map_file}")
+        return litter_map
+    return LitterMap(max_age_s=args.map_max_age)
+
+
+def run_serial(camera, SYBIL, intrinsics, depth_scale, roi_depth=False, tracker=None,
+               litter_map=None, pose=None):
+    # Only set when the camera leaves depth unaligned (--align lazy)
+    aligner = camera.get_depth_aligner()
 
     while True:
         # Get RGB + depth frames
         rgb, depth = camera.get_frames()
+        captured_at = time.perf_counter()
         if rgb is None:
+            if camera.finished:
+                break
             continue
 
-        # Run SYBIL inference
-        results = SYBIL.infer(rgb)
+        # Run SYBIL inference (boxes come back as host NumPy arrays)
+        detections = SYBIL.detect(rgb, timestamp=camera.get_timestamp())
+        boxes_xyxy = detections.xyxy
+        boxes_xywh = detections.xywh
 
-        # YOLO returns a list; take the first result
-        boxes_xyxy = results[0].boxes.xyxy.cpu().numpy()
-        boxes_xywh = results[0].boxes.xywh.cpu().numpy()
+        # Align depth to color around the detected boxes only
+        if aligner is not None:
+            depth = aligner.align_boxes(depth, boxes_xyxy)
 
-        for i in range(len(boxes_xyxy)):
-            xyxy = boxes_xyxy[i]
-            xywh = boxes_xywh[i]
+        # Robust per-box depth from the box statistics, or the center pixel by default
+        depths_m = None
+        if roi_depth:
+            depths_m = DepthStats(depth, depth_scale).robust_depth(boxes_xyxy)
 
-            # 3D coordinate of the object
-            xyz = bbox_to_xyz_xywh(xywh, depth, intrinsics, depth_scale)
+        # 3D coordinates and real-world sizes of every object in one vectorized call
+        xyzs = bboxes_to_xyz(boxes_xywh, depth, intrinsics, depth_scale, depths_m)
+        sizes = bboxes_real_world_size(boxes_xyxy, boxes_xywh, depth, intrinsics, depth_scale, depths_m)
 
-            # Real-world size of the object
-            size = bbox_real_world_size(xyxy, xywh, depth, intrinsics, depth_scale)
+        if litter_map is not None:
+            # Report each piece of litter once, in the world frame
+            print_map_events(litter_map.add_detections(xyzs, detections.conf, detections.cls, sizes,
+                                                       camera.get_timestamp(), pose), litter_map)
+        if tracker is not None:
+            # Report each piece of litter once, with smoothed 3D data
+            print_tracks(tracker.update(boxes_xyxy, detections.conf, detections.cls, xyzs, sizes,
+                                        timestamp=camera.get_timestamp()))
+        elif litter_map is None:
+            for i in range(len(boxes_xyxy)):
+                print("\nDetection:")
+                print(f"  2D bbox (xyxy): {boxes_xyxy[i]}")
+                print(f"  3D position (m): {row_or_none(xyzs[i])}")
+                print(f"  Real-world size (m): {row_or_none(sizes[i])}")
 
-            print("\nDetection:")
-            print(f"  2D bbox (xyxy): {xyxy}")
-            print(f"  3D position (m): {xyz}")
-            print(f"  Real-world size (m): {size}")
+        if REGISTRY.enabled:
+            FRAMES_PROCESSED.inc()
+            DETECTIONS.inc(len(boxes_xyxy))
+            FRAME_AGE.set(time.perf_counter() - captured_at)
 
         time.sleep(0.01)
 
 
+def run_scheduled(camera, scheduler, intrinsics, depth_scale, roi_depth=False, litter_map=None, pose=None):
+    aligner = camera.get_depth_aligner()
+
+    while True:
+        rgb, depth = camera.get_frames()
+        if rgb is None:
+            if camera.finished:
+                break
+            continue
+
+        # 3D data is only measured on frames that go through the detector
+        def measure(detections):
+            frame_depth = depth if aligner is None else aligner.align_boxes(depth, detections.xyxy)
+            depths_m = None
+            if roi_depth:
+                depths_m = DepthStats(frame_depth, depth_scale).robust_depth(detections.xyxy)
+            xyzs = bboxes_to_xyz(detections.xywh, frame_depth, intrinsics, depth_scale, depths_m)
+            sizes = bboxes_real_world_size(detections.xyxy, detections.xywh, frame_depth,
+                                           intrinsics, depth_scale, depths_m)
+            if litter_map is not None:
+                print_map_events(litter_map.add_detections(xyzs, detections.conf, detections.cls, sizes,
+                                                           camera.get_timestamp(), pose), litter_map)
+            return xyzs, sizes
+
+        events, _ = scheduler.step(rgb, camera.get_timestamp(), measure)
+        print_tracks(events)
+
+    print(f"\nScheduler stats: {scheduler.stats()}")
+
+
+def run_pipeline(camera, SYBIL, intrinsics, depth_scale, queue_size, roi_depth=False, tracker=None,
+                 litter_map=None, pose=None):
+    def update_map(packet, detections):
+        events = litter_map.add_detections(packet["xyz"], packet["conf"], packet["cls"], packet["sizes"],
+                                           packet["timestamp"], pose)
+        print_map_events(events, litter_map)
+
+    pipeline = SybilPipeline(camera, SYBIL, intrinsics, depth_scale,
+                             on_detections=print_detections if tracker is None and litter_map is None else None,
+                             on_frame=update_map if litter_map is not None else None,
+                             queue_size=queue_size,
+                             roi_depth=roi_depth,
+                             tracker=tracker,
+                             on_tracks=print_tracks)
+    pipeline.start()
+    try:
+        while pipeline.is_running():
+            time.sleep(0.5)
+    finally:
+        pipeline.stop()
+        print(f"\nPipeline stats: {pipeline.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SYBIL with real-world coordinates")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run capture, inference and post-processing on separate threads")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="capacity of each inter-stage queue in pipeline mode")
+    parser.add_argument("--weights", default=DEFAULT_MODEL_PATH,
+                        help="path to the SYBIL weights (.pt or .onnx)")
+    parser.add_argument("--backend", default="auto", choices=["auto", "ultralytics", "onnxruntime"],
+                        help="inference backend; onnxruntime skips ultralytics and PyTorch")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ONNX Runtime intra-op threads (0 lets ONNX Runtime decide)")
+    parser.add_argument("--server", default=None, metavar="SOCKET",
+                        help="use the model of a running models.inference_server instead of loading the weights")
+    parser.add_argument("--roi-depth", action="store_true",
+                        help="estimate depth from box statistics instead of the center pixel")
+    parser.add_argument("--track", action="store_true",
+                        help="track litter across frames and report births and deaths only")
+    parser.add_argument("--schedule", action="store_true",
+                        help="detect every N frames and track in between (implies --track)")
+    parser.add_argument("--max-interval", type=int, default=10,
+                        help="most frames between two detections with --schedule")
+    parser.add_argument("--target-latency", type=float, default=None,
+                        help="average per-frame latency budget in ms with --schedule")
+    parser.add_argument("--max-detect-rate", type=float, default=None,
+                        help="power budget: most detector runs per second with --schedule")
+    parser.add_argument("--slice", type=parse_tiles, default=None, metavar="ROWSxCOLS",
+                        help="sliced inference on a grid of overlapping tiles, e.g. 2x2, for small distant litter")
+    parser.add_argument("--slice-overlap", type=float, default=0.2,
+                        help="fraction of a tile shared with its neighbour with --slice")
+    parser.add_argument("--slice-roi", type=int, nargs=4, default=None, metavar=("X1", "Y1", "X2", "Y2"),
+                        help="only tile this region with --slice, e.g. the ground ahead")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="reuse the last detections while the scene is unchanged (robot stopped or slow)")
+    parser.add_argument("--gate-threshold", type=float, default=0.005,
+                        help="fraction of the frame that must change to rerun the model with --motion-gate")
+    parser.add_argument("--gate-max-frames", type=int, default=15,
+                        help="most frames in a row served from cached detections with --motion-gate")
+    parser.add_argument("--gate-max-age", type=float, default=0.5,
+                        help="oldest cached detections (seconds) reused with --motion-gate")
+    parser.add_argument("--map", action="store_true",
+                        help="keep a world-frame litter map and report each piece of litter once")
+    parser.add_argument("--map-file", default=None,
+                        help="load the litter map from this file at start and save it on exit (implies --map)")
+    parser.add_argument("--map-max-age", type=float, default=None,
+                        help="forget mapped litter not seen for this many seconds")
+    parser.add_argument("--camera-height", type=float, default=0.0,
+                        help="camera height above the ground in meters, for the litter map")
+    parser.add_argument("--camera-pitch", type=float, default=0.0,
+                        help="downward camera tilt in degrees, for the litter map")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="load and warm up the model while the camera warms up, with the session cache on")
+    parser.add_argument("--warmup-runs", type=int, default=2,
+                        help="blank-frame forward passes run before the first frame with --fast-start (0 = none)")
+    parser.add_argument("--session-cache", default=None, metavar="DIR",
+                        help="cache the optimized ONNX Runtime session here "
+                             f"(default with --fast-start: {DEFAULT_SESSION_CACHE})")
+    parser.add_argument("--startup-report", default=None, metavar="FILE",
+                        help="append the startup-time breakdown to this JSON-lines file")
+    add_source_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.schedule and args.pipeline:
+        parser.error("--schedule runs in the serial loop; drop --pipeline")
+
+    startup = StartupTimer(STARTED_AT)
+    startup.mark("imports")
+
+    # Metrics cost almost nothing unless an export option is given
+    exporter = start_metrics(args)
+
+    session_cache = args.session_cache
+    if session_cache is None and args.fast_start:
+        session_cache = DEFAULT_SESSION_CACHE
+
+    def load_model():
+        with startup.phase("model_load"):
+            model = SybilModel(args.weights, backend=args.backend, intra_op_threads=args.threads,
+                               server=args.server, session_cache=session_cache)
+        if args.slice:
+            model.enable_slicing(args.slice, args.slice_overlap, args.slice_roi)
+        if args.fast_start and args.warmup_runs:
+            with startup.phase("model_warmup"):
+                model.warmup(runs=args.warmup_runs)
+        return model
+
+    if args.fast_start:
+        # The camera's warm-up mostly waits on the device and ONNX Runtime
+        # releases the GIL, so loading the model on a second thread overlaps both
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="sybil-load") as pool:
+            model_future = pool.submit(load_model)
+            # Initialize the frame source (RealSense by default, or a recording)
+            with startup.phase("camera"):
+                camera = open_source(args)
+            try:
+                SYBIL = model_future.result()
+            except BaseException:
+                camera.stop()
+                raise
+    else:
+        with startup.phase("camera"):
+            camera = open_source(args)
+        SYBIL = load_model()
+    loaded_model = SYBIL
+
+    if args.motion_gate:
+        SYBIL = MotionGatedModel(SYBIL, MotionGate(threshold=args.gate_threshold,
+                                                   max_reuse_frames=args.gate_max_frames,
+                                                   max_reuse_age_s=args.gate_max_age))
+
+    intrinsics = camera.get_intrinsics()
+    depth_scale = camera.get_depth_scale()
+
+    tracker = MultiObjectTracker() if args.track or args.schedule else None
+
+    # No odometry yet: the robot stays at the world origin, so the map is in the robot frame
+    litter_map = open_litter_map(args) if args.map or args.map_file else None
+    pose = camera_to_world(camera_offset=(0.0, 0.0, args.camera_height),
+                           camera_pitch=math.radians(args.camera_pitch))
+
+    def on_first_detection(timer):
+        extra = {
+            "backend": SYBIL.backend,
+            "session_cache": getattr(loaded_model.model, "cache_status", None),
+            "fast_start": args.fast_start,
+            "source": args.source,
+        }
+        timer.print_report(**extra)
+        if args.startup_report:
+            timer.save(args.startup_report, **extra)
+
+    startup.watch_first_detection(SYBIL, on_first_detection)
+    startup.mark("ready")
+
+    print("SYBIL node running...")
+
+    try:
+        if args.schedule:
+            scheduler = DetectionScheduler(SYBIL, tracker, max_interval=args.max_interval,
+                                           target_latency_ms=args.target_latency,
+                                           max_detections_per_s=args.max_detect_rate)
+            run_scheduled(camera, scheduler, intrinsics, depth_scale, args.roi_depth, litter_map, pose)
+        elif args.pipeline:
+            run_pipeline(camera, SYBIL, intrinsics, depth_scale, args.queue_size, args.roi_depth, tracker,
+                         litter_map, pose)
+        else:
+            run_serial(camera, SYBIL, intrinsics, depth_scale, args.roi_depth, tracker, litter_map, pose)
+    finally:
+        camera.stop()
+        if args.motion_gate:
+            print(f"\nMotion gate stats: {SYBIL.stats()}")
+        if litter_map is not None:
+            print(f"\nLitter map: {litter_map.stats()}")
+            if args.map_file:
+                litter_map.save(args.map_file)
+                print(f"💾 Saved litter map to {args.map_file}")
+        if exporter is not None:
+            exporter.stop()
+
+
 if __name__ == "__main__":
     main()
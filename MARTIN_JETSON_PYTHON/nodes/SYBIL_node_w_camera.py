@@ -1,95 +1,80 @@
-from sensors.RealSense import RealSenseCamera
+from sensors.frame_source import add_source_arguments, open_source
 from models.SYBIL import SybilModel
-import cv2
 from utils.depth_ops import (
-    depth_at_pixel,
-    bbox_to_xyz_xywh,
-    bbox_real_world_size
+    depth_at_pixels,
+    bboxes_to_xyz
 )
+from utils.render import LatestValue, DisplayThread
 
-import time
-import numpy as np
+import argparse
 
 def main():
+    parser = argparse.ArgumentParser(description="Run SYBIL and display annotated frames")
+    parser.add_argument("--server", default=None, metavar="SOCKET",
+                        help="use the model of a running models.inference_server instead of loading the weights")
+    parser.add_argument("--display-fps", type=float, default=15.0,
+                        help="most frames shown per second; detection runs at its own rate (0 = no cap)")
+    add_source_arguments(parser)
+    args = parser.parse_args()
 
-    # Initialize RealSense
-    camera = RealSenseCamera()
+    # Initialize the frame source (RealSense by default, or a recording)
+    camera = open_source(args)
 
     # Load SYBIL model
     model_path = r"C:\Users\brand\Documents\College\2025\MARTIN\SYBIL\runs\final\yolov8m_best_full_retrain\weights\best.pt"
-    SYBIL = SybilModel(model_path)
+    SYBIL = SybilModel(model_path, server=args.server)
 
     intrinsics = camera.get_intrinsics()
     depth_scale = camera.get_depth_scale()
 
-    print("SYBIL node running...")
-
-    while True:
-        # Get RGB + depth frames
-        rgb, depth = camera.get_frames()
-        if rgb is None:
-            continue
-
-        # Run SYBIL inference
-        results = SYBIL.infer(rgb)
-
-        # YOLO returns a list; take the first result
-        boxes_xyxy = results[0].boxes.xyxy.cpu().numpy()
-        boxes_xywh = results[0].boxes.xywh.cpu().numpy()
-
-        # for i in range(len(boxes_xyxy)):
-        #     xyxy = boxes_xyxy[i]
-        #     xywh = boxes_xywh[i]
-
-        #     # 3D coordinate of the object
-        #     xyz = bbox_to_xyz_xywh(xywh, depth, intrinsics, depth_scale)
-
-        #     # Real-world size of the object
-        #     size = bbox_real_world_size(xyxy, xywh, depth, intrinsics, depth_scale)
-
-        #     print("\nDetection:")
-        #     print(f"  2D bbox (xyxy): {xyxy}")
-        #     print(f"  3D position (m): {xyz}")
-        #     print(f"  Real-world size (m): {size}")
+    # Only set when the camera leaves depth unaligned (--align lazy)
+    aligner = camera.get_depth_aligner()
 
-        for i in range(len(boxes_xyxy)):
-            xyxy = boxes_xyxy[i]
-            xywh = boxes_xywh[i]
+    # Drawing and the window run on their own thread, fed with the latest frame only
+    latest = LatestValue()
+    display = DisplayThread(latest, SYBIL.names, max_fps=args.display_fps)
+    display.start()
 
-            # Extract YOLO info
-            x1, y1, x2, y2 = map(int, xyxy)
-            cx, cy, w, h = xywh
-            cx, cy = int(cx), int(cy)
-
-            cls_id = int(results[0].boxes.cls[i])
-            conf = float(results[0].boxes.conf[i])
-            class_name = SYBIL.model.names[cls_id]
-
-            # Depth + 3D position
-            depth_m = depth[cy, cx] * depth_scale
-            xyz = bbox_to_xyz_xywh(xywh, depth, intrinsics, depth_scale)
-
-            # Draw bounding box
-            cv2.rectangle(rgb, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-            # Draw center point
-            cv2.circle(rgb, (cx, cy), 4, (0, 0, 255), -1)
-
-            # Annotation text
-            label = f"{class_name} {conf:.2f} | depth: {depth_m:.2f}m"
-            if xyz is not None:
-                X, Y, Z = xyz
-                label += f" | XYZ: ({X:.2f}, {Y:.2f}, {Z:.2f})"
-
-            # Put text above the box
-            cv2.putText(rgb, label, (x1, max(0, y1 - 10)),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-        cv2.imshow("SYBIL Detections", rgb) 
-        if cv2.waitKey(1) & 0xFF == ord('q'): 
-            break
+    print("SYBIL node running...")
 
-        time.sleep(0.01)
+    try:
+        while not display.closed.is_set():
+            # Get RGB + depth frames
+            rgb, depth = camera.get_frames()
+            if rgb is None:
+                if camera.finished:
+                    break
+                continue
+
+            # Run SYBIL inference (boxes, scores and classes come back as host NumPy arrays, once per frame)
+            detections = SYBIL.detect(rgb)
+            boxes_xyxy = detections.xyxy
+            boxes_xywh = detections.xywh
+
+            # Align depth to color around the detected boxes only
+            if aligner is not None:
+                depth = aligner.align_boxes(depth, boxes_xyxy)
+
+            # Depth at the box centers and 3D positions of every object in vectorized calls
+            depth_m = depth_at_pixels(depth, boxes_xywh[:, 0], boxes_xywh[:, 1], depth_scale)
+            xyzs = bboxes_to_xyz(boxes_xywh, depth, intrinsics, depth_scale, depth_m)
+
+            # Hand the frame to the display thread; never waits for it.
+            # rgb is copied: on a RealSense it points into librealsense's frame pool,
+            # which recycles it (and is pinned for as long as the display holds it)
+            latest.publish({
+                "rgb": rgb.copy(),
+                "xyxy": boxes_xyxy,
+                "xywh": boxes_xywh,
+                "conf": detections.conf,
+                "cls": detections.cls,
+                "depth_m": depth_m,
+                "xyz": xyzs,
+            })
+    finally:
+        display.stop()
+        camera.stop()
+        print(f"\nDisplay stats: {display.stats()}")
 
 
 if __name__ == "__main__":
@@ -1,20 +1,39 @@
 # sensors/RealSense.py
 
+import time
 import pyrealsense2 as rs
 import numpy as np
-import cv2
 
-class RealSenseCamera:
+from sensors.frame_source import FrameSource
+from utils.metrics import REGISTRY
+
+class RealSenseCamera(FrameSource):
     """
     A reusable RealSense camera interface for MARTIN.
     Handles pipeline configuration, frame alignment, intrinsics,
     and depth scaling. Provides RGB + depth frames ready for CV models.
     """
 
-    def __init__(self, warmup_frames: int = 10):
+    def __init__(self, warmup_frames: int = 10, ring_size: int = 4, zero_copy: bool = False,
+                 align: str = "full"):
         """
         Initializes the RealSense pipeline and prepares the camera.
 
+        Parameters
+        ----------
+        warmup_frames : int, optional
+            Frames discarded at start-up (default is 10).
+        ring_size : int, optional
+            Frames `acquire_frame()` can keep in flight (default is 4).
+        zero_copy : bool, optional
+            Let `acquire_frame()` hand out the SDK's own buffers (default is
+            False). A frame released before the next `acquire_frame()` is
+            then never copied; one still held is copied into the ring.
+        align : str, optional
+            "full" (default) aligns the whole depth frame to color with
+            `rs.align`. "lazy" returns unaligned depth; the node then aligns
+            only the detected boxes with `get_depth_aligner()`.
+
         Why this is useful:
         -------------------
         - Encapsulates all RealSense SDK setup in one place.
@@ -41,6 +60,9 @@ class RealSenseCamera:
         self.depth_scale = depth_sensor.get_depth_scale()
 
         # Alignment object (align depth to color)
+        if align not in ("full", "lazy"):
+            raise ValueError(f"align must be 'full' or 'lazy', got {align}")
+        self.align_mode = align
         self.align = rs.align(rs.stream.color)
 
         # Get intrinsics for 2D to 3D projection
@@ -48,6 +70,23 @@ class RealSenseCamera:
         color_profile = color_stream.as_video_stream_profile()
         self.intrinsics = color_profile.get_intrinsics()
 
+        # Unaligned depth geometry, used to align only the detected boxes
+        depth_profile = profile.get_stream(rs.stream.depth).as_video_stream_profile()
+        self.depth_intrinsics = depth_profile.get_intrinsics()
+        self.depth_to_color = depth_profile.get_extrinsics_to(color_profile)
+        self._aligner = None
+        self._last_frames = None
+
+        # Capture time (seconds) of the last frame returned, and how long
+        # waiting for it and aligning it took (milliseconds)
+        self.timestamp = None
+        self.last_timings = {}
+
+        # Preallocated frames handed out by acquire_frame()
+        self.ring_size = ring_size
+        self.zero_copy = zero_copy
+        self.ring = None
+
         # Warm-up frames
         for _ in range(warmup_frames):
             self.pipeline.wait_for_frames()
@@ -61,26 +100,107 @@ class RealSenseCamera:
         rgb : np.ndarray
             640x480 BGR image from the RealSense color sensor.
         depth : np.ndarray
-            640x480 depth map (in raw depth units).
+            640x480 depth map (in raw depth units). Unaligned in "lazy"
+            align mode: map boxes through `get_depth_aligner()` first.
 
         Why this is useful:
         -------------------
         - Provides synchronized, aligned frames for inference.
         - Keeps RealSense-specific logic out of your CV nodes.
         """
+        rgb, depth, _ = self._wait_for_frames()
+        return rgb, depth
+
+    def acquire_frame(self):
+        """
+        Retrieves an aligned RGB + depth frame pair as a `FrameSlot` from a
+        ring of preallocated buffers. The caller must `release()` it.
+
+        Returns
+        -------
+        slot : FrameSlot or None
+            Holds `rgb`, `depth`, `seq` and `timestamp`; None if the frame was
+            incomplete or every ring slot is still held (an overrun).
+
+        Why this is useful:
+        -------------------
+        - Frames can be queued or kept by a tracker without holding on to
+          librealsense's frame pool, which would stall or recycle it.
+        - Exactly one copy per frame into memory allocated up front, or none
+          in zero-copy mode when the frame is released in time.
+        """
+        rgb, depth, frames = self._wait_for_frames()
+        if rgb is None:
+            return None
+        if self.ring is None:
+            from sensors.frame_ring import FrameRing
+            self.ring = FrameRing(self.ring_size, rgb.shape[1], rgb.shape[0])
+        return self.ring.write(rgb, depth, self.timestamp,
+                               keepalive=frames if self.zero_copy else None)
+
+    @REGISTRY.timed("sybil_camera_get_frames_seconds", "Time spent waiting for and aligning a frame set")
+    def _wait_for_frames(self):
+        t0 = time.perf_counter()
         frames = self.pipeline.wait_for_frames()
-        aligned_frames = self.align.process(frames)
+        self.timestamp = frames.get_timestamp() / 1000.0
+
+        t1 = time.perf_counter()
+        if self.align_mode == "full":
+            aligned_frames = self.align.process(frames)
+            self.last_timings = {
+                "acquire": (t1 - t0) * 1000,
+                "align": (time.perf_counter() - t1) * 1000,
+            }
+        else:
+            aligned_frames = frames
+            self.last_timings = {"acquire": (t1 - t0) * 1000}
+        self._last_frames = frames
 
         color_frame = aligned_frames.get_color_frame()
         depth_frame = aligned_frames.get_depth_frame()
 
         if not color_frame or not depth_frame:
-            return None, None
+            return None, None, None
 
         rgb = np.asanyarray(color_frame.get_data())
         depth = np.asanyarray(depth_frame.get_data())
 
-        return rgb, depth
+        return rgb, depth, aligned_frames
+
+    def get_timestamp(self):
+        """Returns the capture time (seconds) of the last frame set."""
+        return self.timestamp
+
+    def get_depth_aligner(self):
+        """
+        Returns a `DepthAligner` that maps unaligned depth onto the color
+        image around detected boxes, or None in "full" align mode (the depth
+        from `get_frames()` is already aligned).
+        """
+        if self.align_mode == "full":
+            return None
+        if self._aligner is None:
+            from utils.depth_ops import DepthAligner, Extrinsics, PinholeIntrinsics
+            self._aligner = DepthAligner(PinholeIntrinsics.from_rs(self.depth_intrinsics),
+                                         PinholeIntrinsics.from_rs(self.intrinsics),
+                                         Extrinsics.from_rs(self.depth_to_color),
+                                         self.depth_scale)
+        return self._aligner
+
+    def get_aligned_depth(self):
+        """
+        Aligns the whole depth frame of the last frame set to color with
+        `rs.align`, e.g. for visualization in "lazy" align mode.
+
+        Returns
+        -------
+        depth : np.ndarray or None
+            640x480 aligned depth map, or None before the first frame.
+        """
+        if self._last_frames is None:
+            return None
+        aligned_frames = self.align.process(self._last_frames)
+        return np.asanyarray(aligned_frames.get_depth_frame().get_data())
 
     def get_intrinsics(self):
         """Returns RealSense intrinsics for 2D to 3D projection."""
@@ -92,4 +212,6 @@ class RealSenseCamera:
 
     def stop(self):
         """Stops the RealSense pipeline."""
+        if self.ring is not None:
+            self.ring.flush()
         self.pipeline.stop()
@@ -0,0 +1,223 @@
+# sensors/frame_ring.py
+
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+RING_OVERRUNS = REGISTRY.counter("sybil_frame_ring_overruns_total",
+                                 "Frames dropped because every ring slot was still held")
+RING_HOLD_TIME = REGISTRY.histogram("sybil_frame_ring_hold_seconds",
+                                    "Time from capture to release of a ring slot")
+
+
+class FrameSlot:
+    """
+    One color + depth frame owned by a `FrameRing`.
+    The slot stays valid until every holder has called `release()`;
+    after that the ring may overwrite it with a newer frame.
+    """
+
+    def __init__(self, ring, index: int, rgb: np.ndarray, depth: np.ndarray):
+        self.ring = ring
+        self.index = index
+        self.seq = -1
+        self.timestamp = None
+        self.captured_at = None
+        self.rgb = rgb
+        self.depth = depth
+        self._buffers = (rgb, depth)
+        self._keepalive = None
+        self._refs = 0
+
+    def acquire(self):
+        """Adds a holder, e.g. before handing the frame to another thread."""
+        self.ring._acquire(self)
+        return self
+
+    def release(self):
+        """Drops one holder; the last release returns the slot to the ring."""
+        self.ring._release(self)
+
+    def age(self):
+        """Seconds since the frame was captured."""
+        return time.perf_counter() - self.captured_at
+
+    @property
+    def zero_copy(self):
+        """True while `rgb` / `depth` still point into the source's own memory."""
+        return self._keepalive is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class FrameRing:
+    """
+    A fixed ring of preallocated color + depth buffers with explicit
+    acquire / release. Frames are written by a single producer (the camera
+    thread) and may be held by any number of consumers.
+    """
+
+    def __init__(self, size: int = 4, width: int = 640, height: int = 480):
+        """
+        Parameters
+        ----------
+        size : int, optional
+            Number of frames that can be held at once (default is 4).
+        width, height : int, optional
+            Frame size in pixels (default is 640x480).
+
+        Why it's useful:
+        ----------------
+        - Consumers can keep frames across iterations (queues, trackers,
+          recorders) without pinning the camera SDK's frame pool.
+        - No per-frame allocation: every frame is copied exactly once into
+          memory allocated up front, or not at all in zero-copy mode when the
+          consumer releases it before the next frame arrives.
+        - Sequence numbers, frame ages and overruns show how far behind the
+          consumers are.
+        """
+        if size < 1:
+            raise ValueError(f"FrameRing size must be at least 1, got {size}")
+        self.width = width
+        self.height = height
+        self._color = np.empty((size, height, width, 3), dtype=np.uint8)
+        self._depth = np.empty((size, height, width), dtype=np.uint16)
+        self._slots = [FrameSlot(self, i, self._color[i], self._depth[i]) for i in range(size)]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._seq = 0
+        self._pending = None  # Zero-copy slot that still points into source memory
+
+        self.frames = 0
+        self.copies = 0
+        self.zero_copy_frames = 0
+        self.detached = 0
+        self.overruns = 0
+        self._released = 0
+        self._release_age_total = 0.0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def write(self, rgb: np.ndarray, depth: np.ndarray, timestamp: float = None, keepalive=None):
+        """
+        Stores a new frame and returns its slot, held once by the caller.
+
+        Parameters
+        ----------
+        rgb, depth : np.ndarray
+            Color (H x W x 3, uint8) and depth (H x W, uint16) frames.
+        timestamp : float, optional
+            Capture time (seconds) reported by the source.
+        keepalive : object, optional
+            Zero-copy mode: the slot keeps pointing at `rgb` / `depth` and
+            holds `keepalive` (e.g. the SDK frameset) until it is released.
+            If it is still held when the next frame is written, it is copied
+            into ring memory then, so the source's buffer can be reused.
+
+        Returns
+        -------
+        slot : FrameSlot or None
+            None if every slot is still held (an overrun; the frame is dropped).
+        """
+        self._detach_pending()
+
+        with self._lock:
+            slot = None
+            for step in range(len(self._slots)):
+                candidate = self._slots[(self._next + step) % len(self._slots)]
+                if candidate._refs == 0:
+                    slot = candidate
+                    break
+            if slot is None:
+                self.overruns += 1
+                if REGISTRY.enabled:
+                    RING_OVERRUNS.inc()
+                return None
+            self._next = (slot.index + 1) % len(self._slots)
+            slot._refs = 1
+            slot.seq = self._seq
+            self._seq += 1
+
+        slot.timestamp = timestamp
+        slot.captured_at = time.perf_counter()
+        if keepalive is None:
+            np.copyto(slot._buffers[0], rgb)
+            np.copyto(slot._buffers[1], depth)
+            slot.rgb, slot.depth = slot._buffers
+            self.copies += 1
+        else:
+            slot.rgb, slot.depth = rgb, depth
+            slot._keepalive = keepalive
+            self._pending = slot
+        self.frames += 1
+        return slot
+
+    def flush(self):
+        """Copies a still-held zero-copy frame into ring memory (e.g. before the source stops)."""
+        self._detach_pending()
+
+    def _detach_pending(self):
+        slot = self._pending
+        if slot is None:
+            return
+        self._pending = None
+        # Copied under the lock: a concurrent release() would otherwise drop the
+        # keepalive, letting the source reuse its buffer in the middle of the copy
+        with self._lock:
+            if slot._keepalive is None:
+                return  # Already released: the frame never needed a copy
+            np.copyto(slot._buffers[0], slot.rgb)
+            np.copyto(slot._buffers[1], slot.depth)
+            slot.rgb, slot.depth = slot._buffers
+            slot._keepalive = None
+            self.copies += 1
+            self.detached += 1
+
+    def _acquire(self, slot):
+        with self._lock:
+            if slot._refs == 0:
+                raise RuntimeError(f"Frame slot {slot.index} was already returned to the ring")
+            slot._refs += 1
+
+    def _release(self, slot):
+        with self._lock:
+            if slot._refs == 0:
+                raise RuntimeError(f"Frame slot {slot.index} released more times than acquired")
+            slot._refs -= 1
+            if slot._refs > 0:
+                return
+            if slot._keepalive is not None:
+                # Released before the next frame: zero copies for this one
+                slot._keepalive = None
+                self.zero_copy_frames += 1
+            age = slot.age()
+            self._released += 1
+            self._release_age_total += age
+        if REGISTRY.enabled:
+            RING_HOLD_TIME.observe(age)
+
+    def stats(self):
+        """Returns frame, copy and overrun counters plus frame ages (ms)."""
+        with self._lock:
+            held = [slot for slot in self._slots if slot._refs > 0]
+            oldest = max((slot.age() for slot in held), default=0.0)
+            mean_age = self._release_age_total / self._released if self._released else 0.0
+            return {
+                "frames": self.frames,
+                "copies": self.copies,
+                "zero_copy_frames": self.zero_copy_frames,
+                "detached": self.detached,
+                "overruns": self.overruns,
+                "in_flight": len(held),
+                "oldest_in_flight_ms": oldest * 1000,
+                "mean_hold_ms": mean_age * 1000,
+            }
@@ -0,0 +1,182 @@
+# sensors/frame_source.py
+
+import time
+
+import numpy as np
+
+
+class FrameSource:
+    """
+    Common interface for anything that produces aligned RGB + depth frames
+    for MARTIN: the live RealSense camera, a recorded replay, ...
+    Nodes only talk to this interface, so they run the same way on the
+    robot and on a desk without hardware.
+    """
+
+    # Set to True once a finite source (e.g. a replay) has no more frames
+    finished = False
+
+    # Milliseconds spent in each step of the last `get_frames()` call
+    # (e.g. {"acquire": ..., "align": ...}); empty if the source doesn't report it
+    last_timings = {}
+
+    # Frames `acquire_frame()` can keep in flight; the ring is created on first use
+    ring_size = 4
+    ring = None
+
+    def get_frames(self):
+        """
+        Returns the next (rgb, depth) pair, or (None, None) if no frame is available.
+        """
+        raise NotImplementedError
+
+    def acquire_frame(self):
+        """
+        Returns the next frame as a `FrameSlot` that the caller owns until it
+        calls `release()`, or None if no frame is available (or every ring
+        slot is still held). Unlike `get_frames()`, the slot can be kept
+        across iterations and passed between threads.
+        """
+        rgb, depth = self.get_frames()
+        if rgb is None:
+            return None
+        if self.ring is None:
+            from sensors.frame_ring import FrameRing
+            self.ring = FrameRing(self.ring_size, rgb.shape[1], rgb.shape[0])
+        return self.ring.write(rgb, depth, self.get_timestamp())
+
+    def configure_ring(self, size: int):
+        """Sets how many frames `acquire_frame()` can keep in flight (before the first frame)."""
+        if self.ring is not None and len(self.ring) != size:
+            raise RuntimeError("The frame ring is already in use")
+        self.ring_size = size
+
+    def get_timestamp(self):
+        """Returns the capture time (seconds) of the last frame returned by `get_frames()`."""
+        raise NotImplementedError
+
+    def get_intrinsics(self):
+        """Returns the color intrinsics for 2D to 3D projection."""
+        raise NotImplementedError
+
+    def get_depth_scale(self):
+        """Returns the depth scale (meters per depth unit)."""
+        raise NotImplementedError
+
+    def get_depth_aligner(self):
+        """
+        Returns a `DepthAligner` if `get_frames()` returns depth that is not
+        yet aligned to color, else None (the default).
+        """
+        return None
+
+    def stop(self):
+        """Releases the source."""
+        pass
+
+
+class SyntheticSource(FrameSource):
+    """
+    Generates random 640x480 color + depth frames with D435-like intrinsics.
+    Useful for benchmarking the node when neither a camera nor a recording is at hand.
+    """
+
+    def __init__(self, num_frames: int = 300, rate=None, width: int = 640, height: int = 480, seed: int = 0):
+        """
+        Parameters
+        ----------
+        num_frames : int, optional
+            Frames to produce before finishing (default is 300).
+        rate : float, optional
+            Frames per second to pace at (default is None, as fast as possible).
+        """
+        from utils.depth_ops import PinholeIntrinsics
+
+        rng = np.random.default_rng(seed)
+        # A small pool of frames is cycled so generation cost stays out of the measurements
+        self._color = rng.integers(0, 256, (8, height, width, 3), dtype=np.uint8)
+        self._depth = rng.integers(300, 4000, (8, height, width), dtype=np.uint16)
+
+        self.intrinsics = PinholeIntrinsics(width, height, 615.0, 615.0, width / 2, height / 2,
+                                            "inverse_brown_conrady")
+        self.num_frames = num_frames
+        self.rate = rate
+        self.finished = False
+        self._index = 0
+        self._timestamp = None
+        self._start = None
+        self._start_time = None
+
+    def get_frames(self):
+        if self._index >= self.num_frames:
+            self.finished = True
+            return None, None
+
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+            self._start_time = time.time()
+        if self.rate:
+            delay = self._start + self._index / self.rate - now
+            if delay > 0:
+                time.sleep(delay)
+
+        slot = self._index % len(self._color)
+        self._index += 1
+        # Nominal capture times (30 FPS unless paced), like a camera's, even when served faster
+        self._timestamp = self._start_time + (self._index - 1) / (self.rate or 30.0)
+        return self._color[slot], self._depth[slot]
+
+    def get_timestamp(self):
+        return self._timestamp
+
+    def get_intrinsics(self):
+        return self.intrinsics
+
+    def get_depth_scale(self):
+        return 0.001
+
+
+def add_source_arguments(parser):
+    """Adds the command-line options used to pick a frame source."""
+    parser.add_argument("--source", default="realsense", choices=["realsense", "replay", "synthetic"],
+                        help="where frames come from")
+    parser.add_argument("--recording", default=None,
+                        help="recording folder to replay (with --source replay)")
+    parser.add_argument("--replay-rate", default="original",
+                        help="replay speed: 'original', 'max', or a fixed rate in frames per second")
+    parser.add_argument("--loop", action="store_true",
+                        help="restart the replay when it reaches the end")
+    parser.add_argument("--drop-late", action="store_true",
+                        help="skip replay frames the consumer was too slow for, like a live camera")
+    parser.add_argument("--synthetic-frames", type=int, default=300,
+                        help="number of frames produced by --source synthetic")
+    parser.add_argument("--record", default=None,
+                        help="record every frame from the source into this folder")
+    parser.add_argument("--align", default="full", choices=["full", "lazy"],
+                        help="RealSense depth alignment: the whole frame, or only detected boxes")
+
+
+def open_source(args):
+    """
+    Opens the frame source selected on the command line.
+    The RealSense SDK is only imported when the live camera is used.
+    """
+    if args.source == "replay":
+        if args.recording is None:
+            raise ValueError("--source replay needs --recording PATH")
+        from sensors.recording import ReplaySource
+        rate = args.replay_rate if args.replay_rate in ("original", "max") else float(args.replay_rate)
+        source = ReplaySource(args.recording, rate=rate, loop=args.loop, drop_late=args.drop_late)
+    elif args.source == "synthetic":
+        rate = None if args.replay_rate in ("original", "max") else float(args.replay_rate)
+        source = SyntheticSource(args.synthetic_frames, rate=rate)
+    else:
+        from sensors.RealSense import RealSenseCamera
+        source = RealSenseCamera(align=args.align)
+
+    if args.record is not None:
+        from sensors.recording import RecordingSource
+        source = RecordingSource(source, args.record)
+
+    return source
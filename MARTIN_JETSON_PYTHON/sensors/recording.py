@@ -0,0 +1,306 @@
+# sensors/recording.py
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sensors.frame_source import FrameSource
+from utils.depth_ops import PinholeIntrinsics
+
+# On-disk layout of a recording folder:
+#   meta.json       frame size, depth scale and color intrinsics
+#   color.bin       raw BGR uint8 frames, appended back to back (H x W x 3 each)
+#   depth.bin       raw uint16 depth frames, appended back to back (H x W each)
+#   timestamps.bin  float64 capture time in seconds, one per frame
+# A frame counts only once its timestamp is written, so a recording cut
+# short by a crash is still readable up to the last complete frame.
+META_FILE = "meta.json"
+COLOR_FILE = "color.bin"
+DEPTH_FILE = "depth.bin"
+TIMESTAMP_FILE = "timestamps.bin"
+FORMAT_VERSION = 1
+
+
+class FrameRecorder:
+    """
+    Appends aligned RGB + depth frames, timestamps, intrinsics and depth
+    scale to a recording folder that `ReplaySource` can memory-map.
+    """
+
+    def __init__(self, path, width: int, height: int, intrinsics, depth_scale: float):
+        """
+        Parameters
+        ----------
+        path : str
+            Recording folder; created if missing. Recording into an existing
+            folder appends to it, provided the frame size matches.
+        width, height : int
+            Frame size in pixels.
+        intrinsics : rs.intrinsics or PinholeIntrinsics
+            Color intrinsics stored alongside the frames.
+        depth_scale : float
+            Depth scale (meters per unit).
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "width": int(width),
+            "height": int(height),
+            "depth_scale": float(depth_scale),
+            "intrinsics": PinholeIntrinsics.from_rs(intrinsics).to_dict(),
+        }
+        meta_path = self.path / META_FILE
+        if meta_path.exists():
+            existing = json.loads(meta_path.read_text())
+            if (existing["width"], existing["height"]) != (meta["width"], meta["height"]):
+                raise ValueError(f"Recording at {self.path} has a different frame size")
+            # Drop any partial frame left behind by an interrupted recording
+            _truncate_to_complete_frames(self.path, existing["width"], existing["height"])
+        else:
+            meta_path.write_text(json.dumps(meta, indent=2))
+
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self._color = open(self.path / COLOR_FILE, "ab")
+        self._depth = open(self.path / DEPTH_FILE, "ab")
+        self._timestamps = open(self.path / TIMESTAMP_FILE, "ab")
+        self.frames_written = 0
+
+    def write(self, rgb: np.ndarray, depth: np.ndarray, timestamp: float):
+        """Appends one frame pair and its capture time (seconds)."""
+        if rgb.shape != (self.height, self.width, 3) or depth.shape != (self.height, self.width):
+            raise ValueError(f"Expected {self.width}x{self.height} frames, got {rgb.shape} and {depth.shape}")
+
+        self._color.write(np.ascontiguousarray(rgb, dtype=np.uint8).data)
+        self._depth.write(np.ascontiguousarray(depth, dtype=np.uint16).data)
+        self._color.flush()
+        self._depth.flush()
+
+        # The timestamp is written last: it is what marks the frame as complete
+        self._timestamps.write(np.float64(timestamp).tobytes())
+        self._timestamps.flush()
+        self.frames_written += 1
+
+    def close(self):
+        for f in (self._color, self._depth, self._timestamps):
+            f.close()
+
+
+def _truncate_to_complete_frames(path, width, height):
+    frames = (path / TIMESTAMP_FILE).stat().st_size // 8 if (path / TIMESTAMP_FILE).exists() else 0
+    sizes = {
+        TIMESTAMP_FILE: frames * 8,
+        COLOR_FILE: frames * width * height * 3,
+        DEPTH_FILE: frames * width * height * 2,
+    }
+    for name, size in sizes.items():
+        file_path = path / name
+        if file_path.exists() and file_path.stat().st_size > size:
+            with open(file_path, "r+b") as f:
+                f.truncate(size)
+
+
+class ReplaySource(FrameSource):
+    """
+    Serves frames from a recording folder without copying them.
+    Frames are views into memory-mapped files, paced at the recorded rate,
+    a fixed rate, or as fast as the consumer asks for them.
+    """
+
+    def __init__(self, path, rate="original", loop: bool = False, drop_late: bool = False):
+        """
+        Parameters
+        ----------
+        path : str
+            Recording folder written by `FrameRecorder`.
+        rate : str or float, optional
+            "original" (default) to follow the recorded timestamps, "max"
+            to serve frames as fast as possible, or a fixed frames per second.
+        loop : bool, optional
+            Restart from the first frame at the end (default is False).
+        drop_late : bool, optional
+            Like a live camera, skip frames whose time has already passed when
+            the consumer asks for the next one (default is False). Skipped
+            frames are counted in `frames_skipped`.
+
+        Why it's useful:
+        ----------------
+        - Nodes can be profiled and regression-tested without hardware.
+        - Memory-mapped frames cost no copy and no decode.
+        """
+        self.path = Path(path)
+        meta_path = self.path / META_FILE
+        if not meta_path.exists():
+            raise FileNotFoundError(f"No recording found at: {self.path}")
+        meta = json.loads(meta_path.read_text())
+
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.depth_scale = meta["depth_scale"]
+        self.intrinsics = PinholeIntrinsics.from_dict(meta["intrinsics"])
+
+        self.timestamps = np.fromfile(self.path / TIMESTAMP_FILE, dtype=np.float64)
+        self.num_frames = len(self.timestamps)
+        if self.num_frames == 0:
+            raise ValueError(f"Recording at {self.path} has no frames")
+
+        # Copy-on-write maps: reads are zero-copy, and consumers that draw on
+        # a frame get private pages instead of modifying the recording
+        self._color = np.memmap(self.path / COLOR_FILE, dtype=np.uint8, mode="c",
+                                shape=(self.num_frames, self.height, self.width, 3))
+        self._depth = np.memmap(self.path / DEPTH_FILE, dtype=np.uint16, mode="c",
+                                shape=(self.num_frames, self.height, self.width))
+
+        if rate not in ("original", "max") and float(rate) <= 0:
+            raise ValueError(f"Replay rate must be 'original', 'max' or a positive number, got {rate}")
+        self.rate = rate
+        self.loop = loop
+        self.drop_late = drop_late and rate != "max"
+        self.frames_skipped = 0
+
+        self.finished = False
+        self._index = 0
+        self._timestamp = None
+        self._start_wall = None
+        self._start_index = 0
+
+    def __len__(self):
+        return self.num_frames
+
+    def _due_time(self, index):
+        if self.rate == "original":
+            offset = self.timestamps[index] - self.timestamps[self._start_index]
+        else:
+            offset = (index - self._start_index) / float(self.rate)
+        return self._start_wall + offset
+
+    def _wait_for(self, index):
+        if self.rate == "max":
+            return index
+        if self._start_wall is None:
+            self._start_wall = time.perf_counter()
+            self._start_index = index
+
+        if self.drop_late:
+            # Jump to the newest frame that is already due
+            now = time.perf_counter()
+            while index + 1 < self.num_frames and self._due_time(index + 1) <= now:
+                index += 1
+                self.frames_skipped += 1
+
+        delay = self._due_time(index) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return index
+
+    def get_frames(self):
+        """
+        Returns the next recorded (rgb, depth) pair as memory-mapped views,
+        or (None, None) once the recording is over.
+        """
+        if self._index >= self.num_frames:
+            if not self.loop:
+                self.finished = True
+                return None, None
+            self._index = 0
+            self._start_wall = None
+
+        index = self._wait_for(self._index)
+        self._index = index + 1
+        self._timestamp = float(self.timestamps[index])
+        return self._color[index], self._depth[index]
+
+    def get_timestamp(self):
+        return self._timestamp
+
+    def get_intrinsics(self):
+        return self.intrinsics
+
+    def get_depth_scale(self):
+        return self.depth_scale
+
+    def stop(self):
+        self.finished = True
+
+
+class RecordingSource(FrameSource):
+    """
+    Wraps another frame source and records every frame it returns.
+    """
+
+    def __init__(self, source, path):
+        if source.get_depth_aligner() is not None:
+            raise ValueError("Recordings store aligned depth; record with full alignment")
+        self.source = source
+        rgb, depth = None, None
+        while rgb is None and not source.finished:
+            rgb, depth = source.get_frames()
+        if rgb is None:
+            raise ValueError("Source produced no frames to record")
+
+        self.recorder = FrameRecorder(path, rgb.shape[1], rgb.shape[0],
+                                      source.get_intrinsics(), source.get_depth_scale())
+        self._pending = (rgb, depth)
+
+    @property
+    def finished(self):
+        return self.source.finished
+
+    @property
+    def last_timings(self):
+        return self.source.last_timings
+
+    def get_frames(self):
+        if self._pending is not None:
+            rgb, depth = self._pending
+            self._pending = None
+        else:
+            rgb, depth = self.source.get_frames()
+        if rgb is not None:
+            self.recorder.write(rgb, depth, self.source.get_timestamp())
+        return rgb, depth
+
+    def get_timestamp(self):
+        return self.source.get_timestamp()
+
+    def get_intrinsics(self):
+        return self.source.get_intrinsics()
+
+    def get_depth_scale(self):
+        return self.source.get_depth_scale()
+
+    def stop(self):
+        self.recorder.close()
+        self.source.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record aligned RealSense frames for replay")
+    parser.add_argument("--out", required=True, help="recording folder")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames to record")
+    args = parser.parse_args()
+
+    from sensors.RealSense import RealSenseCamera
+    camera = RealSenseCamera()
+    recorder = FrameRecorder(args.out, 640, 480, camera.get_intrinsics(), camera.get_depth_scale())
+
+    print(f"Recording {args.frames} frames to {args.out}...")
+    try:
+        while recorder.frames_written < args.frames:
+            rgb, depth = camera.get_frames()
+            if rgb is None:
+                continue
+            recorder.write(rgb, depth, camera.get_timestamp())
+    finally:
+        recorder.close()
+        camera.stop()
+    print(f"✅ Recorded {recorder.frames_written} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,18 @@
 import numpy as np
-import pyrealsense2 as rs
+
+from utils.metrics import REGISTRY
+
+# pyrealsense2 is only imported by the two single-box helpers that call the
+# SDK; the batch functions below are pure NumPy and never load it
+
+# Distortion models supported by the NumPy deprojection (names match rs.distortion)
+DEPROJECT_MODELS = ("none", "brown_conrady", "inverse_brown_conrady", "ftheta", "kannala_brandt4")
+
+# Distortion models supported by the NumPy projection
+PROJECT_MODELS = ("none", "brown_conrady", "modified_brown_conrady", "inverse_brown_conrady",
+                  "ftheta", "kannala_brandt4")
+
+FLT_EPSILON = np.finfo(np.float32).eps
 
 
 def depth_at_pixel(depth_frame, x, y, depth_scale):
@@ -45,6 +58,7 @@ def bbox_to_xyz_xywh(bbox_xywh, depth_frame, intrinsics, depth_scale):
     if depth_m is None:
         return None
 
+    import pyrealsense2 as rs
     X, Y, Z = rs.rs2_deproject_pixel_to_point(intrinsics, [cx, cy], depth_m)
     return X, Y, Z
 
@@ -84,6 +98,8 @@ def bbox_real_world_size(bbox_xyxy, bbox_xywh, depth_frame, intrinsics, depth_sc
     if depth_m is None:
         return None
 
+    import pyrealsense2 as rs
+
     # Deproject left/right edges → width
     left_3d  = rs.rs2_deproject_pixel_to_point(intrinsics, [x1, cy], depth_m)
     right_3d = rs.rs2_deproject_pixel_to_point(intrinsics, [x2, cy], depth_m)
@@ -95,3 +111,660 @@ def bbox_real_world_size(bbox_xyxy, bbox_xywh, depth_frame, intrinsics, depth_sc
     height_m = abs(bottom_3d[1] - top_3d[1])
 
     return width_m, height_m
+
+
+class PinholeIntrinsics:
+    """
+    Plain-Python copy of a camera's intrinsics.
+    Has the same attribute names as `rs.intrinsics`, so either can be passed
+    to the batch functions below, but needs no camera or SDK to construct.
+    """
+
+    def __init__(self, width, height, fx, fy, ppx, ppy, model="none", coeffs=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.fx = float(fx)
+        self.fy = float(fy)
+        self.ppx = float(ppx)
+        self.ppy = float(ppy)
+        self.model = distortion_name(model)
+        self.coeffs = [float(c) for c in (coeffs if coeffs is not None else [0.0] * 5)]
+
+    @classmethod
+    def from_rs(cls, intrinsics):
+        """Copies an `rs.intrinsics` (or any object with the same attributes)."""
+        return cls(intrinsics.width, intrinsics.height, intrinsics.fx, intrinsics.fy,
+                   intrinsics.ppx, intrinsics.ppy, intrinsics.model, list(intrinsics.coeffs))
+
+    def to_dict(self):
+        return {
+            "width": self.width, "height": self.height,
+            "fx": self.fx, "fy": self.fy, "ppx": self.ppx, "ppy": self.ppy,
+            "model": self.model, "coeffs": list(self.coeffs),
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+
+def distortion_name(model):
+    """Returns the distortion model name ("brown_conrady", ...) for an `rs.distortion` or a string."""
+    name = getattr(model, "name", None) or str(model)
+    return name.split(".")[-1]
+
+
+def row_or_none(row):
+    """Converts one row of a batch result to a tuple, or None if it is NaN (invalid depth)."""
+    if np.isnan(row).any():
+        return None
+    return tuple(float(v) for v in row)
+
+
+def deproject_pixels(pixels, depths_m, intrinsics):
+    """
+    Vectorized NumPy port of `rs.rs2_deproject_pixel_to_point`.
+
+    Parameters
+    ----------
+    pixels : np.ndarray
+        (N, 2) pixel coordinates as (x, y).
+    depths_m : np.ndarray
+        (N,) depth in meters for each pixel.
+    intrinsics : rs.intrinsics or PinholeIntrinsics
+        Camera intrinsics (fx, fy, ppx, ppy, distortion model and coeffs).
+
+    Returns
+    -------
+    points : np.ndarray
+        (N, 3) float32 points (X, Y, Z) in camera space (meters).
+        Computed in float32, like the SDK.
+    """
+    model = distortion_name(intrinsics.model)
+    if model not in DEPROJECT_MODELS:
+        raise ValueError(f"Cannot deproject pixels with the '{model}' distortion model")
+
+    pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 2)
+    depths_m = np.asarray(depths_m, dtype=np.float32).reshape(-1)
+    c = np.asarray(intrinsics.coeffs, dtype=np.float32)
+
+    x = (pixels[:, 0] - np.float32(intrinsics.ppx)) / np.float32(intrinsics.fx)
+    y = (pixels[:, 1] - np.float32(intrinsics.ppy)) / np.float32(intrinsics.fy)
+    xo, yo = x, y
+
+    if model in ("brown_conrady", "inverse_brown_conrady"):
+        # Fixed-point undistortion; 10 iterations as in the SDK
+        for _ in range(10):
+            r2 = x * x + y * y
+            icdist = np.float32(1) / (1 + ((c[4] * r2 + c[1]) * r2 + c[0]) * r2)
+            if model == "inverse_brown_conrady":
+                xq, yq = x / icdist, y / icdist
+            else:
+                xq, yq = x, y
+            delta_x = 2 * c[2] * xq * yq + c[3] * (r2 + 2 * xq * xq)
+            delta_y = 2 * c[3] * xq * yq + c[2] * (r2 + 2 * yq * yq)
+            x = (xo - delta_x) * icdist
+            y = (yo - delta_y) * icdist
+
+    elif model == "kannala_brandt4":
+        rd = np.maximum(np.sqrt(x * x + y * y), FLT_EPSILON)
+        theta = rd.copy()
+        theta2 = rd * rd
+        active = np.ones(len(rd), dtype=bool)
+        for _ in range(4):
+            f = theta * (1 + theta2 * (c[0] + theta2 * (c[1] + theta2 * (c[2] + theta2 * c[3])))) - rd
+            active &= np.abs(f) >= FLT_EPSILON
+            if not active.any():
+                break
+            df = 1 + theta2 * (3 * c[0] + theta2 * (5 * c[1] + theta2 * (7 * c[2] + 9 * theta2 * c[3])))
+            theta = np.where(active, theta - f / df, theta)
+            theta2 = theta * theta
+        r = np.tan(theta)
+        x = x * r / rd
+        y = y * r / rd
+
+    elif model == "ftheta":
+        rd = np.maximum(np.sqrt(x * x + y * y), FLT_EPSILON)
+        r = (np.tan(c[0] * rd) / np.arctan(2 * np.tan(c[0] / 2))).astype(np.float32)
+        x = x * r / rd
+        y = y * r / rd
+
+    return np.stack([depths_m * x, depths_m * y, depths_m], axis=1)
+
+
+def depth_at_pixels(depth_frame, xs, ys, depth_scale):
+    """
+    Vectorized `depth_at_pixel`: depth (in meters) at many integer pixels.
+
+    Returns
+    -------
+    depths_m : np.ndarray
+        (N,) depths in meters; NaN where the pixel is out of bounds or has no depth.
+    """
+    xs = np.asarray(xs, dtype=np.int64).reshape(-1)
+    ys = np.asarray(ys, dtype=np.int64).reshape(-1)
+    height, width = depth_frame.shape[:2]
+
+    inside = (xs >= 0) & (ys >= 0) & (xs < width) & (ys < height)
+    raw = depth_frame[np.where(inside, ys, 0), np.where(inside, xs, 0)]
+
+    depths_m = raw * depth_scale
+    return np.where(inside & (raw != 0), depths_m, np.nan)
+
+
+@REGISTRY.timed("sybil_depth_bboxes_to_xyz_seconds", "Time spent in depth_ops.bboxes_to_xyz")
+def bboxes_to_xyz(boxes_xywh, depth_frame, intrinsics, depth_scale, depths_m=None):
+    """
+    Batch version of `bbox_to_xyz_xywh` for all detections of a frame.
+
+    Parameters
+    ----------
+    boxes_xywh : np.ndarray
+        (N, 4) boxes in (cx, cy, w, h) format, e.g. `boxes.xywh`.
+    depth_frame : np.ndarray
+        640x480 depth map.
+    intrinsics : rs.intrinsics or PinholeIntrinsics
+        Camera intrinsics.
+    depth_scale : float
+        Depth scale (meters per unit).
+    depths_m : np.ndarray, optional
+        (N,) depth per box in meters (e.g. from `DepthStats.robust_depth`).
+        Defaults to the raw depth at each box center.
+
+    Returns
+    -------
+    xyz : np.ndarray
+        (N, 3) positions in camera space (meters).
+        Rows are NaN where the depth at the box center is invalid.
+    """
+    boxes_xywh = np.asarray(boxes_xywh).reshape(-1, 4)
+    cx = boxes_xywh[:, 0].astype(np.int64)
+    cy = boxes_xywh[:, 1].astype(np.int64)
+
+    if depths_m is None:
+        depths_m = depth_at_pixels(depth_frame, cx, cy, depth_scale)
+    xyz = deproject_pixels(np.stack([cx, cy], axis=1), depths_m, intrinsics)
+    return xyz
+
+
+@REGISTRY.timed("sybil_depth_bboxes_size_seconds", "Time spent in depth_ops.bboxes_real_world_size")
+def bboxes_real_world_size(boxes_xyxy, boxes_xywh, depth_frame, intrinsics, depth_scale, depths_m=None):
+    """
+    Batch version of `bbox_real_world_size` for all detections of a frame.
+
+    Parameters
+    ----------
+    boxes_xyxy : np.ndarray
+        (N, 4) boxes in (x1, y1, x2, y2) format, e.g. `boxes.xyxy`.
+    boxes_xywh : np.ndarray
+        (N, 4) boxes in (cx, cy, w, h) format, e.g. `boxes.xywh`.
+    depth_frame : np.ndarray
+        640x480 depth map.
+    intrinsics : rs.intrinsics or PinholeIntrinsics
+        Camera intrinsics.
+    depth_scale : float
+        Depth scale (meters per unit).
+    depths_m : np.ndarray, optional
+        (N,) depth per box in meters (e.g. from `DepthStats.robust_depth`).
+        Defaults to the raw depth at each box center.
+
+    Returns
+    -------
+    sizes : np.ndarray
+        (N, 2) real-world (width, height) in meters.
+        Rows are NaN where the depth at the box center is invalid.
+    """
+    boxes_xyxy = np.asarray(boxes_xyxy).reshape(-1, 4).astype(np.int64)
+    boxes_xywh = np.asarray(boxes_xywh).reshape(-1, 4)
+    x1, y1, x2, y2 = boxes_xyxy.T
+    cx = boxes_xywh[:, 0].astype(np.int64)
+    cy = boxes_xywh[:, 1].astype(np.int64)
+
+    if depths_m is None:
+        depths_m = depth_at_pixels(depth_frame, cx, cy, depth_scale)
+
+    # Deproject left, right, top and bottom edge points in a single call
+    pixels = np.concatenate([
+        np.stack([x1, cy], axis=1),
+        np.stack([x2, cy], axis=1),
+        np.stack([cx, y1], axis=1),
+        np.stack([cx, y2], axis=1),
+    ])
+    left, right, top, bottom = np.split(deproject_pixels(pixels, np.tile(depths_m, 4), intrinsics), 4)
+
+    width_m = np.abs(right[:, 0] - left[:, 0])
+    height_m = np.abs(bottom[:, 1] - top[:, 1])
+    return np.stack([width_m, height_m], axis=1)
+
+
+class Extrinsics:
+    """
+    Plain-Python copy of the rigid transform between two camera streams.
+    Has the same attribute names as `rs.extrinsics`: `rotation` is 9 floats
+    in column-major order and `translation` is 3 floats in meters.
+    """
+
+    def __init__(self, rotation, translation):
+        self.rotation = [float(r) for r in rotation]
+        self.translation = [float(t) for t in translation]
+
+    @classmethod
+    def from_rs(cls, extrinsics):
+        """Copies an `rs.extrinsics` (or any object with the same attributes)."""
+        return cls(list(extrinsics.rotation), list(extrinsics.translation))
+
+    def to_dict(self):
+        return {"rotation": list(self.rotation), "translation": list(self.translation)}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    def inverse(self):
+        """Returns the transform in the opposite direction."""
+        rotation = np.asarray(self.rotation, dtype=np.float64).reshape(3, 3)  # Row i = column i
+        translation = np.asarray(self.translation, dtype=np.float64)
+        # Inverse rotation is the transpose: its columns are the rows of R
+        return Extrinsics(rotation.T.reshape(-1), -(rotation @ translation))
+
+
+def transform_points(points, extrinsics):
+    """
+    Vectorized NumPy port of `rs.rs2_transform_point_to_point`.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        (N, 3) points in the source stream's camera space (meters).
+    extrinsics : rs.extrinsics or Extrinsics
+        Transform from the source stream to the target stream.
+
+    Returns
+    -------
+    points : np.ndarray
+        (N, 3) float32 points in the target stream's camera space.
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    # Column-major rotation: reshaping gives R transposed, so p @ R.T == p @ reshaped
+    rotation = np.asarray(extrinsics.rotation, dtype=np.float32).reshape(3, 3)
+    translation = np.asarray(extrinsics.translation, dtype=np.float32)
+    return points @ rotation + translation
+
+
+def project_points(points, intrinsics):
+    """
+    Vectorized NumPy port of `rs.rs2_project_point_to_pixel`.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        (N, 3) points (X, Y, Z) in camera space (meters), Z > 0.
+    intrinsics : rs.intrinsics or PinholeIntrinsics
+        Camera intrinsics (fx, fy, ppx, ppy, distortion model and coeffs).
+
+    Returns
+    -------
+    pixels : np.ndarray
+        (N, 2) float32 pixel coordinates (x, y). Computed in float32, like the SDK.
+    """
+    model = distortion_name(intrinsics.model)
+    if model not in PROJECT_MODELS:
+        raise ValueError(f"Cannot project points with the '{model}' distortion model")
+
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    c = np.asarray(intrinsics.coeffs, dtype=np.float32)
+    x = points[:, 0] / points[:, 2]
+    y = points[:, 1] / points[:, 2]
+
+    if model in ("modified_brown_conrady", "inverse_brown_conrady"):
+        r2 = x * x + y * y
+        f = 1 + c[0] * r2 + c[1] * r2 * r2 + c[4] * r2 * r2 * r2
+        x = x * f
+        y = y * f
+        dx = x + 2 * c[2] * x * y + c[3] * (r2 + 2 * x * x)
+        dy = y + 2 * c[3] * x * y + c[2] * (r2 + 2 * y * y)
+        x, y = dx, dy
+
+    elif model == "brown_conrady":
+        r2 = x * x + y * y
+        f = 1 + c[0] * r2 + c[1] * r2 * r2 + c[4] * r2 * r2 * r2
+        dx = x * f + 2 * c[2] * x * y + c[3] * (r2 + 2 * x * x)
+        dy = y * f + 2 * c[3] * x * y + c[2] * (r2 + 2 * y * y)
+        x, y = dx, dy
+
+    elif model == "ftheta":
+        r = np.maximum(np.sqrt(x * x + y * y), FLT_EPSILON)
+        rd = (np.float32(1) / c[0]) * np.arctan(2 * r * np.tan(c[0] / 2))
+        x = x * rd / r
+        y = y * rd / r
+
+    elif model == "kannala_brandt4":
+        r = np.maximum(np.sqrt(x * x + y * y), FLT_EPSILON)
+        theta = np.arctan(r)
+        theta2 = theta * theta
+        series = 1 + theta2 * (c[0] + theta2 * (c[1] + theta2 * (c[2] + theta2 * c[3])))
+        rd = theta * series
+        x = x * rd / r
+        y = y * rd / r
+
+    return np.stack([x * np.float32(intrinsics.fx) + np.float32(intrinsics.ppx),
+                     y * np.float32(intrinsics.fy) + np.float32(intrinsics.ppy)], axis=1)
+
+
+class DepthAligner:
+    """
+    Aligns depth to the color image only around detected boxes, instead of
+    running `rs.align` over the whole frame. Each depth pixel in a box's
+    region is mapped onto the color image exactly like the SDK does
+    (pixel corners projected to a color rectangle, nearest depth wins),
+    so box depths match the full-frame aligned image.
+    """
+
+    def __init__(self, depth_intrinsics, color_intrinsics, depth_to_color, depth_scale: float,
+                 min_depth_m: float = 0.3, max_depth_m: float = 10.0, margin: int = 2):
+        """
+        Parameters
+        ----------
+        depth_intrinsics, color_intrinsics : rs.intrinsics or PinholeIntrinsics
+            Intrinsics of the unaligned depth stream and of the color stream.
+        depth_to_color : rs.extrinsics or Extrinsics
+            Transform from depth camera space to color camera space.
+        depth_scale : float
+            Depth scale (meters per unit).
+        min_depth_m, max_depth_m : float, optional
+            Depth range searched when finding the depth pixels that can land
+            in a color box (default is 0.3 to 10.0).
+        margin : int, optional
+            Extra depth pixels added around each searched region (default is 2).
+
+        Why it's useful:
+        ----------------
+        - Full-frame alignment is one of the most expensive per-frame CPU
+          steps on the Jetson, while the node only reads depth inside boxes.
+        - The depth rays of every pixel corner are computed once here, so a
+          frame only costs a transform and a projection per ROI pixel.
+        """
+        self.depth_intrinsics = depth_intrinsics
+        self.color_intrinsics = color_intrinsics
+        self.depth_to_color = depth_to_color
+        self.color_to_depth = Extrinsics.from_rs(depth_to_color).inverse()
+        self.depth_scale = depth_scale
+        self.min_depth_m = min_depth_m
+        self.max_depth_m = max_depth_m
+        self.margin = margin
+
+        # Rays (x/z, y/z) through the top-left and bottom-right corner of every depth pixel
+        width, height = depth_intrinsics.width, depth_intrinsics.height
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+        pixels = np.stack([xs.ravel(), ys.ravel()], axis=1)
+        ones = np.ones(len(pixels), dtype=np.float32)
+        self._ray_tl = deproject_pixels(pixels - 0.5, ones, depth_intrinsics)[:, :2].reshape(height, width, 2)
+        self._ray_br = deproject_pixels(pixels + 0.5, ones, depth_intrinsics)[:, :2].reshape(height, width, 2)
+
+    def depth_regions(self, boxes_xyxy):
+        """
+        Returns the (N, 4) depth-image regions [x1, x2) x [y1, y2) whose pixels
+        can land inside each color box for depths in [min_depth_m, max_depth_m].
+        """
+        boxes = np.asarray(boxes_xyxy, dtype=np.float32).reshape(-1, 4)
+        x1, y1, x2, y2 = boxes.T
+        corners = np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                            np.stack([x1, y2], 1), np.stack([x2, y2], 1)], axis=1).reshape(-1, 2)
+
+        # Each box corner at the nearest and farthest depth bounds its epipolar segment
+        pixels = np.concatenate([corners, corners])
+        depths = np.concatenate([np.full(len(corners), self.min_depth_m, dtype=np.float32),
+                                 np.full(len(corners), self.max_depth_m, dtype=np.float32)])
+        points = transform_points(deproject_pixels(pixels, depths, self.color_intrinsics), self.color_to_depth)
+        mapped = project_points(points, self.depth_intrinsics)
+        mapped = mapped.reshape(2, -1, 4, 2).transpose(1, 0, 2, 3).reshape(-1, 8, 2)
+
+        width, height = self.depth_intrinsics.width, self.depth_intrinsics.height
+        lo = np.floor(mapped.min(axis=1)) - self.margin
+        hi = np.ceil(mapped.max(axis=1)) + self.margin + 1
+        return np.stack([
+            np.clip(lo[:, 0], 0, width), np.clip(lo[:, 1], 0, height),
+            np.clip(hi[:, 0], 0, width), np.clip(hi[:, 1], 0, height),
+        ], axis=1).astype(np.int64)
+
+    @REGISTRY.timed("sybil_depth_align_boxes_seconds", "Time spent in DepthAligner.align_boxes")
+    def align_boxes(self, depth_frame, boxes_xyxy):
+        """
+        Aligns depth to the color image around the given boxes.
+
+        Parameters
+        ----------
+        depth_frame : np.ndarray
+            Unaligned depth map (in raw depth units) from the depth stream.
+        boxes_xyxy : np.ndarray
+            (N, 4) color-image boxes in (x1, y1, x2, y2) format.
+
+        Returns
+        -------
+        aligned : np.ndarray
+            Color-sized uint16 depth map. It matches `rs.align` wherever depth
+            pixels map into the boxes, and is 0 (no depth) elsewhere, so it can
+            be passed to `bboxes_to_xyz`, `DepthStats`, ... like an aligned frame.
+        """
+        color_w, color_h = self.color_intrinsics.width, self.color_intrinsics.height
+        aligned = np.zeros((color_h, color_w), dtype=np.uint16)
+        regions = self.depth_regions(boxes_xyxy)
+        if len(regions) == 0:
+            return aligned
+
+        # Union of the regions, so overlapping boxes map each depth pixel once
+        left, top = regions[:, 0].min(), regions[:, 1].min()
+        mask = np.zeros((regions[:, 3].max() - top, regions[:, 2].max() - left), dtype=bool)
+        for x1, y1, x2, y2 in regions:
+            mask[y1 - top:y2 - top, x1 - left:x2 - left] = True
+        ys, xs = np.nonzero(mask)
+        ys += top
+        xs += left
+        raw = depth_frame[ys, xs]
+        keep = raw != 0
+        ys, xs, raw = ys[keep], xs[keep], raw[keep]
+        if len(raw) == 0:
+            return aligned
+
+        depths_m = raw.astype(np.float32) * np.float32(self.depth_scale)
+        bounds = []
+        for rays in (self._ray_tl, self._ray_br):
+            points = np.empty((len(raw), 3), dtype=np.float32)
+            points[:, :2] = rays[ys, xs] * depths_m[:, None]
+            points[:, 2] = depths_m
+            pixels = project_points(transform_points(points, self.depth_to_color), self.color_intrinsics)
+            # static_cast<int>(p + 0.5f) in the SDK truncates toward zero
+            bounds.append(np.trunc(pixels + 0.5).astype(np.int64))
+        (cx1, cy1), (cx2, cy2) = bounds[0].T, bounds[1].T
+
+        valid = (cx1 >= 0) & (cy1 >= 0) & (cx2 < color_w) & (cy2 < color_h)
+        cx1, cy1, cx2, cy2, raw = cx1[valid], cy1[valid], cx2[valid], cy2[valid], raw[valid]
+        span_x = cx2 - cx1 + 1
+        span_y = cy2 - cy1 + 1
+        if len(raw) == 0 or span_x.max() <= 0 or span_y.max() <= 0:
+            return aligned
+
+        # Every depth pixel covers a small color rectangle; write it offset by offset
+        indices, values = [], []
+        for dy in range(int(span_y.max())):
+            for dx in range(int(span_x.max())):
+                inside = (dx < span_x) & (dy < span_y)
+                indices.append((cy1[inside] + dy) * color_w + cx1[inside] + dx)
+                values.append(raw[inside].astype(np.int64))
+        indices = np.concatenate(indices)
+        values = np.concatenate(values)
+
+        # Nearest depth wins where several depth pixels cover the same color pixel:
+        # sort by (pixel, depth) packed into one key and keep the first of each pixel
+        keys = np.sort((indices << 16) | values)
+        indices = keys >> 16
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = indices[1:] != indices[:-1]
+        aligned.reshape(-1)[indices[first]] = keys[first] & 0xFFFF
+        return aligned
+
+
+def _integral_image(values):
+    """Summed-area table with a leading row and column of zeros."""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(values, axis=0, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+class DepthStats:
+    """
+    Per-frame depth statistics engine built on summed-area tables.
+    Integral images of valid depth, squared depth and valid-pixel count are
+    built once per frame; the mean, standard deviation and valid fraction of
+    any box then cost four lookups each, however large the box is.
+    """
+
+    @REGISTRY.timed("sybil_depth_stats_build_seconds", "Time spent building DepthStats tables")
+    def __init__(self, depth_frame, depth_scale, min_depth_m: float = 0.1, max_depth_m: float = 10.0):
+        """
+        Parameters
+        ----------
+        depth_frame : np.ndarray
+            640x480 depth map (in raw depth units).
+        depth_scale : float
+            Depth scale (meters per unit).
+        min_depth_m : float, optional
+            Depths below this are treated as invalid (default is 0.1).
+        max_depth_m : float, optional
+            Depths above this are treated as invalid (default is 10.0).
+
+        Why it's useful:
+        ----------------
+        - A single center pixel often lands on a hole or on the background.
+        - Box statistics stay O(1) per box, so dozens of boxes cost no more
+          than building the tables once.
+        """
+        self.depth_frame = depth_frame
+        self.depth_scale = depth_scale
+        self.min_depth_m = min_depth_m
+        self.max_depth_m = max_depth_m
+
+        depth_m = depth_frame.astype(np.float64) * depth_scale
+        valid = (depth_frame != 0) & (depth_m >= min_depth_m) & (depth_m <= max_depth_m)
+        depth_m[~valid] = 0.0
+
+        self._sum = _integral_image(depth_m)
+        self._sum_sq = _integral_image(depth_m * depth_m)
+        self._count = _integral_image(valid)
+
+    def _box_bounds(self, boxes_xyxy, shrink):
+        """Integer pixel bounds [x1, x2) x [y1, y2) of the (shrunk) boxes, clipped to the frame."""
+        boxes = np.asarray(boxes_xyxy, dtype=np.float64).reshape(-1, 4)
+        height, width = self.depth_frame.shape[:2]
+
+        # Remove `shrink / 2` of the width and height from each side
+        margin_x = (boxes[:, 2] - boxes[:, 0]) * shrink / 2
+        margin_y = (boxes[:, 3] - boxes[:, 1]) * shrink / 2
+        x1 = np.clip(np.floor(boxes[:, 0] + margin_x), 0, width).astype(np.int64)
+        y1 = np.clip(np.floor(boxes[:, 1] + margin_y), 0, height).astype(np.int64)
+        x2 = np.clip(np.ceil(boxes[:, 2] - margin_x), 0, width).astype(np.int64)
+        y2 = np.clip(np.ceil(boxes[:, 3] - margin_y), 0, height).astype(np.int64)
+        x2 = np.maximum(x2, x1)
+        y2 = np.maximum(y2, y1)
+        return x1, y1, x2, y2
+
+    @staticmethod
+    def _box_sums(table, x1, y1, x2, y2):
+        return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+
+    def box_stats(self, boxes_xyxy, shrink: float = 0.0):
+        """
+        Depth statistics for many boxes at once.
+
+        Parameters
+        ----------
+        boxes_xyxy : np.ndarray
+            (N, 4) boxes in (x1, y1, x2, y2) format.
+        shrink : float, optional
+            Fraction of each box's width and height to drop, keeping the
+            central region (default is 0.0; 0.5 keeps the central half).
+
+        Returns
+        -------
+        mean : np.ndarray
+            (N,) mean valid depth in meters (NaN if the box has no valid pixel).
+        std : np.ndarray
+            (N,) standard deviation of valid depth in meters.
+        valid_fraction : np.ndarray
+            (N,) fraction of the box's pixels with valid depth.
+        """
+        x1, y1, x2, y2 = self._box_bounds(boxes_xyxy, shrink)
+
+        count = self._box_sums(self._count, x1, y1, x2, y2)
+        total = self._box_sums(self._sum, x1, y1, x2, y2)
+        total_sq = self._box_sums(self._sum_sq, x1, y1, x2, y2)
+        area = (x2 - x1) * (y2 - y1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+            var = np.where(count > 0, total_sq / count - mean * mean, np.nan)
+            valid_fraction = np.where(area > 0, count / area, 0.0)
+        std = np.sqrt(np.maximum(var, 0.0))
+        return mean, std, valid_fraction
+
+    def histogram_depth(self, box_xyxy, shrink: float = 0.0, bin_width_m: float = 0.05):
+        """
+        Robust depth for one box: the most populated depth bin, refined to
+        the median of the pixels in that bin. Costs O(box area), so it is only
+        meant for boxes that fail the cheap validity check.
+
+        Returns
+        -------
+        depth_m : float
+            Robust depth in meters, or NaN if the box has no valid pixel.
+        """
+        x1, y1, x2, y2 = (int(v[0]) for v in self._box_bounds(box_xyxy, shrink))
+        patch = self.depth_frame[y1:y2, x1:x2].astype(np.float64) * self.depth_scale
+        values = patch[(patch >= self.min_depth_m) & (patch <= self.max_depth_m)]
+        if values.size == 0:
+            return np.nan
+
+        bins = max(1, int(np.ceil((values.max() - values.min()) / bin_width_m)))
+        counts, edges = np.histogram(values, bins=bins)
+        peak = np.argmax(counts)
+        in_peak = values[(values >= edges[peak]) & (values <= edges[peak + 1])]
+        return float(np.median(in_peak))
+
+    @REGISTRY.timed("sybil_depth_robust_depth_seconds", "Time spent in DepthStats.robust_depth")
+    def robust_depth(self, boxes_xyxy, shrink: float = 0.2, min_valid_fraction: float = 0.3,
+                     max_relative_std: float = 0.1, bin_width_m: float = 0.05):
+        """
+        Depth per box: the O(1) mean of the inner box when it looks reliable,
+        otherwise the histogram estimate.
+
+        Parameters
+        ----------
+        boxes_xyxy : np.ndarray
+            (N, 4) boxes in (x1, y1, x2, y2) format.
+        shrink : float, optional
+            Fraction of each box dropped before measuring (default is 0.2).
+        min_valid_fraction : float, optional
+            Boxes with fewer valid pixels fail the check (default is 0.3).
+        max_relative_std : float, optional
+            Boxes whose std / mean is larger fail the check, e.g. when the box
+            mixes the object and the background (default is 0.1).
+        bin_width_m : float, optional
+            Histogram bin width in meters for failing boxes (default is 0.05).
+
+        Returns
+        -------
+        depths_m : np.ndarray
+            (N,) depth in meters; NaN where no valid depth exists.
+            Can be passed as `depths_m` to `bboxes_to_xyz` and `bboxes_real_world_size`.
+        """
+        boxes_xyxy = np.asarray(boxes_xyxy).reshape(-1, 4)
+        mean, std, valid_fraction = self.box_stats(boxes_xyxy, shrink)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            reliable = (valid_fraction >= min_valid_fraction) & (std / mean <= max_relative_std)
+
+        depths_m = mean.copy()
+        for i in np.flatnonzero(~reliable):
+            depths_m[i] = self.histogram_depth(boxes_xyxy[i], shrink, bin_width_m)
+        return depths_m
@@ -0,0 +1,481 @@
+import functools
+
+import numpy as np
+
+from models.detections import xyxy_to_xywh, xywh_to_xyxy
+
+
+@functools.lru_cache(maxsize=None)
+def _linear_sum_assignment():
+    """
+    SciPy's Hungarian solver, imported on the first match instead of at
+    import time (SciPy adds hundreds of milliseconds to the node's start).
+    Returns None without SciPy: greedy matching is used instead, near-identical
+    for the sparse, well-separated cost matrices produced by litter detections.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return None
+    return linear_sum_assignment
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise intersection-over-union of two sets of boxes.
+
+    Parameters
+    ----------
+    boxes_a : np.ndarray
+        (N, 4) boxes in (x1, y1, x2, y2) format.
+    boxes_b : np.ndarray
+        (M, 4) boxes in (x1, y1, x2, y2) format.
+
+    Returns
+    -------
+    iou : np.ndarray
+        (N, M) IoU values in [0, 1].
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(1, -1, 4)
+
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def linear_assignment(cost, max_cost):
+    """
+    Minimum-cost one-to-one matching of rows to columns.
+
+    Parameters
+    ----------
+    cost : np.ndarray
+        (N, M) cost matrix; use np.inf for forbidden pairs.
+    max_cost : float
+        Pairs costing more than this are never matched.
+
+    Returns
+    -------
+    rows, cols : np.ndarray
+        Indices of the matched pairs.
+    """
+    if cost.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    linear_sum_assignment = _linear_sum_assignment()
+    if linear_sum_assignment is not None:
+        # Forbidden pairs get a finite cost above max_cost so the solver always succeeds
+        rows, cols = linear_sum_assignment(np.where(np.isfinite(cost), cost, max_cost + 1.0))
+        keep = cost[rows, cols] <= max_cost
+        return rows[keep], cols[keep]
+
+    # Greedy fallback: take the cheapest remaining pair until none is allowed
+    order = np.argsort(cost, axis=None)
+    flat = cost.reshape(-1)
+    used_rows = np.zeros(cost.shape[0], dtype=bool)
+    used_cols = np.zeros(cost.shape[1], dtype=bool)
+    rows, cols = [], []
+    for index in order:
+        if flat[index] > max_cost:
+            break
+        row, col = divmod(int(index), cost.shape[1])
+        if used_rows[row] or used_cols[col]:
+            continue
+        used_rows[row] = used_cols[col] = True
+        rows.append(row)
+        cols.append(col)
+    return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+
+class KalmanBank:
+    """
+    Constant-velocity Kalman filters for many tracks, stored as
+    struct-of-arrays: one row of `x` (state) and `P` (covariance) per track.
+    The state of a `dim`-dimensional measurement is [position, velocity].
+    Every step is a handful of batched NumPy operations, whatever the
+    number of tracks.
+    """
+
+    def __init__(self, dim: int):
+        """
+        Parameters
+        ----------
+        dim : int
+            Size of the measurement, e.g. 4 for (cx, cy, w, h) or 3 for (X, Y, Z).
+        """
+        self.dim = dim
+        self.x = np.zeros((0, 2 * dim), dtype=np.float64)
+        self.P = np.zeros((0, 2 * dim, 2 * dim), dtype=np.float64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, z, pos_std, vel_std):
+        """
+        Appends new tracks at the measured positions with zero velocity.
+
+        Parameters
+        ----------
+        z : np.ndarray
+            (K, dim) initial measurements.
+        pos_std, vel_std : np.ndarray or float
+            Initial position / velocity standard deviation, (K, dim) or scalar.
+        """
+        z = np.asarray(z, dtype=np.float64).reshape(-1, self.dim)
+        k = len(z)
+        x = np.concatenate([z, np.zeros_like(z)], axis=1)
+        variances = np.concatenate([np.broadcast_to(np.square(pos_std), (k, self.dim)),
+                                    np.broadcast_to(np.square(vel_std), (k, self.dim))], axis=1)
+        P = np.zeros((k, 2 * self.dim, 2 * self.dim))
+        P[:, np.arange(2 * self.dim), np.arange(2 * self.dim)] = variances
+
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, P])
+
+    def keep(self, mask):
+        """Keeps only the rows where `mask` is True."""
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+
+    def predict(self, dt, pos_std, vel_std, rows=None):
+        """
+        Advances every track (or only `rows`) by `dt` seconds.
+
+        Parameters
+        ----------
+        dt : float
+            Time step in seconds.
+        pos_std, vel_std : np.ndarray or float
+            Process noise standard deviation per step, (M, dim) or scalar.
+        rows : np.ndarray, optional
+            Boolean mask or indices of the tracks to advance (default is all).
+        """
+        d = self.dim
+        x = self.x if rows is None else self.x[rows]
+        P = self.P if rows is None else self.P[rows]
+        if len(x) == 0:
+            return
+
+        F = np.eye(2 * d)
+        F[:d, d:] = np.eye(d) * dt
+        x = x @ F.T
+        P = F @ P @ F.T
+        noise = np.concatenate([np.broadcast_to(np.square(pos_std), (len(x), d)),
+                                np.broadcast_to(np.square(vel_std), (len(x), d))], axis=1)
+        P[:, np.arange(2 * d), np.arange(2 * d)] += noise
+
+        if rows is None:
+            self.x, self.P = x, P
+        else:
+            self.x[rows], self.P[rows] = x, P
+
+    def update(self, rows, z, meas_std):
+        """
+        Corrects the tracks in `rows` with measurements `z`.
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            (K,) indices of the tracks being measured.
+        z : np.ndarray
+            (K, dim) measurements.
+        meas_std : np.ndarray or float
+            Measurement noise standard deviation, (K, dim) or scalar.
+        """
+        if len(rows) == 0:
+            return
+        d = self.dim
+        z = np.asarray(z, dtype=np.float64).reshape(-1, d)
+        x = self.x[rows]
+        P = self.P[rows]
+
+        # H = [I 0], so H P H^T and P H^T are slices of P
+        S = P[:, :d, :d].copy()
+        S[:, np.arange(d), np.arange(d)] += np.broadcast_to(np.square(meas_std), (len(z), d))
+        PHt = P[:, :, :d]
+        K = np.linalg.solve(S, PHt.transpose(0, 2, 1)).transpose(0, 2, 1)
+
+        innovation = z - x[:, :d]
+        self.x[rows] = x + np.einsum("kij,kj->ki", K, innovation)
+        self.P[rows] = P - K @ P[:, :d, :]
+
+    def position(self):
+        """Returns the (M, dim) estimated positions."""
+        return self.x[:, :self.dim]
+
+    def velocity(self):
+        """Returns the (M, dim) estimated velocities (per second)."""
+        return self.x[:, self.dim:]
+
+
+class MultiObjectTracker:
+    """
+    Tracks SYBIL detections across frames with stable IDs.
+    Boxes are associated with IoU on Kalman-predicted boxes, and each track
+    carries a smoothed 3D position and real-world size from `depth_ops`.
+    All track data lives in parallel NumPy arrays (struct-of-arrays).
+    """
+
+    # Box noise scales with the box height, as in SORT / DeepSORT
+    BOX_POS_STD = 1.0 / 20
+    BOX_VEL_STD = 1.0 / 160
+    BOX_MEAS_STD = 1.0 / 20
+
+    def __init__(self, iou_threshold: float = 0.3, min_hits: int = 3, max_misses: int = 15,
+                 dt: float = 1 / 30, xyz_pos_std: float = 0.02, xyz_vel_std: float = 0.05,
+                 xyz_meas_std: float = 0.03, size_alpha: float = 0.3):
+        """
+        Parameters
+        ----------
+        iou_threshold : float, optional
+            Minimum IoU between a predicted track box and a detection for them
+            to be matched (default is 0.3).
+        min_hits : int, optional
+            Matched frames before a track is confirmed and reported as born
+            (default is 3).
+        max_misses : int, optional
+            Consecutive unmatched frames before a track dies (default is 15).
+        dt : float, optional
+            Time step used when no timestamps are given (default is 1/30 s).
+        xyz_pos_std, xyz_vel_std : float, optional
+            3D process noise per step in meters and meters/second
+            (default is 0.02 and 0.05).
+        xyz_meas_std : float, optional
+            3D measurement noise in meters (default is 0.03).
+        size_alpha : float, optional
+            Exponential smoothing factor for real-world sizes (default is 0.3).
+
+        Why it's useful:
+        ----------------
+        - The same piece of litter keeps one ID, so downstream code handles
+          births, updates and deaths instead of 30 raw detections per second.
+        - Kalman smoothing removes depth noise from the 3D positions.
+        - Association, prediction and correction are batched over all tracks.
+        """
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.dt = dt
+        self.xyz_pos_std = xyz_pos_std
+        self.xyz_vel_std = xyz_vel_std
+        self.xyz_meas_std = xyz_meas_std
+        self.size_alpha = size_alpha
+
+        self.boxes = KalmanBank(4)   # (cx, cy, w, h) in pixels
+        self.points = KalmanBank(3)  # (X, Y, Z) in meters
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.cls = np.zeros(0, dtype=np.int64)
+        self.conf = np.zeros(0, dtype=np.float32)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.age = np.zeros(0, dtype=np.int64)
+        self.confirmed = np.zeros(0, dtype=bool)
+        self.has_xyz = np.zeros(0, dtype=bool)
+        self.size = np.zeros((0, 2), dtype=np.float64)
+
+        self._next_id = 1
+        self._last_timestamp = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _step(self, timestamp):
+        if timestamp is None or self._last_timestamp is None:
+            dt = self.dt
+        else:
+            dt = max(timestamp - self._last_timestamp, 1e-3)
+        if timestamp is not None:
+            self._last_timestamp = timestamp
+        return dt
+
+    def _predict(self, dt):
+        # Noise is defined per 1/30 s frame and scaled to the actual step
+        scale = dt * 30
+        heights = np.maximum(self.boxes.x[:, 3:4], 1.0)
+        self.boxes.predict(dt, self.BOX_POS_STD * heights * scale, self.BOX_VEL_STD * heights * scale)
+        self.points.predict(dt, self.xyz_pos_std * scale, self.xyz_vel_std * scale, rows=self.has_xyz)
+
+    def advance(self, timestamp=None):
+        """
+        Moves every track forward to a frame that was not run through the
+        detector. Tracks coast on their velocity; no misses are counted.
+
+        Returns
+        -------
+        events : dict
+            Same layout as `update`, with every confirmed track under "updated".
+        """
+        self._predict(self._step(timestamp))
+        self.age += 1
+        return {"born": [], "updated": self.track_dicts(), "died": []}
+
+    def confidence(self, uncertainty_scale: float = 0.25):
+        """
+        Returns the (M,) confidence of every track's current box: its last
+        detection score, discounted as the predicted position grows uncertain.
+        It drops by a factor e when the position's standard deviation reaches
+        `uncertainty_scale` times the box height.
+        """
+        heights = np.maximum(self.boxes.x[:, 3], 1.0)
+        std = np.sqrt(self.boxes.P[:, 0, 0] + self.boxes.P[:, 1, 1])
+        return self.conf * np.exp(-std / (uncertainty_scale * heights))
+
+    def predicted_boxes(self):
+        """Returns the (M, 4) current track boxes in (x1, y1, x2, y2) format."""
+        return xywh_to_xyxy(self.boxes.position().astype(np.float32))
+
+    def update(self, boxes_xyxy, conf, cls=None, xyz=None, sizes=None, timestamp=None):
+        """
+        Advances all tracks to the new frame and corrects them with its detections.
+
+        Parameters
+        ----------
+        boxes_xyxy : np.ndarray
+            (N, 4) detection boxes in (x1, y1, x2, y2) format.
+        conf : np.ndarray
+            (N,) confidence scores.
+        cls : np.ndarray, optional
+            (N,) class ids; tracks only match detections of their own class.
+        xyz : np.ndarray, optional
+            (N, 3) positions from `bboxes_to_xyz` (NaN rows for invalid depth).
+        sizes : np.ndarray, optional
+            (N, 2) real-world sizes from `bboxes_real_world_size`.
+        timestamp : float, optional
+            Capture time (seconds); the time step defaults to `dt` without it.
+
+        Returns
+        -------
+        events : dict
+            "born": tracks confirmed this frame, "updated": confirmed tracks
+            matched this frame, "died": confirmed tracks removed this frame.
+            Each is a list of track dicts (see `track_dicts`).
+        """
+        boxes_xyxy = np.asarray(boxes_xyxy, dtype=np.float32).reshape(-1, 4)
+        n = len(boxes_xyxy)
+        conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        cls = np.zeros(n, dtype=np.int64) if cls is None else np.asarray(cls, dtype=np.int64).reshape(-1)
+        xyz = np.full((n, 3), np.nan) if xyz is None else np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        sizes = np.full((n, 2), np.nan) if sizes is None else np.asarray(sizes, dtype=np.float64).reshape(-1, 2)
+
+        self._predict(self._step(timestamp))
+        self.age += 1
+
+        # Associate detections with predicted track boxes of the same class
+        cost = 1.0 - iou_matrix(self.predicted_boxes(), boxes_xyxy)
+        cost[self.cls[:, None] != cls[None, :]] = np.inf
+        track_rows, det_rows = linear_assignment(cost, 1.0 - self.iou_threshold)
+
+        self._correct(track_rows, det_rows, boxes_xyxy, conf, xyz, sizes)
+        matched = np.zeros(len(self), dtype=bool)
+        matched[track_rows] = True
+        self.hits[track_rows] += 1
+        self.misses[track_rows] = 0
+        self.misses[~matched] += 1
+
+        # Unmatched detections start tentative tracks
+        unmatched = np.ones(n, dtype=bool)
+        unmatched[det_rows] = False
+        self._spawn(boxes_xyxy[unmatched], conf[unmatched], cls[unmatched],
+                    xyz[unmatched], sizes[unmatched])
+
+        fresh = self.misses == 0
+        newly_confirmed = ~self.confirmed & (self.hits >= self.min_hits)
+        self.confirmed |= newly_confirmed
+
+        events = {
+            "born": self.track_dicts(np.nonzero(newly_confirmed)[0]),
+            "updated": self.track_dicts(np.nonzero(fresh & self.confirmed & ~newly_confirmed)[0]),
+        }
+
+        # Tentative tracks die on their first miss; confirmed ones after max_misses
+        dead = (~fresh & ~self.confirmed) | (self.misses > self.max_misses)
+        events["died"] = self.track_dicts(np.nonzero(dead & self.confirmed)[0])
+        self._keep(~dead)
+        return events
+
+    def _correct(self, track_rows, det_rows, boxes_xyxy, conf, xyz, sizes):
+        if len(track_rows) == 0:
+            return
+        z = xyxy_to_xywh(boxes_xyxy[det_rows]).astype(np.float64)
+        self.boxes.update(track_rows, z, self.BOX_MEAS_STD * np.maximum(z[:, 3:4], 1.0))
+        self.conf[track_rows] = conf[det_rows]
+
+        # 3D: correct tracks that already have a position, start the others
+        valid = ~np.isnan(xyz[det_rows]).any(axis=1)
+        seen = valid & self.has_xyz[track_rows]
+        self.points.update(track_rows[seen], xyz[det_rows[seen]], self.xyz_meas_std)
+        first = valid & ~self.has_xyz[track_rows]
+        if first.any():
+            rows = track_rows[first]
+            self.points.x[rows] = 0.0
+            self.points.x[rows, :3] = xyz[det_rows[first]]
+            self.points.P[rows] = np.diag([self.xyz_meas_std ** 2] * 3 + [1.0] * 3)
+            self.has_xyz[rows] = True
+
+        # Sizes: exponential smoothing, ignoring invalid measurements
+        measured = sizes[det_rows]
+        ok = ~np.isnan(measured).any(axis=1)
+        current = self.size[track_rows]
+        blended = np.where(np.isnan(current), measured,
+                           (1 - self.size_alpha) * current + self.size_alpha * measured)
+        self.size[track_rows[ok]] = blended[ok]
+
+    def _spawn(self, boxes_xyxy, conf, cls, xyz, sizes):
+        k = len(boxes_xyxy)
+        if k == 0:
+            return
+        z = xyxy_to_xywh(boxes_xyxy).astype(np.float64)
+        heights = np.maximum(z[:, 3:4], 1.0)
+        self.boxes.add(z, 2 * self.BOX_POS_STD * heights, 10 * self.BOX_VEL_STD * heights)
+
+        valid = ~np.isnan(xyz).any(axis=1)
+        self.points.add(np.where(valid[:, None], xyz, 0.0), self.xyz_meas_std, 1.0)
+
+        self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + k)])
+        self._next_id += k
+        self.cls = np.concatenate([self.cls, cls])
+        self.conf = np.concatenate([self.conf, conf])
+        self.hits = np.concatenate([self.hits, np.ones(k, dtype=np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(k, dtype=np.int64)])
+        self.age = np.concatenate([self.age, np.zeros(k, dtype=np.int64)])
+        self.confirmed = np.concatenate([self.confirmed, np.zeros(k, dtype=bool)])
+        self.has_xyz = np.concatenate([self.has_xyz, valid])
+        self.size = np.concatenate([self.size, sizes])
+
+    def _keep(self, mask):
+        self.boxes.keep(mask)
+        self.points.keep(mask)
+        for name in ("ids", "cls", "conf", "hits", "misses", "age", "confirmed", "has_xyz", "size"):
+            setattr(self, name, getattr(self, name)[mask])
+
+    def track_dicts(self, rows=None):
+        """
+        Returns tracks as dicts with "id", "cls", "conf", "xyxy", "xyz",
+        "velocity", "size", "age", "hits" and "misses". "xyz", "velocity"
+        (m/s) and "size" are None until the track has had valid depth.
+        Defaults to every confirmed track.
+        """
+        if rows is None:
+            rows = np.nonzero(self.confirmed)[0]
+        boxes = self.predicted_boxes()
+        tracks = []
+        for row in rows:
+            has_xyz = bool(self.has_xyz[row])
+            tracks.append({
+                "id": int(self.ids[row]),
+                "cls": int(self.cls[row]),
+                "conf": float(self.conf[row]),
+                "xyxy": boxes[row],
+                "xyz": tuple(float(v) for v in self.points.x[row, :3]) if has_xyz else None,
+                "velocity": tuple(float(v) for v in self.points.x[row, 3:]) if has_xyz else None,
+                "size": None if np.isnan(self.size[row]).any() else tuple(float(v) for v in self.size[row]),
+                "age": int(self.age[row]),
+                "hits": int(self.hits[row]),
+                "misses": int(self.misses[row]),
+            })
+        return tracks
@@ -0,0 +1,496 @@
+import math
+import os
+import struct
+
+import numpy as np
+
+from utils.depth_ops import Extrinsics, transform_points
+from utils.metrics import REGISTRY
+
+MAP_ITEMS = REGISTRY.gauge("sybil_map_items", "Litter items held in the world map")
+MAP_EVICTIONS = REGISTRY.counter("sybil_map_evictions_total", "Litter items evicted from the world map")
+
+# Snapshot layout: header, then one packed ITEM_DTYPE record per item (64 bytes)
+SNAPSHOT_MAGIC = b"SYBLMAP1"
+SNAPSHOT_HEADER = struct.Struct("<8sIdq")  # magic, item count, cell size, next id
+ITEM_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("xyz", "<f4", (3,)),
+    ("weight", "<f4"),
+    ("confidence", "<f4"),
+    ("hits", "<u4"),
+    ("size", "<f4", (2,)),
+    ("first_seen", "<f8"),
+    ("last_seen", "<f8"),
+    ("cls", "<i2"),
+    ("collected", "u1"),
+    ("pad", "V5"),
+])
+
+
+def camera_to_world(x: float = 0.0, y: float = 0.0, yaw: float = 0.0, camera_offset=(0.0, 0.0, 0.0),
+                    camera_pitch: float = 0.0):
+    """
+    Builds the camera-to-world transform for a ground robot from its planar pose.
+
+    Parameters
+    ----------
+    x, y : float, optional
+        Robot position on the ground plane in meters (default is the origin).
+    yaw : float, optional
+        Robot heading in radians, counter-clockwise from the world x axis (default is 0).
+    camera_offset : tuple, optional
+        Camera position in the robot frame (forward, left, up) in meters.
+    camera_pitch : float, optional
+        Downward tilt of the camera in radians (default is 0).
+
+    Returns
+    -------
+    pose : Extrinsics
+        Maps camera space (x right, y down, z forward) to the world frame
+        (x, y on the ground, z up). Pass it to `LitterMap.add_detections`.
+    """
+    # Camera optical axes -> robot axes (forward, left, up)
+    optical = np.array([[0.0, 0.0, 1.0], [-1.0, 0.0, 0.0], [0.0, -1.0, 0.0]])
+    cp, sp = math.cos(camera_pitch), math.sin(camera_pitch)
+    pitch = np.array([[cp, 0.0, sp], [0.0, 1.0, 0.0], [-sp, 0.0, cp]])
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    heading = np.array([[cy, -sy, 0.0], [sy, cy, 0.0], [0.0, 0.0, 1.0]])
+
+    rotation = heading @ pitch @ optical
+    translation = np.array([x, y, 0.0]) + heading @ np.asarray(camera_offset, dtype=np.float64)
+    # Extrinsics store the rotation column-major
+    return Extrinsics(rotation.T.reshape(-1), translation)
+
+
+class LitterMap:
+    """
+    World-frame map of the litter SYBIL has seen.
+    Detections are moved to the world frame with the robot pose and merged
+    with the nearest item of the same class within `merge_radius`. Each item
+    accumulates confidence over its observations. Items live in parallel
+    NumPy arrays, indexed by a spatial hash of ground-plane cells.
+    """
+
+    def __init__(self, cell_size: float = 0.25, merge_radius: float = 0.2, max_age_s: float = None,
+                 max_range_m: float = None, max_items: int = 10000):
+        """
+        Parameters
+        ----------
+        cell_size : float, optional
+            Edge of a hash cell on the ground plane in meters (default is 0.25).
+            Keep it close to `merge_radius` so merging checks few cells.
+        merge_radius : float, optional
+            Detections closer than this (meters) to an item of the same class
+            are merged into it (default is 0.2).
+        max_age_s : float, optional
+            Evict items not seen for this many seconds (default is never).
+        max_range_m : float, optional
+            Evict items farther than this from the robot (default is never).
+        max_items : int, optional
+            Most items kept; the least confident are evicted first (default is 10000).
+
+        Why it's useful:
+        ----------------
+        - Each piece of litter is reported once, however often it is seen,
+          and collected items are remembered.
+        - Inserting and merging a detection touches a handful of cells,
+          whatever the size of the map.
+        - Eviction bounds memory on long runs.
+        """
+        if cell_size <= 0 or merge_radius <= 0:
+            raise ValueError(f"cell_size and merge_radius must be positive, got {cell_size} and {merge_radius}")
+        self.cell_size = cell_size
+        self.merge_radius = merge_radius
+        self.max_age_s = max_age_s
+        self.max_range_m = max_range_m
+        self.max_items = max_items
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.xyz = np.zeros((0, 3), dtype=np.float64)
+        self.weight = np.zeros(0, dtype=np.float64)
+        self.confidence = np.zeros(0, dtype=np.float64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.size = np.zeros((0, 2), dtype=np.float64)
+        self.first_seen = np.zeros(0, dtype=np.float64)
+        self.last_seen = np.zeros(0, dtype=np.float64)
+        self.cls = np.zeros(0, dtype=np.int64)
+        self.collected = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+
+        self._cells = {}    # (i, j) -> slots in that cell
+        self._slot_of = {}  # item id -> slot
+        self._free = []
+        self._next_id = 1
+        self.inserted = 0
+        self.merged = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def _key(self, point):
+        return math.floor(point[0] / self.cell_size), math.floor(point[1] / self.cell_size)
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self.ids))
+        extra = capacity - len(self.ids)
+        for name in ("ids", "xyz", "weight", "confidence", "hits", "size", "first_seen",
+                     "last_seen", "cls", "collected", "alive"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros((extra,) + array.shape[1:], array.dtype)]))
+        self._free.extend(range(len(self.ids) - 1, len(self.ids) - extra - 1, -1))
+
+    def _spawn(self, point, conf, cls, size, timestamp, item_id=None):
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        item_id = self._next_id if item_id is None else item_id
+        self._next_id = max(self._next_id, item_id + 1)
+
+        self.ids[slot] = item_id
+        self.xyz[slot] = point
+        self.weight[slot] = conf
+        self.confidence[slot] = conf
+        self.hits[slot] = 1
+        self.size[slot] = size
+        self.first_seen[slot] = self.last_seen[slot] = timestamp
+        self.cls[slot] = cls
+        self.collected[slot] = False
+        self.alive[slot] = True
+
+        self._cells.setdefault(self._key(point), []).append(slot)
+        self._slot_of[item_id] = slot
+        return slot
+
+    def _unlink(self, slot):
+        key = self._key(self.xyz[slot])
+        cell = self._cells[key]
+        cell.remove(slot)
+        if not cell:
+            del self._cells[key]
+
+    def _drop(self, slot):
+        self._unlink(slot)
+        del self._slot_of[int(self.ids[slot])]
+        self.alive[slot] = False
+        self._free.append(slot)
+
+    def _cells_around(self, point, radius):
+        i, j = self._key(point)
+        reach = math.ceil(radius / self.cell_size)
+        slots = []
+        for di in range(-reach, reach + 1):
+            for dj in range(-reach, reach + 1):
+                slots.extend(self._cells.get((i + di, j + dj), ()))
+        return np.asarray(slots, dtype=np.int64)
+
+    def _nearby(self, point, radius):
+        """Slots of the items possibly within `radius`: hashed cells, or a scan when that is cheaper."""
+        reach = math.ceil(radius / self.cell_size)
+        if (2 * reach + 1) ** 2 > len(self._cells):
+            return np.flatnonzero(self.alive)
+        return self._cells_around(point, radius)
+
+    def insert(self, points, conf, cls=None, sizes=None, timestamp: float = 0.0):
+        """
+        Adds world-frame observations, merging each into the nearest item of
+        the same class within `merge_radius`.
+
+        Parameters
+        ----------
+        points : np.ndarray
+            (N, 3) positions in the world frame (meters). NaN rows are skipped.
+        conf : np.ndarray
+            (N,) detection confidences.
+        cls : np.ndarray, optional
+            (N,) class ids (default is all 0).
+        sizes : np.ndarray, optional
+            (N, 2) real-world (width, height) in meters.
+        timestamp : float, optional
+            Observation time (seconds).
+
+        Returns
+        -------
+        events : dict
+            {"new": [...], "merged": [...]} item ids, one per valid observation.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        conf = np.asarray(conf, dtype=np.float64).reshape(-1)
+        cls = np.zeros(len(points), dtype=np.int64) if cls is None else np.asarray(cls).reshape(-1)
+        sizes = (np.full((len(points), 2), np.nan) if sizes is None
+                 else np.asarray(sizes, dtype=np.float64).reshape(-1, 2))
+
+        events = {"new": [], "merged": []}
+        for point, c, k, size in zip(points, conf, cls, sizes):
+            if not np.isfinite(point).all():
+                continue
+            self.inserted += 1
+
+            slots = self._cells_around(point, self.merge_radius)
+            if len(slots):
+                slots = slots[self.cls[slots] == k]
+            if len(slots):
+                distances = np.linalg.norm(self.xyz[slots] - point, axis=1)
+                nearest = int(distances.argmin())
+                if distances[nearest] <= self.merge_radius:
+                    self._merge(int(slots[nearest]), point, c, size, timestamp)
+                    events["merged"].append(int(self.ids[slots[nearest]]))
+                    continue
+
+            slot = self._spawn(point, c, int(k), size, timestamp)
+            events["new"].append(int(self.ids[slot]))
+
+        if REGISTRY.enabled:
+            MAP_ITEMS.set(len(self))
+        return events
+
+    def _merge(self, slot, point, conf, size, timestamp):
+        self.merged += 1
+        weight = self.weight[slot]
+        total = weight + max(conf, 1e-6)
+
+        # Confidence-weighted mean position; rehash if it moved to another cell
+        moved = (self.xyz[slot] * weight + point * conf) / total
+        if self._key(moved) != self._key(self.xyz[slot]):
+            self._unlink(slot)
+            self._cells.setdefault(self._key(moved), []).append(slot)
+        self.xyz[slot] = moved
+
+        if np.isfinite(size).all():
+            previous = self.size[slot]
+            self.size[slot] = size if not np.isfinite(previous).all() else (previous * weight + size * conf) / total
+
+        # Independent observations: the item is missed only if every one was wrong
+        self.confidence[slot] = 1.0 - (1.0 - self.confidence[slot]) * (1.0 - conf)
+        self.weight[slot] = total
+        self.hits[slot] += 1
+        self.last_seen[slot] = max(self.last_seen[slot], timestamp)
+
+    def add_detections(self, xyz, conf, cls=None, sizes=None, timestamp: float = 0.0, pose=None):
+        """
+        Adds one frame's camera-space detections, e.g. from `bboxes_to_xyz`,
+        then evicts stale items.
+
+        Parameters
+        ----------
+        xyz : np.ndarray
+            (N, 3) camera-space positions (meters); NaN rows are skipped.
+        conf, cls, sizes, timestamp :
+            As in `insert`.
+        pose : Extrinsics, optional
+            Camera-to-world transform at capture time, e.g. from
+            `camera_to_world` (default is the camera frame itself).
+
+        Returns
+        -------
+        events : dict
+            {"new", "merged", "evicted"} item ids.
+        """
+        points = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        position = None
+        if pose is not None:
+            points = transform_points(points, pose).astype(np.float64)
+            position = np.asarray(pose.translation, dtype=np.float64)
+        events = self.insert(points, conf, cls, sizes, timestamp)
+        events["evicted"] = self.evict(timestamp, position)
+        return events
+
+    def evict(self, now: float = None, position=None):
+        """
+        Removes items older than `max_age_s`, farther than `max_range_m`
+        from `position`, and the least confident beyond `max_items`.
+
+        Returns
+        -------
+        ids : list
+            Evicted item ids.
+        """
+        stale = np.zeros(len(self.alive), dtype=bool)
+        if self.max_age_s is not None and now is not None:
+            stale |= now - self.last_seen > self.max_age_s
+        if self.max_range_m is not None and position is not None:
+            stale |= np.linalg.norm(self.xyz[:, :2] - np.asarray(position)[:2], axis=1) > self.max_range_m
+        stale &= self.alive
+
+        excess = int(self.alive.sum() - stale.sum()) - self.max_items
+        if excess > 0:
+            kept = np.flatnonzero(self.alive & ~stale)
+            order = np.lexsort((self.last_seen[kept], self.confidence[kept]))
+            stale[kept[order[:excess]]] = True
+
+        slots = np.flatnonzero(stale)
+        ids = [int(i) for i in self.ids[slots]]
+        for slot in slots:
+            self._drop(int(slot))
+        if len(slots):
+            self.evicted += len(slots)
+            if REGISTRY.enabled:
+                MAP_EVICTIONS.inc(len(slots))
+                MAP_ITEMS.set(len(self))
+        return ids
+
+    def _select(self, slots, min_confidence, cls, include_collected):
+        keep = self.confidence[slots] >= min_confidence
+        if cls is not None:
+            keep &= self.cls[slots] == cls
+        if not include_collected:
+            keep &= ~self.collected[slots]
+        return slots[keep]
+
+    def query_radius(self, center, radius: float, min_confidence: float = 0.0, cls: int = None,
+                     include_collected: bool = False):
+        """
+        Finds the items within `radius` meters of a world-frame point.
+
+        Parameters
+        ----------
+        center : tuple
+            (x, y, z) world-frame point; only x and y are used.
+        radius : float
+            Search radius on the ground plane (meters).
+        min_confidence : float, optional
+            Skip items with a lower accumulated confidence (default is 0).
+        cls : int, optional
+            Only items of this class (default is any).
+        include_collected : bool, optional
+            Also return collected items (default is False).
+
+        Returns
+        -------
+        items : list of dict
+            Item dicts (see `item_dicts`), nearest first.
+        """
+        center = np.asarray(center, dtype=np.float64)
+        slots = self._select(self._nearby(center, radius), min_confidence, cls, include_collected)
+        distances = np.linalg.norm(self.xyz[slots, :2] - center[:2], axis=1)
+        order = np.argsort(distances)
+        order = order[distances[order] <= radius]
+        return self.item_dicts(slots[order])
+
+    def nearest(self, point, max_distance: float = math.inf, min_confidence: float = 0.0, cls: int = None,
+                include_collected: bool = False):
+        """
+        Finds the item nearest to a world-frame point on the ground plane,
+        e.g. the next piece of litter to collect.
+
+        Returns
+        -------
+        item : dict or None
+            The nearest matching item within `max_distance`, or None.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        best_slot, best = None, math.inf
+        reach = 0
+        # Grow square rings of cells until no unvisited cell can hold anything closer
+        while True:
+            if (2 * reach + 1) ** 2 > len(self._cells):
+                slots = np.flatnonzero(self.alive)  # Scanning everything is now cheaper
+            else:
+                slots = self._cells_around(point, reach * self.cell_size)
+            slots = self._select(slots, min_confidence, cls, include_collected)
+            if len(slots):
+                distances = np.linalg.norm(self.xyz[slots, :2] - point[:2], axis=1)
+                i = int(distances.argmin())
+                if distances[i] < best:
+                    best_slot, best = int(slots[i]), float(distances[i])
+            if (2 * reach + 1) ** 2 > len(self._cells) or best <= reach * self.cell_size \
+                    or reach * self.cell_size > max_distance:
+                break
+            reach += 1
+
+        if best_slot is None or best > max_distance:
+            return None
+        return self.item_dicts([best_slot])[0]
+
+    def mark_collected(self, ids):
+        """Flags items as collected: kept for deduplication, left out of queries."""
+        for item_id in ids:
+            slot = self._slot_of.get(int(item_id))
+            if slot is not None:
+                self.collected[slot] = True
+
+    def remove(self, ids):
+        """Deletes items from the map."""
+        for item_id in ids:
+            slot = self._slot_of.get(int(item_id))
+            if slot is not None:
+                self._drop(slot)
+
+    def item_dicts(self, slots=None):
+        """Returns item dicts (id, cls, xyz, size, confidence, hits, first_seen, last_seen, collected)."""
+        slots = np.flatnonzero(self.alive) if slots is None else np.asarray(slots, dtype=np.int64)
+        return [
+            {
+                "id": int(self.ids[s]),
+                "cls": int(self.cls[s]),
+                "xyz": tuple(float(v) for v in self.xyz[s]),
+                "size": tuple(float(v) for v in self.size[s]) if np.isfinite(self.size[s]).all() else None,
+                "confidence": float(self.confidence[s]),
+                "hits": int(self.hits[s]),
+                "first_seen": float(self.first_seen[s]),
+                "last_seen": float(self.last_seen[s]),
+                "collected": bool(self.collected[s]),
+            }
+            for s in slots
+        ]
+
+    def get(self, ids):
+        """Returns the item dicts of the given item ids, skipping unknown ones."""
+        return self.item_dicts([self._slot_of[int(i)] for i in ids if int(i) in self._slot_of])
+
+    def stats(self):
+        """Returns item, cell and insert/merge/eviction counts."""
+        return {
+            "items": len(self),
+            "collected": int(self.collected[self.alive].sum()),
+            "cells": len(self._cells),
+            "inserted": self.inserted,
+            "merged": self.merged,
+            "evicted": self.evicted,
+        }
+
+    def save(self, path):
+        """
+        Writes a compact binary snapshot: a small header and one 64-byte
+        record per item. The file is replaced atomically.
+        """
+        slots = np.flatnonzero(self.alive)
+        records = np.zeros(len(slots), dtype=ITEM_DTYPE)
+        for name in ("xyz", "weight", "confidence", "hits", "size", "first_seen",
+                     "last_seen", "cls", "collected"):
+            records[name] = getattr(self, name)[slots]
+        records["id"] = self.ids[slots]
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(records), self.cell_size, self._next_id))
+            f.write(records.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Reads a snapshot written by `save`. Keyword arguments are passed to
+        the constructor; `cell_size` defaults to the one saved.
+        """
+        with open(path, "rb") as f:
+            magic, count, cell_size, next_id = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a litter map snapshot: {path}")
+            records = np.frombuffer(f.read(count * ITEM_DTYPE.itemsize), dtype=ITEM_DTYPE)
+        if len(records) != count:
+            raise ValueError(f"Truncated litter map snapshot: {path}")
+
+        kwargs.setdefault("cell_size", cell_size)
+        litter_map = cls(**kwargs)
+        for record in records:
+            slot = litter_map._spawn(record["xyz"].astype(np.float64), float(record["confidence"]),
+                                     int(record["cls"]), record["size"], float(record["first_seen"]),
+                                     item_id=int(record["id"]))
+            litter_map.weight[slot] = record["weight"]
+            litter_map.hits[slot] = record["hits"]
+            litter_map.last_seen[slot] = record["last_seen"]
+            litter_map.collected[slot] = bool(record["collected"])
+        litter_map._next_id = max(litter_map._next_id, next_id)
+        return litter_map
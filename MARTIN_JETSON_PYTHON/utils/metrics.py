@@ -0,0 +1,321 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds (upper bounds), from 100 us to 2.5 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Counter:
+    """Monotonically increasing count (frames, detections, drops, ...)."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Value that can go up and down (queue depth, frame age, ...)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Observing a value is a binary search plus two
+    additions, with no allocation, so it is cheap enough for per-frame use.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket holding it."""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _NullTimer:
+    """Shared no-op context manager handed out while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Holds every metric of the process. Disabled by default: while disabled,
+    `timer()` returns a shared no-op and `timed` functions call straight
+    through after a single flag check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def timer(self, name, help_text=""):
+        """Context manager that records its duration (seconds) into a histogram."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name, help_text))
+
+    def timed(self, name, help_text=""):
+        """Decorator that records every call's duration (seconds) into a histogram."""
+        histogram = self.histogram(name, help_text)
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Returns {name: value} for every metric (histograms as summaries)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render_prometheus(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    lines.append(f'{metric.name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric.name}_bucket{{le="+Inf"}} {metric.count}')
+                lines.append(f"{metric.name}_sum {metric.sum}")
+                lines.append(f"{metric.name}_count {metric.count}")
+            else:
+                lines.append(f"{metric.name} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the sensors, models and utils
+REGISTRY = MetricsRegistry()
+
+
+class MetricsExporter:
+    """
+    Background thread that publishes the registry every `interval` seconds
+    to a rolling JSON-lines log and/or a Prometheus text file, and optionally
+    serves it over HTTP at /metrics.
+    """
+
+    def __init__(self, registry=REGISTRY, interval: float = 5.0, log_path=None,
+                 prometheus_path=None, port: int = None, max_log_bytes: int = 5_000_000,
+                 log_backups: int = 3):
+        """
+        Parameters
+        ----------
+        registry : MetricsRegistry, optional
+            Registry to export (default is the process-wide `REGISTRY`).
+        interval : float, optional
+            Seconds between exports (default is 5.0).
+        log_path : str, optional
+            Rolling log file; one JSON snapshot per line.
+        prometheus_path : str, optional
+            Text file rewritten atomically in Prometheus format, e.g. for the
+            node exporter's textfile collector.
+        port : int, optional
+            Serve the Prometheus text format on http://0.0.0.0:port/metrics.
+        max_log_bytes, log_backups : int, optional
+            Size at which the log rolls over, and how many old logs are kept.
+        """
+        self.registry = registry
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+        self._logger = None
+        if log_path is not None:
+            self._logger = logging.getLogger(f"martin.metrics.{id(self)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.addHandler(logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=max_log_bytes, backupCount=log_backups))
+
+        if port is not None:
+            registry_ref = registry
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip("/") != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = registry_ref.render_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        if self._server is not None:
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        if self._server is not None:
+            self._server.shutdown()
+        self.export()
+
+    def export(self):
+        """Writes one snapshot to every configured destination."""
+        if self._logger is not None:
+            self._logger.info(json.dumps({"time": time.time(), "metrics": self.registry.snapshot()}))
+        if self.prometheus_path is not None:
+            tmp_path = f"{self.prometheus_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.registry.render_prometheus())
+            os.replace(tmp_path, self.prometheus_path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+
+def add_metrics_arguments(parser):
+    """Adds the command-line options that turn on metrics export."""
+    parser.add_argument("--metrics-log", default=None,
+                        help="rolling JSON-lines metrics log")
+    parser.add_argument("--metrics-prom", default=None,
+                        help="Prometheus text file rewritten every interval")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port at /metrics")
+    parser.add_argument("--metrics-interval", type=float, default=5.0,
+                        help="seconds between metrics exports")
+
+
+def start_metrics(args):
+    """Enables the registry and starts an exporter if any metrics option was given."""
+    if args.metrics_log is None and args.metrics_prom is None and args.metrics_port is None:
+        return None
+    REGISTRY.enabled = True
+    exporter = MetricsExporter(interval=args.metrics_interval, log_path=args.metrics_log,
+                               prometheus_path=args.metrics_prom, port=args.metrics_port)
+    exporter.start()
+    return exporter
@@ -0,0 +1,367 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from utils.metrics import REGISTRY
+from utils.depth_ops import (
+    bboxes_to_xyz,
+    bboxes_real_world_size,
+    row_or_none,
+    DepthStats
+)
+
+FRAMES_CAPTURED = REGISTRY.counter("sybil_frames_captured_total", "Frames read from the source")
+FRAMES_PROCESSED = REGISTRY.counter("sybil_frames_processed_total", "Frames fully post-processed")
+FRAMES_DROPPED = REGISTRY.counter("sybil_frames_dropped_total", "Frames dropped between stages")
+DETECTIONS = REGISTRY.counter("sybil_detections_total", "Detections reported")
+FRAME_QUEUE_DEPTH = REGISTRY.gauge("sybil_frame_queue_depth", "Frames waiting for inference")
+RESULT_QUEUE_DEPTH = REGISTRY.gauge("sybil_result_queue_depth", "Frames waiting for post-processing")
+FRAME_AGE = REGISTRY.gauge("sybil_frame_age_seconds", "Time from capture to detections for the last frame")
+CALLBACK_ERRORS = REGISTRY.counter("sybil_callback_errors_total", "Exceptions raised by pipeline callbacks")
+
+log = logging.getLogger("martin.pipeline")
+
+# Marks the end of a finite frame source (e.g. a replay) as it flows through the stages
+END_OF_STREAM = object()
+
+
+def model_stage_timings(speed):
+    """Renames a model's per-image `speed` dict (ms) to the node's stage names."""
+    return {
+        "preprocess": speed.get("preprocess", 0.0),
+        "forward": speed.get("inference", 0.0),
+        "nms": speed.get("postprocess", 0.0),
+    }
+
+
+class DropOldestQueue:
+    """
+    A bounded, thread-safe queue that never blocks the producer.
+    When the queue is full, the oldest item is discarded to make room
+    for the newest one, so consumers always work on recent frames.
+    """
+
+    def __init__(self, maxsize: int = 2, on_drop=None):
+        """
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of items held at once (default is 2).
+        on_drop : callable, optional
+            Called with every item discarded to make room (e.g. to release
+            its frame slot).
+        """
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, got {maxsize}")
+        self._items = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self._on_drop = on_drop
+        self.dropped = 0
+
+    def put(self, item, block: bool = False, timeout: float = None):
+        """
+        Adds an item, discarding the oldest one if the queue is full.
+        With `block=True` it instead waits for space (up to `timeout` seconds)
+        and returns False if none became available.
+        """
+        dropped = None
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                if block:
+                    if not self._cond.wait_for(lambda: len(self._items) < self._maxsize, timeout=timeout):
+                        return False
+                else:
+                    dropped = self._items.popleft()
+                    self.dropped += 1
+                    if REGISTRY.enabled:
+                        FRAMES_DROPPED.inc()
+            self._items.append(item)
+            self._cond.notify_all()
+        if dropped is not None and self._on_drop is not None:
+            self._on_drop(dropped)
+        return True
+
+    def get(self, timeout: float = None):
+        """
+        Removes and returns the oldest item.
+        Returns None if no item arrives within `timeout` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout=timeout):
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def qsize(self):
+        """Returns the number of items currently waiting."""
+        with self._cond:
+            return len(self._items)
+
+    def drain(self):
+        """Removes and returns every waiting item."""
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+            self._cond.notify_all()
+            return items
+
+
+class SybilPipeline:
+    """
+    Staged capture / inference / post-processing pipeline for SYBIL.
+    Each stage runs on its own worker thread and the stages are joined
+    by bounded drop-oldest queues, so throughput is set by the slowest
+    stage instead of the sum of all stages.
+    """
+
+    def __init__(self, camera, model, intrinsics, depth_scale,
+                 on_detections=None, queue_size: int = 2,
+                 conf_threshold: float = 0.531, roi_depth: bool = False,
+                 on_frame=None, lossless: bool = False, tracker=None, on_tracks=None):
+        """
+        Parameters
+        ----------
+        camera : FrameSource
+            Frame source providing `acquire_frame()`. Its frame ring is
+            sized so every queued frame can stay in flight.
+        model : SybilModel
+            Detection model providing `detect()`.
+        intrinsics : rs.intrinsics
+            Color camera intrinsics used for deprojection.
+        depth_scale : float
+            Depth scale (meters per unit).
+        on_detections : callable, optional
+            Called from the post-processing thread with the list of
+            detections for every processed frame.
+        queue_size : int, optional
+            Capacity of each inter-stage queue (default is 2).
+        conf_threshold : float, optional
+            Confidence threshold passed to the model (default is 0.531).
+        roi_depth : bool, optional
+            Use robust box depth statistics (`DepthStats`) instead of the
+            single center pixel (default is False).
+        on_frame : callable, optional
+            Called from the post-processing thread as `on_frame(packet, detections)`.
+            `packet["timings"]` holds per-stage milliseconds and
+            `packet["captured_at"]` / `packet["done_at"]` the `time.perf_counter()`
+            times the frame was captured and fully processed.
+            `packet["rgb"]` / `packet["depth"]` are only valid during the call;
+            the frame goes back to the ring afterwards.
+        lossless : bool, optional
+            Make the capture stage wait for space instead of dropping frames
+            (default is False). Meant for replaying recordings as fast as
+            possible, where every frame should be processed.
+        tracker : MultiObjectTracker, optional
+            Tracker fed with every processed frame's detections and 3D data.
+        on_tracks : callable, optional
+            Called from the post-processing thread with the tracker's
+            {"born", "updated", "died"} events for every processed frame.
+
+        Why it's useful:
+        ----------------
+        - Camera I/O, the forward pass and deprojection overlap in time.
+        - Stale frames are dropped when the model falls behind, so the
+          robot always acts on the most recent view of the scene.
+        - Every detection carries the capture timestamp of its frame.
+        - Frames live in the source's preallocated ring, copied once at
+          capture and released as soon as they are processed or dropped.
+        """
+        self.camera = camera
+        self.model = model
+        self.intrinsics = intrinsics
+        self.depth_scale = depth_scale
+        self.on_detections = on_detections
+        self.conf_threshold = conf_threshold
+        self.roi_depth = roi_depth
+        self.on_frame = on_frame
+        self.lossless = lossless
+        self.tracker = tracker
+        self.on_tracks = on_tracks
+        # Set when the camera leaves depth unaligned; boxes are aligned on demand
+        self.aligner = camera.get_depth_aligner()
+
+        # Two full queues, plus one frame in each stage
+        if camera.ring is None:
+            camera.configure_ring(max(camera.ring_size, 2 * queue_size + 3))
+
+        self.frame_queue = DropOldestQueue(queue_size, on_drop=_release_packet)
+        self.result_queue = DropOldestQueue(queue_size, on_drop=_release_packet)
+
+        self.frames_captured = 0
+        self.frames_processed = 0
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Starts the capture, inference and post-processing threads."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="sybil-capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="sybil-inference", daemon=True),
+            threading.Thread(target=self._postprocess_loop, name="sybil-postprocess", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Signals all stages to finish and waits for them to exit."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        for queue in (self.frame_queue, self.result_queue):
+            for packet in queue.drain():
+                _release_packet(packet)
+
+    def is_running(self):
+        """Returns True while any stage thread is still working."""
+        return any(t.is_alive() for t in self._threads)
+
+    def stats(self):
+        """Returns frame counters, per-queue drop counts and frame ring statistics."""
+        stats = {
+            "frames_captured": self.frames_captured,
+            "frames_processed": self.frames_processed,
+            "dropped_before_inference": self.frame_queue.dropped,
+            "dropped_before_postprocess": self.result_queue.dropped,
+        }
+        if self.camera.ring is not None:
+            stats["ring"] = self.camera.ring.stats()
+        return stats
+
+    def _put_blocking(self, target, item):
+        # Waits for space, but gives up once the pipeline is stopping
+        while not self._stop.is_set():
+            if target.put(item, block=True, timeout=0.1):
+                return True
+        _release_packet(item)
+        return False
+
+    def _forward(self, target, packet):
+        if self.lossless:
+            self._put_blocking(target, packet)
+        else:
+            target.put(packet)
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            slot = self.camera.acquire_frame()
+            captured_at = time.perf_counter()
+            if slot is None:
+                if self.camera.finished:
+                    self._put_blocking(self.frame_queue, END_OF_STREAM)
+                    return
+                continue
+
+            timings = {"acquire": (captured_at - t0) * 1000}
+            timings.update(self.camera.last_timings)
+
+            packet = {
+                "seq": slot.seq,
+                "timestamp": slot.timestamp,
+                "captured_at": captured_at,
+                "timings": timings,
+                "slot": slot,
+            }
+            self._forward(self.frame_queue, packet)
+            self.frames_captured += 1
+            if REGISTRY.enabled:
+                FRAMES_CAPTURED.inc()
+                FRAME_QUEUE_DEPTH.set(self.frame_queue.qsize())
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            packet = self.frame_queue.get(timeout=0.1)
+            if packet is None:
+                continue
+            if packet is END_OF_STREAM:
+                self._put_blocking(self.result_queue, END_OF_STREAM)
+                return
+
+            # Boxes are moved to the host once per frame
+            detections = self.model.detect(packet["slot"].rgb, conf_threshold=self.conf_threshold,
+                                           timestamp=packet["timestamp"])
+            packet["boxes_xyxy"] = detections.xyxy
+            packet["boxes_xywh"] = detections.xywh
+            packet["conf"] = detections.conf
+            packet["cls"] = detections.cls
+            packet["timings"].update(model_stage_timings(detections.speed))
+            self._forward(self.result_queue, packet)
+
+    def _postprocess_loop(self):
+        while not self._stop.is_set():
+            packet = self.result_queue.get(timeout=0.1)
+            if packet is None:
+                continue
+            if packet is END_OF_STREAM:
+                return
+
+            # Read through the slot: a zero-copy frame may have been moved into the ring since capture
+            packet["rgb"], packet["depth"] = packet["slot"].rgb, packet["slot"].depth
+            if self.aligner is not None:
+                t0 = time.perf_counter()
+                packet["depth"] = self.aligner.align_boxes(packet["depth"], packet["boxes_xyxy"])
+                packet["timings"]["align"] = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            depths_m = None
+            if self.roi_depth:
+                depths_m = DepthStats(packet["depth"], self.depth_scale).robust_depth(packet["boxes_xyxy"])
+
+            xyzs = bboxes_to_xyz(packet["boxes_xywh"], packet["depth"],
+                                 self.intrinsics, self.depth_scale, depths_m)
+            sizes = bboxes_real_world_size(packet["boxes_xyxy"], packet["boxes_xywh"], packet["depth"],
+                                           self.intrinsics, self.depth_scale, depths_m)
+            packet["xyz"], packet["sizes"] = xyzs, sizes
+            packet["timings"]["deproject"] = (time.perf_counter() - t0) * 1000
+
+            detections = []
+            for i in range(len(packet["boxes_xyxy"])):
+                detections.append({
+                    "seq": packet["seq"],
+                    "timestamp": packet["timestamp"],
+                    "xyxy": packet["boxes_xyxy"][i],
+                    "conf": float(packet["conf"][i]),
+                    "xyz": row_or_none(xyzs[i]),
+                    "size": row_or_none(sizes[i]),
+                })
+
+            if self.tracker is not None:
+                t0 = time.perf_counter()
+                packet["tracks"] = self.tracker.update(packet["boxes_xyxy"], packet["conf"], packet["cls"],
+                                                       xyzs, sizes, timestamp=packet["timestamp"])
+                packet["timings"]["track"] = (time.perf_counter() - t0) * 1000
+
+            self.frames_processed += 1
+            packet["done_at"] = time.perf_counter()
+            if REGISTRY.enabled:
+                FRAMES_PROCESSED.inc()
+                DETECTIONS.inc(len(detections))
+                FRAME_QUEUE_DEPTH.set(self.frame_queue.qsize())
+                RESULT_QUEUE_DEPTH.set(self.result_queue.qsize())
+                FRAME_AGE.set(packet["done_at"] - packet["captured_at"])
+            # A failing callback is logged and skipped for this frame; the slot always goes back
+            try:
+                if self.on_detections is not None:
+                    self.on_detections(detections)
+                if self.on_tracks is not None and self.tracker is not None:
+                    self.on_tracks(packet["tracks"])
+                if self.on_frame is not None:
+                    self.on_frame(packet, detections)
+            except Exception:
+                log.exception("Pipeline callback failed on frame %s", packet["seq"])
+                if REGISTRY.enabled:
+                    CALLBACK_ERRORS.inc()
+            finally:
+                _release_packet(packet)
+
+
+def _release_packet(packet):
+    # Returns a packet's frame to the source's ring; sentinels carry none
+    if isinstance(packet, dict):
+        packet.pop("slot").release()
@@ -0,0 +1,169 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+FRAMES_SHOWN = REGISTRY.counter("sybil_render_frames_shown_total", "Frames drawn and shown by the display thread")
+FRAMES_SKIPPED = REGISTRY.counter("sybil_render_frames_skipped_total",
+                                  "Published frames replaced before the display thread took them")
+
+
+class LatestValue:
+    """
+    A thread-safe, single-slot buffer that only keeps the newest value.
+    Publishing never blocks: an unread value is simply replaced. Readers
+    wait for a value newer than the last one they took.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._value = None
+        self._seq = 0
+        self._taken_seq = 0
+        self.skipped = 0
+
+    def publish(self, value):
+        """Stores `value`, replacing any value no reader has taken yet."""
+        with self._condition:
+            if self._seq > self._taken_seq:
+                self.skipped += 1
+                if REGISTRY.enabled:
+                    FRAMES_SKIPPED.inc()
+            self._value = value
+            self._seq += 1
+            self._condition.notify_all()
+
+    def take(self, after_seq: int = 0, timeout: float = None):
+        """
+        Returns (seq, value) for the newest value with a sequence number
+        above `after_seq`, waiting up to `timeout` seconds for one.
+        Returns (after_seq, None) on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq > after_seq, timeout):
+                return after_seq, None
+            self._taken_seq = self._seq
+            return self._seq, self._value
+
+
+def draw_detections(canvas, frame, names):
+    """
+    Draws boxes, centers and labels on `canvas` from one published frame.
+
+    Parameters
+    ----------
+    canvas : np.ndarray
+        BGR image to draw on (modified in place).
+    frame : dict
+        Host-side arrays of one frame: "xyxy", "xywh", "conf", "cls" and
+        optionally "depth_m" (N,) and "xyz" (N, 3), NaN where invalid.
+    names : dict
+        Class id to name.
+    """
+    import cv2
+
+    xyxy = frame["xyxy"].astype(np.int64)
+    centers = frame["xywh"][:, :2].astype(np.int64)
+    depth_m = frame.get("depth_m")
+    xyz = frame.get("xyz")
+
+    for i in range(len(xyxy)):
+        x1, y1, x2, y2 = xyxy[i]
+        cv2.rectangle(canvas, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+        cv2.circle(canvas, (int(centers[i, 0]), int(centers[i, 1])), 4, (0, 0, 255), -1)
+
+        label = f"{names.get(int(frame['cls'][i]), int(frame['cls'][i]))} {frame['conf'][i]:.2f}"
+        if depth_m is not None and np.isfinite(depth_m[i]):
+            label += f" | depth: {depth_m[i]:.2f}m"
+        if xyz is not None and np.isfinite(xyz[i]).all():
+            X, Y, Z = xyz[i]
+            label += f" | XYZ: ({X:.2f}, {Y:.2f}, {Z:.2f})"
+        cv2.putText(canvas, label, (int(x1), max(0, int(y1) - 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    return canvas
+
+
+class DisplayThread:
+    """
+    Annotates and shows published frames on its own thread, at most
+    `max_fps` times per second. Frames published faster than that are
+    skipped; the publisher never waits for the display.
+    """
+
+    def __init__(self, buffer: LatestValue, names, window: str = "SYBIL Detections", max_fps: float = 15.0):
+        """
+        Parameters
+        ----------
+        buffer : LatestValue
+            Where the detection loop publishes frame dicts (see `draw_detections`,
+            plus "rgb").
+        names : dict
+            Class id to name.
+        window : str, optional
+            OpenCV window title (default is "SYBIL Detections").
+        max_fps : float, optional
+            Display rate cap (default is 15). 0 shows every frame it can.
+
+        Why it's useful:
+        ----------------
+        - Drawing, `imshow` and `waitKey` no longer add to detection latency.
+        - A slow display drops frames instead of slowing inference down.
+        """
+        self.buffer = buffer
+        self.names = names
+        self.window = window
+        self.min_period = 1.0 / max_fps if max_fps else 0.0
+
+        # Set when the window asks to quit ('q'), read by the detection loop
+        self.closed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.shown = 0
+        self.render_ms = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="sybil-display", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def _loop(self):
+        # Every OpenCV GUI call stays on this thread
+        import cv2
+
+        seq = 0
+        next_show = 0.0
+        try:
+            while not self._stop.is_set():
+                wait = next_show - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                seq, frame = self.buffer.take(seq, timeout=0.1)
+                if frame is None:
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                    continue
+
+                t0 = time.perf_counter()
+                canvas = draw_detections(frame["rgb"].copy(), frame, self.names)
+                cv2.imshow(self.window, canvas)
+                key = cv2.waitKey(1) & 0xFF
+                self.render_ms = (time.perf_counter() - t0) * 1000
+                self.shown += 1
+                if REGISTRY.enabled:
+                    FRAMES_SHOWN.inc()
+                next_show = t0 + self.min_period
+                if key == ord('q'):
+                    break
+        finally:
+            self.closed.set()
+            cv2.destroyAllWindows()
+
+    def stats(self):
+        """Returns frames shown and skipped, and the last draw + show time (ms)."""
+        return {"shown": self.shown, "skipped": self.buffer.skipped, "render_ms": self.render_ms}
@@ -0,0 +1,189 @@
+import math
+import time
+
+from utils.metrics import REGISTRY
+
+DETECTION_FRAMES = REGISTRY.counter("sybil_scheduler_detections_total", "Frames run through the detector")
+TRACKED_FRAMES = REGISTRY.counter("sybil_scheduler_tracked_frames_total", "Frames served by the tracker alone")
+DETECTION_INTERVAL = REGISTRY.gauge("sybil_scheduler_interval_frames", "Current frames between detections")
+
+
+class DetectionScheduler:
+    """
+    Detect-then-track scheduling for SYBIL.
+    The full model runs every `interval` frames, and the tracker propagates
+    the boxes in between. The interval adapts to a latency or detection-rate
+    budget and to how fast the tracked litter moves in the image. A tracker
+    confidence drop, or an unconfirmed new track, triggers detection early.
+    """
+
+    def __init__(self, model, tracker, conf_threshold: float = 0.531,
+                 min_interval: int = 1, max_interval: int = 10,
+                 target_latency_ms: float = None, max_detections_per_s: float = None,
+                 min_track_confidence: float = 0.3, max_motion: float = 0.25,
+                 fps: float = 30.0):
+        """
+        Parameters
+        ----------
+        model : SybilModel
+            Detection model providing `detect()`.
+        tracker : MultiObjectTracker
+            Tracker that carries the boxes between detections.
+        conf_threshold : float, optional
+            Confidence threshold passed to the model (default is 0.531).
+        min_interval, max_interval : int, optional
+            Bounds on the frames between two detections (default is 1 and 10).
+            `max_interval` also bounds how long new litter can go unseen.
+        target_latency_ms : float, optional
+            Average per-frame processing time to stay under. Sets the
+            smallest interval that fits the measured detection cost.
+        max_detections_per_s : float, optional
+            Power budget: at most this many detector runs per second.
+        min_track_confidence : float, optional
+            Detect as soon as any confirmed track's `confidence()` falls
+            below this (default is 0.3).
+        max_motion : float, optional
+            Largest motion, in box heights, the fastest track may make between
+            detections (default is 0.25). Fast scenes get short intervals.
+        fps : float, optional
+            Frame rate assumed until timestamps are available (default is 30).
+
+        Why it's useful:
+        ----------------
+        - A static scene only pays for the detector every few frames.
+        - Litter stays tracked, with IDs and 3D data, on the frames in between.
+        - The interval shrinks on its own when objects move or appear.
+        """
+        if not 1 <= min_interval <= max_interval:
+            raise ValueError(f"Need 1 <= min_interval <= max_interval, got {min_interval} and {max_interval}")
+        self.model = model
+        self.tracker = tracker
+        self.conf_threshold = conf_threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_latency_ms = target_latency_ms
+        self.max_detections_per_s = max_detections_per_s
+        self.min_track_confidence = min_track_confidence
+        self.max_motion = max_motion
+        self.fps = fps
+
+        self.interval = min_interval
+        self.frames = 0
+        self.detections_run = 0
+        self.frames_since_detection = 0
+        self.detect_ms = None
+        self.track_ms = None
+        self._budget_interval = min_interval
+        self._last_timestamp = None
+
+    def step(self, rgb, timestamp=None, measure=None):
+        """
+        Processes one frame: runs the detector or lets the tracker propagate.
+
+        Parameters
+        ----------
+        rgb : np.ndarray
+            BGR frame.
+        timestamp : float, optional
+            Capture time (seconds).
+        measure : callable, optional
+            Called on detection frames as `measure(detections)`; returns the
+            (xyz, sizes) arrays for the tracker, e.g. from `bboxes_to_xyz` and
+            `bboxes_real_world_size`.
+
+        Returns
+        -------
+        events : dict
+            The tracker's {"born", "updated", "died"} events for this frame.
+        detections : Detections or None
+            The raw detections, or None if the frame was not run through the detector.
+        """
+        self._observe_rate(timestamp)
+        t0 = time.perf_counter()
+        if self._should_detect():
+            detections = self.model.detect(rgb, conf_threshold=self.conf_threshold, timestamp=timestamp)
+            xyz, sizes = measure(detections) if measure is not None else (None, None)
+            events = self.tracker.update(detections.xyxy, detections.conf, detections.cls,
+                                         xyz, sizes, timestamp=timestamp)
+            self.detect_ms = _ema(self.detect_ms, (time.perf_counter() - t0) * 1000)
+            self.detections_run += 1
+            self.frames_since_detection = 0
+            if REGISTRY.enabled:
+                DETECTION_FRAMES.inc()
+        else:
+            detections = None
+            events = self.tracker.advance(timestamp)
+            self.track_ms = _ema(self.track_ms, (time.perf_counter() - t0) * 1000)
+            self.frames_since_detection += 1
+            if REGISTRY.enabled:
+                TRACKED_FRAMES.inc()
+
+        self.frames += 1
+        self._update_interval()
+        return events, detections
+
+    def _observe_rate(self, timestamp):
+        if timestamp is not None and self._last_timestamp is not None:
+            dt = timestamp - self._last_timestamp
+            if dt > 0:
+                self.fps = _ema(self.fps, 1.0 / dt, alpha=0.05)
+        self._last_timestamp = timestamp
+
+    def _should_detect(self):
+        if self.detections_run == 0:
+            return True
+        due = self.frames_since_detection + 1
+        if due >= self.interval:
+            return True
+        if due < self._budget_interval:
+            return False
+
+        # Early triggers, as far as the budget allows
+        tracker = self.tracker
+        if len(tracker) and not tracker.confirmed.all():
+            return True  # New litter is confirmed faster with fresh detections
+        confidence = tracker.confidence()[tracker.confirmed]
+        return bool(len(confidence) and confidence.min() < self.min_track_confidence)
+
+    def _update_interval(self):
+        interval = float(self.max_interval)
+
+        # Scene change: the fastest track may move at most `max_motion` box heights
+        tracker = self.tracker
+        if len(tracker):
+            heights = tracker.boxes.x[:, 3].clip(min=1.0)
+            speeds = (tracker.boxes.x[:, 4] ** 2 + tracker.boxes.x[:, 5] ** 2) ** 0.5 / heights
+            fastest = float(speeds.max())
+            if fastest > 0:
+                interval = min(interval, self.max_motion / fastest * self.fps)
+
+        # Budgets: (detect + (N - 1) * track) / N <= target  =>  N >= (detect - track) / (target - track)
+        budget = 1.0
+        if self.target_latency_ms is not None and self.detect_ms is not None:
+            track_ms = self.track_ms or 0.0
+            if self.target_latency_ms > track_ms:
+                budget = (self.detect_ms - track_ms) / (self.target_latency_ms - track_ms)
+            else:
+                budget = self.max_interval
+        if self.max_detections_per_s:
+            budget = max(budget, self.fps / self.max_detections_per_s)
+
+        self._budget_interval = int(min(max(math.ceil(budget), self.min_interval), self.max_interval))
+        self.interval = int(min(max(math.floor(interval), self._budget_interval), self.max_interval))
+        if REGISTRY.enabled:
+            DETECTION_INTERVAL.set(self.interval)
+
+    def stats(self):
+        """Returns frame counts, the detection fraction and the current interval."""
+        return {
+            "frames": self.frames,
+            "detections_run": self.detections_run,
+            "detection_fraction": self.detections_run / self.frames if self.frames else 0.0,
+            "interval": self.interval,
+            "detect_ms": self.detect_ms,
+            "track_ms": self.track_ms,
+        }
+
+
+def _ema(current, value, alpha=0.2):
+    return value if current is None else (1 - alpha) * current + alpha * value
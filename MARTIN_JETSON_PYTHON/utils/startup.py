@@ -0,0 +1,150 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+from utils.metrics import REGISTRY
+
+TIME_TO_FIRST_DETECTION = REGISTRY.gauge("sybil_time_to_first_detection_seconds",
+                                         "Seconds from process start to the first detection")
+
+
+def process_age_s():
+    """
+    Seconds since this process was started, read from /proc (Linux only,
+    10 ms resolution). Returns None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may hold spaces; fields are counted after its ')'
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    start_ticks = int(fields[19])  # field 22 of /proc/<pid>/stat: starttime
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class StartupTimer:
+    """
+    Startup-time breakdown of a node.
+    Times named phases (imports, camera, model load, warm-up...) and marks
+    such as the first detection, relative to one reference time. Phases may
+    run on several threads at once, so overlapping work shows up as such.
+    """
+
+    def __init__(self, started_at: float = None):
+        """
+        Parameters
+        ----------
+        started_at : float, optional
+            `time.perf_counter()` value all times are relative to, ideally
+            taken before the node's imports (default is now).
+
+        Why it's useful:
+        ----------------
+        - Shows where a cold start goes, instead of one total.
+        - `interpreter_s` adds the time spent before `started_at` (Python
+          itself starting), read from /proc.
+        - Reports append to a JSON-lines file, so starts can be compared
+          across configurations and releases.
+        """
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        age = process_age_s()
+        self.interpreter_s = None if age is None else max(0.0, age - (time.perf_counter() - self.started_at))
+        self.phases = {}
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """Seconds since `started_at`."""
+        return time.perf_counter() - self.started_at
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Times the enclosed block as phase `name` (start and duration, in seconds)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter()
+            with self._lock:
+                self.phases[name] = {"start_s": t0 - self.started_at, "duration_s": t1 - t0}
+
+    def mark(self, name: str):
+        """Records that `name` happened now; returns the seconds since `started_at`."""
+        elapsed = self.elapsed()
+        with self._lock:
+            self.marks[name] = elapsed
+        return elapsed
+
+    def watch_first_detection(self, model, callback=None):
+        """
+        Marks "first_detection" when `model.detect()` first returns.
+        The model's `detect` is wrapped on the instance and restored after
+        the first call, so later frames pay nothing.
+
+        Parameters
+        ----------
+        model : SybilModel or MotionGatedModel
+            Any object whose `detect()` the detection loop calls.
+        callback : callable, optional
+            Called with this timer right after the mark, on the thread that ran
+            the detection.
+        """
+        detect = model.detect
+
+        def first_detect(*args, **kwargs):
+            detections = detect(*args, **kwargs)
+            del model.detect
+            elapsed = self.mark("first_detection")
+            if REGISTRY.enabled:
+                TIME_TO_FIRST_DETECTION.set(elapsed + (self.interpreter_s or 0.0))
+            if callback is not None:
+                callback(self)
+            return detections
+
+        model.detect = first_detect
+
+    def report(self, **extra):
+        """
+        Returns the breakdown as a dict: phases, marks, interpreter start
+        and `total_s` (process start to first detection, when known), plus
+        any `extra` fields such as the configuration.
+        """
+        with self._lock:
+            phases = {name: dict(times) for name, times in self.phases.items()}
+            marks = dict(self.marks)
+        first = marks.get("first_detection")
+        total = None if first is None else first + (self.interpreter_s or 0.0)
+        return {
+            "time": time.time(),
+            "interpreter_s": self.interpreter_s,
+            "phases": phases,
+            "marks": marks,
+            "total_s": total,
+            **extra,
+        }
+
+    def print_report(self, **extra):
+        """Prints the breakdown, phases in the order they started."""
+        report = self.report(**extra)
+        print("\n⏱️ Startup breakdown:")
+        if report["interpreter_s"] is not None:
+            print(f"  {'interpreter':<22}{report['interpreter_s'] * 1000:>9.0f} ms")
+        for name, times in sorted(report["phases"].items(), key=lambda item: item[1]["start_s"]):
+            print(f"  {name:<22}{times['duration_s'] * 1000:>9.0f} ms  (from {times['start_s'] * 1000:.0f} ms)")
+        for name, elapsed in report["marks"].items():
+            print(f"  {name + ' at':<22}{elapsed * 1000:>9.0f} ms")
+        if report["total_s"] is not None:
+            print(f"  Time to first detection: {report['total_s']:.2f} s")
+        return report
+
+    def save(self, path: str, **extra):
+        """Appends the report to a JSON-lines file; returns the report."""
+        report = self.report(**extra)
+        with open(path, "a") as f:
+            f.write(json.dumps(report) + "\n")
+        return report
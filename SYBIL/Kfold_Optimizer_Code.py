@@ -1,92 +1,208 @@
-import optuna
+import argparse
 from ultralytics import YOLO
 import os
 import psutil
 import csv
+import json
+import random
 from pathlib import Path
 
+from pre_training.image_cache import CachedDetectionTrainer
+from fold_scheduler import fold_job, run_folds
+from optuna_search import add_pruning_callback, make_pruner, open_study, optimize, print_search_report, raise_if_pruned
+from optuna_search import print_pareto_front
+from post_training.converting_pt_to_onnx import cpu_latency, evaluate, export_variant, read_split
+
 
 
 # Settings
 YOLO_optimized_batch_size = 0.75  # Adjust based on GPU memory
 modelsize = "yolov8n"   # change this when testing different model sizes
+train_imgsz = 640  # Training image size; see --pareto to search it with the model size
 ROOT = Path.cwd() # Assumes they opened the SYBIL folder
 base_path = ROOT / "yamls"
 folds = [1, 2, 3, 4, 5]
 csv_file = "K-Fold_Results.csv"
+# Read pre-decoded images instead of decoding JPEGs in every run.
+# Build the cache first: python -m pre_training.image_cache build --imgsz 640
+use_image_cache = True
+trainer = CachedDetectionTrainer if use_image_cache else None
+# Fold training runs as separate, resumable jobs (see fold_scheduler.py).
+# One slot per entry: GPU ids or "cpu"; repeat an id to share a GPU,
+# e.g. ["0", "0"] (then use an integer batch size).
+devices = ["0"]
+max_concurrent_folds = 1
+fold_csv_file = f"K-Fold_{modelsize}_Folds.csv"  # One row per fold, written as each finishes
+best_params_file = f"{modelsize}_best_params.json"  # Reused on a rerun, so Optuna is not repeated
+# Bayesian optimization: trials are stored in optuna_studies.db, so an interrupted search resumes,
+# and extra workers can join it with: python Kfold_Optimizer_Code.py --search-only --device 1
+search_trials = 15
+search_epochs = 15
+pruner_type = "median"  # "median", "hyperband" or "none"; stops trials whose mAP50 lags behind early
+study_name = f"{modelsize}_fold1"
+# Model search (--pareto): trades mAP50 against ONNX Runtime CPU latency per frame.
+# Latency is measured on this computer's CPU; set pareto_latency_threads to the robot's core count.
+pareto_trials = 30
+pareto_model_sizes = ["yolov8n", "yolov8s", "yolov8m"]
+pareto_imgsz = [320, 416, 480, 640]
+pareto_precisions = ["fp32", "fp16", "int8"]
+pareto_latency_threads = 4
+pareto_calibration_images = 100  # INT8 calibration images from the fold's train split
+pareto_calibration_seed = 0  # Same sampling as post_training/converting_pt_to_onnx.py --seed
+target_fps = 15  # The most accurate model reaching this rate is picked from the Pareto front
+pareto_study_name = "model_search_fold1"
+pareto_csv_file = "Pareto_Front.csv"
 
 def get_yaml_path(fold_id):
     return os.path.join(base_path, f"fold{fold_id}.yaml")
 
 # Optuna objective (only run on fold1)
-def objective(trial, yaml_file, fold_id):
+def objective(trial, yaml_file, fold_id, device=0):
     lr = trial.suggest_loguniform("lr0", 1e-5, 1e-2)
     wd = trial.suggest_loguniform("weight_decay", 1e-6, 1e-3)
 
     model = YOLO(modelsize + ".pt")
+    add_pruning_callback(model, trial, search_epochs)
     results = model.train(
         data=yaml_file,
-        imgsz=640,
-        epochs=15,
+        imgsz=train_imgsz,
+        epochs=search_epochs,
         batch=YOLO_optimized_batch_size,
         lr0=lr,
         weight_decay=wd,
         optimizer="AdamW",
-        device=0,
+        device=device,
         project="runs/BOKfolds",  # Bayesian Optimization K-Folds
         name=f"fold{fold_id}_trial{trial.number}",
         patience=10,
         conf=0.001,
         fraction=0.30,
-        verbose=True
+        verbose=True,
+        trainer=trainer
     )
 
+    raise_if_pruned(trial)
     precision, recall, map50, map5095 = results.mean_results()
     return map50
 
-def main():
-    # Step 1: Bayesian optimization on Fold 1
+# Multi-objective objective (only run on fold1): maximize mAP50, minimize CPU latency
+def pareto_objective(trial, yaml_file, fold_id, device=0):
+    size = trial.suggest_categorical("modelsize", pareto_model_sizes)
+    imgsz = trial.suggest_categorical("imgsz", pareto_imgsz)
+    precision = trial.suggest_categorical("precision", pareto_precisions)
+    lr = trial.suggest_float("lr0", 1e-5, 1e-2, log=True)
+    wd = trial.suggest_float("weight_decay", 1e-6, 1e-3, log=True)
+
+    model = YOLO(size + ".pt")
+    model.train(
+        data=yaml_file,
+        imgsz=imgsz,
+        epochs=search_epochs,
+        batch=YOLO_optimized_batch_size,
+        lr0=lr,
+        weight_decay=wd,
+        optimizer="AdamW",
+        device=device,
+        project="runs/ParetoFolds",
+        name=f"fold{fold_id}_trial{trial.number}",
+        patience=10,
+        conf=0.001,
+        fraction=0.30,
+        verbose=True,
+        trainer=trainer
+    )
+
+    # Export at the trained size and score the exported model, so precision losses count
+    calibration = read_split(ROOT / "splits" / f"train_fold-{fold_id}.txt", ROOT / "images")
+    random.Random(pareto_calibration_seed).shuffle(calibration)
+    onnx_path = export_variant(model.trainer.best, precision, (imgsz, imgsz),
+                               calibration[:pareto_calibration_images])
+    map50, _ = evaluate(onnx_path, yaml_file, imgsz, split="val")
+    p50, p95 = cpu_latency(onnx_path, (imgsz, imgsz), threads=pareto_latency_threads)
+    trial.set_user_attr("onnx", str(onnx_path))
+    trial.set_user_attr("cpu_p95_ms", p95)
+    trial.set_user_attr("size_MB", os.path.getsize(onnx_path) / (1024 * 1024))
+    print(f"📏 Trial {trial.number}: {size} {imgsz} {precision}: mAP50={map50:.4f}, {p50:.1f} ms ({1000 / p50:.1f} FPS)")
+    return map50, p50
+
+def run_pareto_search(device=0):
+    yaml_file_fold1 = get_yaml_path(1)
+    print("\n🔁 Searching model size, imgsz and precision on Fold 1 (mAP50 vs CPU latency)...")
+    study = open_study(pareto_study_name, directions=["maximize", "minimize"])
+    optimize(study, lambda trial: pareto_objective(trial, yaml_file_fold1, 1, device), pareto_trials)
+    return study
+
+def run_search(device=0):
     yaml_file_fold1 = get_yaml_path(1)
     print("\n🔁 Running Bayesian Optimization on Fold 1...")
-    study = optuna.create_study(direction="maximize")
-    study.optimize(lambda trial: objective(trial, yaml_file_fold1, 1), n_trials=15)
-    best_params = study.best_trial.params
-    print(f"✅ Best params from Fold 1: {best_params}")
+    study = open_study(study_name, pruner=make_pruner(pruner_type, search_epochs))
+    optimize(study, lambda trial: objective(trial, yaml_file_fold1, 1, device), search_trials)
+    print_search_report(study)
+    return study
 
-    # Step 2: Train all folds with best params
-    outer_scores = []
-    per_image_times = []
+def main():
+    parser = argparse.ArgumentParser(description="Bayesian optimization on fold 1, then K-fold training")
+    parser.add_argument("--search-only", action="store_true",
+                        help="only add trials to the stored study (to run extra search workers)")
+    parser.add_argument("--device", default="0", help="device of this worker's search trials")
+    parser.add_argument("--pareto", action="store_true",
+                        help="search model size, imgsz and export precision for mAP50 vs CPU latency instead")
+    args = parser.parse_args()
+
+    if args.pareto:
+        study = run_pareto_search(args.device)
+        if not args.search_only:
+            print_pareto_front(study, target_fps, pareto_csv_file)
+        return
+
+    if args.search_only:
+        run_search(args.device)
+        return
 
-    for fold_id in folds:
-        yaml_file = get_yaml_path(fold_id)
-        print(f"\n🚀 Training Fold {fold_id} with best params...")
+    # Step 1: Bayesian optimization on Fold 1
+    if os.path.exists(best_params_file):
+        with open(best_params_file) as f:
+            best_params = json.load(f)
+        print(f"\n⏭️ Using saved best params from {best_params_file}: {best_params}")
+    else:
+        study = run_search(args.device)
+        best_params = study.best_trial.params
+        with open(best_params_file, "w") as f:
+            json.dump(best_params, f, indent=2)
+        print(f"✅ Best params from Fold 1: {best_params}")
 
-        model = YOLO(modelsize + ".pt")
-        results = model.train(
-            data=yaml_file,
-            imgsz=640,
+    # Step 2: Train all folds with best params
+    # Finished folds are skipped and interrupted ones resume from last.pt on a rerun
+    jobs = [
+        fold_job(
+            fold_id,
+            modelsize + ".pt",
+            get_yaml_path(fold_id),
+            "runs/Kfolds",
+            f"{modelsize}_fold{fold_id}_best",
+            trainer=trainer,
+            imgsz=train_imgsz,
             epochs=100,
             batch=YOLO_optimized_batch_size,
             lr0=best_params["lr0"],
             weight_decay=best_params["weight_decay"],
             optimizer="AdamW",
-            device=0,
-            project="runs/Kfolds",
-            name=f"{modelsize}_fold{fold_id}_best",
             patience=10,
             conf=0.001,
             fraction=1.0,
             verbose=True
         )
-
-        precision, recall, map50, map5095 = results.mean_results()
-        print(f"📊 Fold {fold_id} Results: mAP50={map50:.4f}, Precision={precision:.4f}, Recall={recall:.4f}")
-        outer_scores.append(map50)
-
-        # Extract per-image timings (YOLO reports these in results.speed)
-        speed = results.speed
-        per_image_time = speed['preprocess'] + speed['inference'] + speed['postprocess']
-        per_image_times.append(per_image_time)
+        for fold_id in folds
+    ]
+    print(f"\n🚀 Training {len(jobs)} folds with best params ({max_concurrent_folds} at a time on {devices})...")
+    fold_results = run_folds(jobs, devices, max_concurrent_folds, csv_path=fold_csv_file)
+    if len(fold_results) < len(jobs):
+        print(f"❌ {len(jobs) - len(fold_results)} fold(s) failed; rerun to resume them.")
+        return
+
+    outer_scores = [result["map50"] for result in fold_results]
+    # Per-image timings (YOLO reports these in results.speed)
+    per_image_times = [result["per_image_ms"] for result in fold_results]
 
     # Step 3: Aggregate results
     mean_score = sum(outer_scores) / len(outer_scores)
@@ -96,7 +212,7 @@ def main():
     # Model size in MB
     model_size_mb = os.path.getsize(modelsize + ".pt") / (1024 * 1024)
 
-    # Memory usage (approximate peak during run)
+    # Memory usage of this process (folds train in their own processes)
     memory_used_mb = psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
 
     print("\n==============================")
@@ -0,0 +1,279 @@
+"""
+Runs K-fold trainings as independent, resumable jobs.
+
+Each fold trains in its own process on a free device slot (a GPU id or a
+CPU worker slot), at most --max-jobs at a time. As soon as a fold finishes,
+its metrics, timings and checkpoint path are written to
+<project>/<name>/fold_result.json and appended to the fold CSV, so a crash
+in one fold loses nothing else. A rerun skips folds that have a result
+with the same training settings and resumes interrupted folds from their
+weights/last.pt.
+
+Kfold_Optimizer_Code.py uses it for step 2. Standalone, e.g. a quick CPU
+check with a tiny model:
+    python fold_scheduler.py --devices cpu cpu --max-jobs 2 --model yolov8n.pt \
+        --epochs 1 --imgsz 160 --batch 8 --fraction 0.05 --project runs/Kfolds_test
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+
+ROOT = Path.cwd()  # Assumes they opened the SYBIL folder
+
+RESULT_FILE = "fold_result.json"
+JOB_FILE = "fold_job.json"
+LOG_FILE = "fold.log"
+CSV_FIELDS = ["fold", "name", "device", "map50", "map50_95", "precision", "recall", "per_image_ms",
+              "seconds", "resumed", "checkpoint", "finished"]
+
+
+def fold_job(fold_id, model, data, project, name, trainer=None, **train_args):
+    """
+    Describes one fold training. `train_args` are passed to `YOLO.train`
+    (epochs, batch, lr0, ...); `trainer` is an optional trainer class.
+    """
+    return {
+        "fold": fold_id,
+        "model": str(model),
+        "data": str(data),
+        "project": str(project),
+        "name": name,
+        "trainer": trainer,
+        "train_args": train_args,
+    }
+
+
+def run_dir(job):
+    return Path(job["project"]) / job["name"]
+
+
+def job_spec(job):
+    """The settings a fold result depends on; a result with other settings is not reused."""
+    # Round-tripped through JSON so it compares equal to the copy saved on disk
+    return json.loads(json.dumps({"model": job["model"], "data": job["data"], "train_args": job["train_args"]}))
+
+
+def write_json_atomic(path, data):
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2))
+    os.replace(tmp_path, path)
+
+
+def completed_result(job):
+    """The saved result of a fold trained with the same settings, or None."""
+    path = run_dir(job) / RESULT_FILE
+    if not path.exists():
+        return None
+    result = json.loads(path.read_text())
+    return result if result.get("spec") == job_spec(job) else None
+
+
+def train_fold(job, device):
+    """
+    Trains (or resumes) one fold and returns its result dict.
+    Runs inside the job's own process.
+    """
+    from ultralytics import YOLO
+
+    directory = run_dir(job)
+    last = directory / "weights" / "last.pt"
+    best = directory / "weights" / "best.pt"
+    job_path = directory / JOB_FILE
+    spec = job_spec(job)
+
+    started = time.time()
+    t0 = time.perf_counter()
+    results = None
+    resumed = last.exists() and job_path.exists() and json.loads(job_path.read_text()) == spec
+    if resumed:
+        print(f"🔁 Resuming fold {job['fold']} from {last}")
+        try:
+            results = YOLO(str(last)).train(resume=True, device=device, trainer=job["trainer"])
+        except AssertionError as error:
+            # Training already reached its last epoch; only the result was missing
+            print(f"⚠️ {error}")
+    else:
+        write_json_atomic(job_path, spec)
+        results = YOLO(job["model"]).train(data=job["data"], device=device, project=job["project"],
+                                           name=job["name"], exist_ok=True, trainer=job["trainer"],
+                                           **job["train_args"])
+
+    if results is None:
+        results = YOLO(str(best)).val(data=job["data"], device=device, project=job["project"],
+                                      name=f"{job['name']}_val", exist_ok=True,
+                                      imgsz=job["train_args"].get("imgsz", 640))
+
+    precision, recall, map50, map5095 = results.mean_results()
+    speed = results.speed
+    return {
+        "fold": job["fold"],
+        "name": job["name"],
+        "device": device,
+        "map50": map50,
+        "map50_95": map5095,
+        "precision": precision,
+        "recall": recall,
+        "speed": speed,
+        "per_image_ms": speed["preprocess"] + speed["inference"] + speed["postprocess"],
+        "seconds": time.perf_counter() - t0,
+        "resumed": resumed,
+        "checkpoint": str(best),
+        "started": started,
+        "finished": time.time(),
+        "spec": spec,
+    }
+
+
+def _run_job(job, device, threads):
+    """Process entry point: logs to the run folder and writes the result file on success."""
+    directory = run_dir(job)
+    directory.mkdir(parents=True, exist_ok=True)
+    log = open(directory / LOG_FILE, "a")
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+
+    if device == "cpu" and threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    result = train_fold(job, device)
+    write_json_atomic(directory / RESULT_FILE, result)
+
+
+def append_csv(csv_path, result):
+    new_file = not Path(csv_path).exists()
+    with open(csv_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerow(result)
+
+
+def run_folds(jobs, devices=("0",), max_concurrent=1, csv_path=None, retries=1):
+    """
+    Runs fold jobs concurrently, one process per fold.
+
+    Parameters
+    ----------
+    jobs : list of dict
+        Fold jobs from `fold_job()`.
+    devices : sequence of str
+        One slot per entry: GPU ids ("0", "1"), or "cpu". Repeat an entry to
+        run several folds on it at once, e.g. ("cpu", "cpu").
+    max_concurrent : int
+        Most folds training at the same time (default is 1).
+    csv_path : str, optional
+        Each finished fold is appended here immediately.
+    retries : int
+        Times a failed fold is restarted (resuming from its last epoch) before
+        it is reported as failed (default is 1).
+
+    Returns
+    -------
+    results : list of dict
+        Results of the completed folds, in job order. Failed folds are missing.
+    """
+    max_concurrent = max(1, min(max_concurrent, len(devices)))
+    cpu_slots = sum(device == "cpu" for device in devices[:max_concurrent])
+    threads = max(1, (os.cpu_count() or 1) // cpu_slots) if cpu_slots else 0
+
+    batch = next((job["train_args"].get("batch") for job in jobs), None)
+    shared = [d for d in set(devices[:max_concurrent]) if d != "cpu" and devices[:max_concurrent].count(d) > 1]
+    if shared and isinstance(batch, float) and batch < 1:
+        print(f"⚠️ batch={batch} sizes each fold to a share of the whole GPU, but device(s) {shared} run "
+              f"several folds at once; use an integer batch to avoid running out of memory.")
+
+    results = {}
+    pending = []
+    for job in jobs:
+        result = completed_result(job)
+        if result is not None:
+            print(f"⏭️ Fold {job['fold']} already done: mAP50={result['map50']:.4f} ({run_dir(job)})")
+            results[job["fold"]] = result
+        else:
+            pending.append(job)
+
+    # Spawned processes start clean on every platform (CUDA cannot be forked)
+    context = multiprocessing.get_context("spawn")
+    free = list(devices[:max_concurrent])
+    running = {}
+    attempts = {job["fold"]: 0 for job in pending}
+    failed = []
+    try:
+        while pending or running:
+            while pending and free:
+                job = pending.pop(0)
+                device = free.pop(0)
+                attempts[job["fold"]] += 1
+                process = context.Process(target=_run_job, args=(job, device, threads),
+                                          name=f"fold{job['fold']}")
+                process.start()
+                running[process.sentinel] = (process, job, device)
+                print(f"🚀 Fold {job['fold']} started on {device} (log: {run_dir(job) / LOG_FILE})")
+
+            for sentinel in wait(list(running)):
+                process, job, device = running.pop(sentinel)
+                process.join()
+                free.append(device)
+                result = completed_result(job)
+                if result is not None:
+                    results[job["fold"]] = result
+                    if csv_path:
+                        append_csv(csv_path, result)
+                    print(f"📊 Fold {job['fold']} done in {result['seconds'] / 60:.1f} min: "
+                          f"mAP50={result['map50']:.4f}, Precision={result['precision']:.4f}, "
+                          f"Recall={result['recall']:.4f}")
+                elif attempts[job["fold"]] <= retries:
+                    print(f"⚠️ Fold {job['fold']} exited with code {process.exitcode}; retrying")
+                    pending.append(job)
+                else:
+                    print(f"❌ Fold {job['fold']} failed (exit code {process.exitcode}); "
+                          f"see {run_dir(job) / LOG_FILE}. Rerun to resume it.")
+                    failed.append(job["fold"])
+    except KeyboardInterrupt:
+        # Children keep their last.pt, so a rerun resumes them
+        for process, _, _ in running.values():
+            process.terminate()
+        raise
+
+    return [results[job["fold"]] for job in jobs if job["fold"] in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train K-fold splits as concurrent, resumable jobs")
+    parser.add_argument("--folds", type=int, nargs="+", default=[1, 2, 3, 4, 5])
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--devices", nargs="+", default=["0"],
+                        help='slots to run folds on: GPU ids or "cpu"; repeat one to share it, e.g. cpu cpu')
+    parser.add_argument("--max-jobs", type=int, default=1, help="most folds training at once")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=float, default=16, help="batch size, or a fraction of GPU memory below 1")
+    parser.add_argument("--fraction", type=float, default=1.0, help="fraction of the training images used")
+    parser.add_argument("--lr0", type=float, default=0.001)
+    parser.add_argument("--weight-decay", type=float, default=0.0005)
+    parser.add_argument("--project", default="runs/Kfolds")
+    parser.add_argument("--csv", default="K-Fold_Fold_Results.csv")
+    args = parser.parse_args()
+
+    batch = int(args.batch) if args.batch >= 1 else args.batch
+    modelsize = Path(args.model).stem
+    jobs = [fold_job(fold_id, args.model, ROOT / "yamls" / f"fold{fold_id}.yaml", args.project,
+                     f"{modelsize}_fold{fold_id}_best", epochs=args.epochs, imgsz=args.imgsz, batch=batch,
+                     lr0=args.lr0, weight_decay=args.weight_decay, optimizer="AdamW", patience=10,
+                     conf=0.001, fraction=args.fraction, verbose=True)
+            for fold_id in args.folds]
+
+    t0 = time.perf_counter()
+    results = run_folds(jobs, args.devices, args.max_jobs, csv_path=args.csv)
+    print(f"\n✅ {len(results)}/{len(jobs)} folds complete in {(time.perf_counter() - t0) / 60:.1f} min")
+
+
+if __name__ == "__main__":
+    main()
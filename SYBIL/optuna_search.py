@@ -0,0 +1,224 @@
+"""
+Optuna helpers for the SYBIL hyperparameter search.
+
+- Studies live in a local SQLite file (optuna_studies.db), so an
+  interrupted search resumes where it stopped and several workers (one per
+  terminal or GPU) can add trials to the same study at once.
+- `add_pruning_callback` reports the validation mAP50 of every epoch to
+  the trial, so a median or hyperband pruner stops hopeless trials early.
+- `print_search_report` estimates the training time pruning saved,
+  compared with training every trial for all of its epochs.
+- `print_pareto_front` lists the trials of a (mAP50, latency) study that no
+  other trial beats on both, and picks the most accurate one meeting a
+  target FPS.
+
+Kfold_Optimizer_Code.py uses it for step 1 and for its --pareto mode. To see
+a study's trials, or the Pareto front of a model search:
+    python optuna_search.py --study yolov8n_fold1
+    python optuna_search.py --study model_search_fold1 --target-fps 15
+"""
+
+import argparse
+import csv
+import time
+
+import optuna
+
+STORAGE_URL = "sqlite:///optuna_studies.db"
+MAP50_KEY = "metrics/mAP50(B)"
+
+
+def make_pruner(kind, max_epochs, warmup_epochs=3):
+    """
+    Parameters
+    ----------
+    kind : str
+        "median" stops a trial whose mAP50 falls below the median of earlier
+        trials at the same epoch; "hyperband" runs successive halving over
+        several brackets; "none" never prunes.
+    max_epochs : int
+        Epochs a trial trains when it is not pruned.
+    warmup_epochs : int
+        Epochs every trial trains before it can be pruned (default is 3).
+    """
+    if kind == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=warmup_epochs)
+    if kind == "hyperband":
+        return optuna.pruners.HyperbandPruner(min_resource=warmup_epochs, max_resource=max_epochs,
+                                              reduction_factor=3)
+    if kind == "none":
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Unknown pruner {kind!r}; use median, hyperband or none")
+
+
+def open_study(study_name, storage_url=STORAGE_URL, pruner=None, direction="maximize", directions=None):
+    """Creates the study in the SQLite storage, or loads it when it already exists."""
+    # Waits for the database lock instead of failing when several workers write at once
+    storage = optuna.storages.RDBStorage(storage_url, engine_kwargs={"connect_args": {"timeout": 60}})
+    return optuna.create_study(study_name=study_name, storage=storage, load_if_exists=True, pruner=pruner,
+                               direction=None if directions else direction, directions=directions)
+
+
+def optimize(study, objective, n_trials):
+    """
+    Runs trials until the study holds `n_trials` finished ones, counted across
+    reruns and workers; trials of an interrupted run are not redone.
+    """
+    states = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+    done = len(study.get_trials(deepcopy=False, states=states))
+    if done >= n_trials:
+        print(f"⏭️ Study {study.study_name} already has {done}/{n_trials} trials")
+        return
+    print(f"🔁 Study {study.study_name}: {done}/{n_trials} trials done, running the rest")
+    study.optimize(objective, callbacks=[optuna.study.MaxTrialsCallback(n_trials, states=states)])
+
+
+def add_pruning_callback(model, trial, max_epochs, metric=MAP50_KEY):
+    """
+    Reports `metric` to `trial` after every validated epoch, and stops the
+    training once the pruner gives up on the trial.
+
+    The training is stopped through the trainer's own stop flag, so it
+    finishes cleanly (weights saved, data loaders closed); call
+    `raise_if_pruned(trial)` after `model.train()` to end the trial.
+    Epochs trained and training seconds are stored as trial user attributes
+    for `print_search_report`.
+    """
+    trial.set_user_attr("max_epochs", max_epochs)
+    started = time.perf_counter()
+
+    def on_fit_epoch_end(trainer):
+        epoch = trainer.epoch + 1
+        trial.set_user_attr("epochs", epoch)
+        trial.set_user_attr("train_seconds", time.perf_counter() - started)
+        value = trainer.metrics.get(metric)
+        if value is None:
+            return
+        trial.report(float(value), epoch)
+        if trial.should_prune():
+            print(f"✂️ Pruning trial {trial.number} at epoch {epoch} ({metric}={value:.4f})")
+            trial.set_user_attr("pruned_at", epoch)
+            trainer.stop = True
+
+    model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+
+
+def raise_if_pruned(trial):
+    if "pruned_at" in trial.user_attrs:
+        raise optuna.TrialPruned()
+
+
+def search_time(study):
+    """
+    Returns (spent, full) training seconds over the finished trials: the time
+    actually spent, and an estimate of the time had every trial trained all
+    of its epochs (pruned trials extrapolated at their own seconds per epoch).
+    """
+    states = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+    spent = full = 0.0
+    for trial in study.get_trials(deepcopy=False, states=states):
+        seconds = trial.user_attrs.get("train_seconds")
+        epochs = trial.user_attrs.get("epochs")
+        if not seconds or not epochs:
+            continue
+        spent += seconds
+        full += seconds / epochs * max(epochs, trial.user_attrs.get("max_epochs", epochs))
+    return spent, full
+
+
+def print_search_report(study):
+    states = [trial.state for trial in study.get_trials(deepcopy=False)]
+    complete = states.count(optuna.trial.TrialState.COMPLETE)
+    pruned = states.count(optuna.trial.TrialState.PRUNED)
+    spent, full = search_time(study)
+    print(f"\n⏱️ Study {study.study_name}: {complete} complete, {pruned} pruned trials")
+    if full:
+        print(f"  Training time: {spent / 3600:.2f} h, vs ~{full / 3600:.2f} h without pruning "
+              f"(saved ~{(full - spent) / 3600:.2f} h, {1 - spent / full:.0%})")
+
+
+def pareto_front(study):
+    """
+    Finished trials of a (maximize mAP50, minimize latency ms) study that no
+    other trial beats on both, fastest first.
+    """
+    return sorted(study.best_trials, key=lambda trial: trial.values[1])
+
+
+def pick_for_fps(trials, target_fps):
+    """The most accurate trial whose latency allows `target_fps`, or None."""
+    fast_enough = [trial for trial in trials if 1000 / trial.values[1] >= target_fps]
+    return max(fast_enough, key=lambda trial: trial.values[0]) if fast_enough else None
+
+
+def print_pareto_front(study, target_fps=None, csv_path=None):
+    """
+    Prints the Pareto front (and writes it to `csv_path`), marking the pick
+    for `target_fps`. Returns the picked trial, or None.
+    """
+    front = pareto_front(study)
+    if not front:
+        print(f"❌ Study {study.study_name} has no finished trials")
+        return None
+    pick = pick_for_fps(front, target_fps) if target_fps else None
+
+    rows = []
+    for trial in front:
+        rows.append({
+            "trial": trial.number,
+            **trial.params,
+            "mAP50": trial.values[0],
+            "cpu_p50_ms": trial.values[1],
+            "fps": 1000 / trial.values[1],
+            "cpu_p95_ms": trial.user_attrs.get("cpu_p95_ms"),
+            "size_MB": trial.user_attrs.get("size_MB"),
+            "onnx": trial.user_attrs.get("onnx"),
+        })
+
+    print(f"\n📈 Pareto front of {study.study_name} ({len(front)} of {len(study.trials)} trials), fastest first:")
+    print(f"  {'trial':<7}{'model':<9}{'imgsz':>6}{'precision':>10}{'mAP50':>8}{'p50 ms':>8}{'FPS':>7}{'MB':>7}")
+    for trial, row in zip(front, rows):
+        marker = "  ⬅️" if trial is pick else ""
+        size = "-" if row["size_MB"] is None else f"{row['size_MB']:.1f}"
+        print(f"  #{trial.number:<6}{trial.params.get('modelsize', '-'):<9}{trial.params.get('imgsz', '-'):>6}"
+              f"{trial.params.get('precision', '-'):>10}{row['mAP50']:>8.4f}{row['cpu_p50_ms']:>8.1f}"
+              f"{row['fps']:>7.1f}{size:>7}{marker}")
+
+    if target_fps:
+        if pick is None:
+            print(f"\n❌ No model reaches {target_fps:g} FPS; the fastest runs at {rows[0]['fps']:.1f} FPS")
+        else:
+            print(f"\n✅ Most accurate model at {target_fps:g} FPS or more: trial {pick.number} "
+                  f"(mAP50={pick.values[0]:.4f}, {1000 / pick.values[1]:.1f} FPS) {pick.user_attrs.get('onnx', '')}")
+
+    if csv_path:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Pareto front saved to {csv_path}")
+    return pick
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the trials of a stored Optuna study")
+    parser.add_argument("--study", required=True, help="study name, e.g. yolov8n_fold1")
+    parser.add_argument("--storage", default=STORAGE_URL)
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="model search studies: pick the most accurate model reaching this CPU FPS")
+    parser.add_argument("--csv", default=None, help="model search studies: write the Pareto front here")
+    args = parser.parse_args()
+
+    study = optuna.load_study(study_name=args.study, storage=args.storage)
+    if len(study.directions) > 1:
+        print_pareto_front(study, args.target_fps, args.csv)
+        return
+    for trial in study.get_trials(deepcopy=False):
+        values = "-" if trial.values is None else ", ".join(f"{v:.4f}" for v in trial.values)
+        epochs = f"{trial.user_attrs.get('epochs', '-')}/{trial.user_attrs.get('max_epochs', '-')}"
+        print(f"  #{trial.number:<4}{trial.state.name:<10}{values:>18}  epochs {epochs:<8}{trial.params}")
+    print_search_report(study)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,323 @@
-from ultralytics import YOLO
+"""
+Export pipeline: turns the trained SYBIL model into FP32, FP16 and INT8 ONNX
+models, checks each one against the test split and prints one table
+(mAP50 / mAP50-95 change, CPU latency, model size) so the fastest model
+within the accuracy tolerance can be picked.
 
-# 1. Load your trained model
-# REPLACE THIS PATH with your actual trained model file (e.g., runs/train/yolov8n_custom/weights/best.pt)
-model_path = "C:/Users/brand/Documents/College/2025/MARTIN/SYBIL/runs/final/yolov8m_best_full_retrain/weights/best.pt"
-model = YOLO(model_path)
+Run from the SYBIL folder:
+    python post_training/converting_pt_to_onnx.py --weights runs/final/yolov8m_best_full_retrain/weights/best.pt
 
-# 2. Export the model to ONNX format
-# The 'format' argument specifies the output format (ONNX)
-# The 'opset' should be a modern value like 12 or higher (17 is current standard for PyTorch exports)
-model.export(format='onnx', opset=17) 
+For the robot, export at the RealSense's 640x480 frame shape so no compute is
+spent on letterbox padding (add --dynamic to keep any input size):
+    python post_training/converting_pt_to_onnx.py --imgsz 480 640
+"""
 
-# The output file will be saved in the same directory as your model, e.g., 'yolov8n.onnx'
-print("✅ YOLO Model successfully exported to ONNX format!")
\ No newline at end of file
+import argparse
+import csv
+import os
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path.cwd()  # Assumes they opened the SYBIL folder
+
+# REPLACE THIS PATH with your actual trained model file, or pass --weights
+DEFAULT_WEIGHTS = "C:/Users/brand/Documents/College/2025/MARTIN/SYBIL/runs/final/yolov8m_best_full_retrain/weights/best.pt"
+
+VARIANTS = ["fp32", "fp16", "int8"]
+
+
+def read_split(split_path, images_dir):
+    """Returns the image paths of a split file, resolved on this machine by file name if needed."""
+    paths = []
+    with open(split_path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            path = Path(line.strip())
+            if not path.exists():
+                # Split files written on another computer: look the image up by name
+                path = images_dir / line.strip().replace("\\", "/").rsplit("/", 1)[-1]
+            paths.append(path)
+    return paths
+
+
+def letterbox(image, imgsz):
+    """
+    Resizes and pads a BGR image like ultralytics into an (height, width)
+    input, returning a (1, 3, height, width) float32 RGB tensor.
+    """
+    import cv2
+    height, width = imgsz
+    h, w = image.shape[:2]
+    scale = min(height / h, width / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    top, left = (height - new_h) // 2, (width - new_w) // 2
+
+    canvas = np.full((height, width, 3), 114, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def export_fp32(weights, imgsz, opset, dynamic=False):
+    """
+    Exports the .pt model to FP32 ONNX with ultralytics, with a fixed
+    (height, width) input or, with `dynamic`, any batch and input size.
+    """
+    from ultralytics import YOLO
+    model = YOLO(str(weights))
+    return Path(model.export(format="onnx", opset=opset, imgsz=list(imgsz), dynamic=dynamic, simplify=True))
+
+
+def export_fp16(fp32_path, out_path):
+    """
+    Converts the FP32 ONNX model to FP16 weights and activations.
+    Inputs and outputs stay FP32, so the same pre/post-processing works.
+    """
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(str(fp32_path))
+    model = float16.convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model, str(out_path))
+    return out_path
+
+
+class SplitCalibrationReader:
+    """Feeds letterboxed calibration images to ONNX Runtime's static quantizer, one at a time."""
+
+    def __init__(self, image_paths, input_name, imgsz):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._index = 0
+
+    def get_next(self):
+        import cv2
+        while self._index < len(self.image_paths):
+            image = cv2.imread(str(self.image_paths[self._index]))
+            self._index += 1
+            if image is not None:
+                return {self.input_name: letterbox(image, self.imgsz)}
+        return None
+
+    def rewind(self):
+        self._index = 0
+
+
+def detect_head_nodes(model):
+    """
+    Names of the non-convolution nodes in the YOLOv8 Detect head (the
+    highest-numbered /model.N/ block). They decode boxes (DFL softmax,
+    anchors, strides); quantizing them costs far more accuracy than it saves.
+    """
+    blocks = [node.name.split("/")[1] for node in model.graph.node if node.name.startswith("/model.")]
+    indices = [int(block.split(".")[1]) for block in blocks if block.split(".")[-1].isdigit()]
+    if not indices:
+        return []
+    head = f"/model.{max(indices)}/"
+    return [node.name for node in model.graph.node if node.name.startswith(head) and node.op_type != "Conv"]
+
+
+def export_int8(fp32_path, out_path, calibration_paths, imgsz, per_channel=True):
+    """
+    Statically quantizes the FP32 ONNX model to INT8 (QDQ format), with
+    activation ranges calibrated on `calibration_paths`.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # Shape inference + graph optimization make the quantized graph cleaner
+    prepared_path = out_path.with_name(out_path.stem + "_prep.onnx")
+    quant_pre_process(str(fp32_path), str(prepared_path))
+
+    model = onnx.load(str(prepared_path))
+    input_name = model.graph.input[0].name
+    excluded = detect_head_nodes(model)
+
+    quantize_static(
+        str(prepared_path),
+        str(out_path),
+        SplitCalibrationReader(calibration_paths, input_name, imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=excluded,
+    )
+    os.remove(prepared_path)
+    return out_path
+
+
+def export_variant(weights, variant, imgsz, calibration_paths=None, opset=17):
+    """
+    Exports the .pt model to one ONNX variant ("fp32", "fp16" or "int8") at a
+    fixed (height, width) input; INT8 is calibrated on `calibration_paths`.
+    """
+    fp32_path = export_fp32(weights, imgsz, opset)
+    if variant == "fp16":
+        return export_fp16(fp32_path, fp32_path.with_name(fp32_path.stem + "_fp16.onnx"))
+    if variant == "int8":
+        return export_int8(fp32_path, fp32_path.with_name(fp32_path.stem + "_int8.onnx"), calibration_paths, imgsz)
+    return fp32_path
+
+
+def cpu_latency(onnx_path, imgsz, runs=50, warmup=5, threads=0):
+    """Median and p95 single-image CPU latency (ms) of an ONNX model at a (height, width) input."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    x = np.random.default_rng(0).random((1, 3, *imgsz), dtype=np.float32)
+
+    for _ in range(warmup):
+        session.run(None, {input_name: x})
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        session.run(None, {input_name: x})
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times)), float(np.percentile(times, 95))
+
+
+def evaluate(model_path, data_yaml, imgsz, split="test"):
+    """
+    mAP50 and mAP50-95 of a .pt or .onnx model on a split of the dataset
+    (default is test), evaluated by ultralytics on the CPU. Validation is
+    square: `imgsz` is one side length.
+    """
+    from ultralytics import YOLO
+    metrics = YOLO(str(model_path), task="detect").val(
+        data=str(data_yaml),
+        split=split,
+        imgsz=imgsz,
+        batch=1,
+        conf=0.001,
+        device="cpu",
+        plots=False,
+        verbose=False,
+    )
+    return metrics.box.map50, metrics.box.map
+
+
+def print_table(rows, tolerance):
+    """Prints the comparison table and the recommended variant."""
+    base = rows[0]
+    print(f"\n{'variant':<8}{'size MB':>9}{'mAP50':>9}{'Δ':>8}{'mAP50-95':>10}{'Δ':>8}"
+          f"{'CPU p50 ms':>12}{'p95 ms':>9}{'speed-up':>10}")
+    for row in rows:
+        d50 = row["mAP50"] - base["mAP50"] if row["mAP50"] is not None else None
+        d5095 = row["mAP50-95"] - base["mAP50-95"] if row["mAP50-95"] is not None else None
+        print(f"{row['variant']:<8}{row['size_MB']:>9.1f}"
+              f"{_fmt(row['mAP50'], '.4f', 9)}{_fmt(d50, '+.4f', 8)}"
+              f"{_fmt(row['mAP50-95'], '.4f', 10)}{_fmt(d5095, '+.4f', 8)}"
+              f"{row['cpu_p50_ms']:>12.1f}{row['cpu_p95_ms']:>9.1f}{base['cpu_p50_ms'] / row['cpu_p50_ms']:>9.2f}x")
+
+    if base["mAP50-95"] is None:
+        return None
+    within = [r for r in rows if base["mAP50-95"] - r["mAP50-95"] <= tolerance]
+    best = min(within, key=lambda r: r["cpu_p50_ms"])
+    print(f"\n✅ Fastest variant within {tolerance:.3f} mAP50-95 of FP32: {best['variant']} ({best['path']})")
+    return best
+
+
+def _fmt(value, spec, width):
+    return ("-" if value is None else format(value, spec)).rjust(width)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SYBIL to FP32 / FP16 / INT8 ONNX and compare the variants")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="trained .pt model")
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640], metavar="SIZE",
+                        help="one value for a square input, or HEIGHT WIDTH, e.g. 480 640 for 640x480 frames")
+    parser.add_argument("--dynamic", action="store_true",
+                        help="export with a dynamic batch and input size")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--data", default=str(ROOT / "yamls" / "foldALL.yaml"),
+                        help="dataset yaml whose test split is used for the accuracy check")
+    parser.add_argument("--calibration-split", default=str(ROOT / "splits" / "train_val.txt"))
+    parser.add_argument("--calibration-images", type=int, default=300,
+                        help="representative images sampled from the calibration split for INT8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="largest acceptable mAP50-95 drop against FP32")
+    parser.add_argument("--latency-runs", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    parser.add_argument("--skip-eval", action="store_true", help="only export and time the models")
+    parser.add_argument("--csv", default=None, help="also write the table here (default: next to the models)")
+    args = parser.parse_args()
+
+    weights = Path(args.weights)
+    if not weights.exists():
+        print(f"❌ Weights not found: {weights}")
+        return
+    if len(args.imgsz) > 2:
+        parser.error("--imgsz takes one size or HEIGHT WIDTH")
+    imgsz = (args.imgsz[0], args.imgsz[-1])
+
+    # ultralytics validates exported models at a square size, which a fixed
+    # rectangular input cannot take
+    skip_eval = args.skip_eval
+    if imgsz[0] != imgsz[1] and not args.dynamic and not skip_eval:
+        print("⚠️ Fixed rectangular models cannot be validated by ultralytics; only exporting and timing. "
+              "Compare accuracy on real frames with MARTIN_JETSON_PYTHON/benchmarks/rect_inference.py, "
+              "or add --dynamic.")
+        skip_eval = True
+
+    # 1. FP32 export (always needed: the other variants are converted from it)
+    print("🔁 Exporting FP32 ONNX...")
+    fp32_path = export_fp32(weights, imgsz, args.opset, args.dynamic)
+    paths = {"fp32": fp32_path}
+
+    # 2. FP16
+    if "fp16" in args.variants:
+        print("🔁 Converting to FP16...")
+        paths["fp16"] = export_fp16(fp32_path, fp32_path.with_name(fp32_path.stem + "_fp16.onnx"))
+
+    # 3. INT8, calibrated on a representative sample of the training data
+    if "int8" in args.variants:
+        images = read_split(args.calibration_split, ROOT / "images")
+        random.Random(args.seed).shuffle(images)
+        calibration = images[:args.calibration_images]
+        print(f"🔁 Quantizing to INT8 with {len(calibration)} calibration images from {args.calibration_split}...")
+        paths["int8"] = export_int8(fp32_path, fp32_path.with_name(fp32_path.stem + "_int8.onnx"),
+                                    calibration, imgsz)
+
+    # 4. Compare every variant on the test split
+    rows = []
+    for variant in [v for v in VARIANTS if v in paths]:
+        path = paths[variant]
+        print(f"📏 Checking {variant}: {path}")
+        p50, p95 = cpu_latency(path, imgsz, runs=args.latency_runs, threads=args.threads)
+        map50, map5095 = (None, None) if skip_eval else evaluate(path, args.data, max(imgsz))
+        rows.append({
+            "variant": variant,
+            "path": str(path),
+            "size_MB": os.path.getsize(path) / (1024 ** 2),
+            "mAP50": map50,
+            "mAP50-95": map5095,
+            "cpu_p50_ms": p50,
+            "cpu_p95_ms": p95,
+        })
+
+    print_table(rows, args.tolerance)
+
+    csv_path = Path(args.csv) if args.csv else fp32_path.with_name("export_comparison.csv")
+    with open(csv_path, mode="w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Comparison saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
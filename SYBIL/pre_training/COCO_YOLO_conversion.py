@@ -1,5 +1,9 @@
+import argparse
 import json
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # --- Configuration ---
@@ -21,6 +25,18 @@ def coco_to_yolo(x_min, y_min, w, h, img_w, img_h):
     h_norm = h / img_h
     return x_center, y_center, w_norm, h_norm
 
+# Fields kept from each streamed COCO record, by their ijson prefix
+ITEM_PREFIXES = {"images.item": "images", "annotations.item": "annotations"}
+STREAM_FIELDS = {
+    "images.item.id": "id",
+    "images.item.file_name": "file_name",
+    "images.item.width": "width",
+    "images.item.height": "height",
+    "annotations.item.image_id": "image_id",
+    "annotations.item.category_id": "category_id",
+}
+SCALAR_EVENTS = {"number", "string", "boolean", "null"}
+
 def process_annotations():
     # 1. Generate all .txt labels from the full master file
     master_json = os.path.join(ANNOTATIONS_DIR, "full_plastopol.json")
@@ -80,5 +96,143 @@ def process_annotations():
         
     print(f"✅ Success! Labels in {LABELS_OUTPUT_DIR} and Splits in {SPLITS_OUTPUT_DIR}")
 
+def stream_coco(f):
+    """
+    Yields ("images" or "annotations", record) pairs from a COCO file, one
+    record at a time, keeping only the fields the conversion needs
+    (segmentation polygons are never built). Numbers are parsed as floats,
+    exactly like `json.load`.
+    """
+    import ijson
+
+    record = None
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if prefix == "annotations.item.bbox.item":
+            record["bbox"].append(value)
+        elif event in SCALAR_EVENTS:
+            if prefix in STREAM_FIELDS:
+                record[STREAM_FIELDS[prefix]] = value
+        elif event == "start_map" and prefix in ITEM_PREFIXES:
+            record = {}
+        elif event == "end_map" and prefix in ITEM_PREFIXES:
+            yield ITEM_PREFIXES[prefix], record
+            record = None
+        elif event == "start_array" and prefix == "annotations.item.bbox":
+            record["bbox"] = []
+
+def write_label_shard(shard_path, owned, labels_dir):
+    """
+    Worker: writes the label files of one shard.
+    `owned` lists (image id, label file name, width, height) in image order;
+    the shard file holds the annotations of those images in file order.
+    """
+    wanted = {img_id for img_id, _, _, _ in owned}
+    img_to_ann = {}
+    with open(shard_path, 'r') as f:
+        for line in f:
+            img_id, category_id, bbox = json.loads(line)
+            if img_id in wanted:
+                img_to_ann.setdefault(img_id, []).append((category_id, bbox))
+
+    for img_id, txt_filename, img_w, img_h in owned:
+        lines = []
+        for category_id, bbox in img_to_ann.get(img_id, ()):
+            # Shift class index 1 -> 0
+            yolo_bbox = coco_to_yolo(bbox[0], bbox[1], bbox[2], bbox[3], img_w, img_h)
+            lines.append(f"{category_id - 1} {' '.join([f'{x:.6f}' for x in yolo_bbox])}\n")
+        with open(os.path.join(labels_dir, txt_filename), 'w') as f:
+            f.write("".join(lines))
+    return len(owned)
+
+def write_split(json_path, split_txt_path, images_dir):
+    """Worker: streams the image names of one split JSON into its .txt split file."""
+    import ijson
+
+    count = 0
+    with open(json_path, 'rb') as f, open(split_txt_path, 'w') as out:
+        for file_name in ijson.items(f, "images.item.file_name"):
+            out.write(f"{os.path.join(images_dir, file_name)}\n")
+            count += 1
+    return count
+
+def process_annotations_streaming(workers=None, shards=64):
+    """
+    Same output as `process_annotations()`, byte for byte, with bounded memory:
+    - The master JSON is parsed incrementally. Only a small table of image
+      sizes is kept; annotations are spilled to `shards` temporary files by image id.
+    - A process pool writes the label files one shard at a time. It also
+      writes every split file, starting while the master file is still
+      being parsed.
+    """
+    workers = workers or os.cpu_count()
+    master_json = os.path.join(ANNOTATIONS_DIR, "full_plastopol.json")
+    t0 = time.perf_counter()
+
+    # Split files whose names collide are overwritten in listing order by
+    # process_annotations(); only the last one is written here
+    splits = {}
+    for j_file in os.listdir(ANNOTATIONS_DIR):
+        if j_file.endswith('.json') and j_file != "full_plastopol.json":
+            splits[j_file.replace('plastopol_', '').replace('.json', '.txt')] = j_file
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, tempfile.TemporaryDirectory() as tmp_dir:
+        split_jobs = [
+            pool.submit(write_split, os.path.join(ANNOTATIONS_DIR, j_file),
+                        os.path.join(SPLITS_OUTPUT_DIR, split_name), IMAGES_DIR)
+            for split_name, j_file in splits.items()
+        ]
+
+        # 1. Stream the master file, spilling annotations to shards by image id
+        print(f"Streaming master annotations: {master_json}")
+        shard_paths = [os.path.join(tmp_dir, f"shard_{i}.jsonl") for i in range(shards)]
+        shard_files = [open(path, 'w') for path in shard_paths]
+        images = {}
+        num_annotations = 0
+        try:
+            with open(master_json, 'rb') as f:
+                for section, record in stream_coco(f):
+                    if section == "images":
+                        images[record['id']] = (record['file_name'], record['width'], record['height'])
+                    else:
+                        shard = shard_files[hash(record['image_id']) % shards]
+                        shard.write(json.dumps([record['image_id'], record['category_id'], record['bbox']]) + "\n")
+                        num_annotations += 1
+        finally:
+            for shard in shard_files:
+                shard.close()
+        t_parse = time.perf_counter()
+
+        # Images sharing a file stem share a label file; the last one wins, as in process_annotations()
+        owners = {}
+        for img_id, (img_name, img_w, img_h) in images.items():
+            owners[Path(img_name).stem + ".txt"] = (img_id, img_w, img_h)
+        owned = [[] for _ in range(shards)]
+        for txt_filename, (img_id, img_w, img_h) in owners.items():
+            owned[hash(img_id) % shards].append((img_id, txt_filename, img_w, img_h))
+
+        # 2. Write the label files, one shard per job
+        print(f"Generating .txt label files with {workers} workers...")
+        label_jobs = [pool.submit(write_label_shard, shard_paths[i], owned[i], LABELS_OUTPUT_DIR)
+                      for i in range(shards)]
+        num_labels = sum(job.result() for job in label_jobs)
+        num_split_images = sum(job.result() for job in split_jobs)
+
+    elapsed = time.perf_counter() - t0
+    print(f"✅ Success! {num_labels} label files in {LABELS_OUTPUT_DIR} and {len(splits)} splits "
+          f"({num_split_images} entries) in {SPLITS_OUTPUT_DIR}")
+    print(f"⏱️ {len(images)} images, {num_annotations} annotations in {elapsed:.1f} s "
+          f"({len(images) / elapsed:.0f} images/s; parsing {t_parse - t0:.1f} s, writing {elapsed - (t_parse - t0):.1f} s)")
+
 if __name__ == "__main__":
-    process_annotations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert the COCO annotations to YOLO labels and split files")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the JSON with bounded memory and write files from a process pool")
+    parser.add_argument("--workers", type=int, default=None, help="pool size with --stream (default: all cores)")
+    parser.add_argument("--shards", type=int, default=64,
+                        help="temporary annotation shards with --stream; more shards use less memory per worker")
+    args = parser.parse_args()
+
+    if args.stream:
+        process_annotations_streaming(args.workers, args.shards)
+    else:
+        process_annotations()
\ No newline at end of file
@@ -0,0 +1,414 @@
+"""
+Pre-decoded image cache shared by every K-fold, Optuna and retrain run.
+
+Each image listed in splits/*.txt is decoded and resized once, exactly as
+ultralytics' `load_image` does it (long side to imgsz, aspect ratio kept,
+no padding), and appended to one flat uint8 file. The file is addressed by
+the SHA-1 of the JPEG bytes, so the same picture in several splits is
+stored once. An index maps each image path (with its size and modification
+time) to its pixels. Trainings memory-map the file read-only: concurrent
+runs share one copy in the OS page cache, and JPEG decoding leaves the
+data-loader critical path.
+
+Run from the SYBIL folder, as a module (it imports from post_training/):
+    python -m pre_training.image_cache build --imgsz 640
+    python -m pre_training.image_cache benchmark --data yamls/fold1.yaml --epochs 3 --fraction 0.3
+    python -m pre_training.image_cache check --data yamls/fold1.yaml
+
+Kfold_Optimizer_Code.py then trains with `trainer=CachedDetectionTrainer`.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+from post_training.converting_pt_to_onnx import read_split
+
+ROOT = Path.cwd()  # Assumes they opened the SYBIL folder
+
+# One store per training imgsz lives in CACHE_ROOT/imgsz<N>; SYBIL_IMAGE_CACHE overrides the root
+CACHE_ROOT = Path(os.environ.get("SYBIL_IMAGE_CACHE", ROOT / "cache" / "images"))
+DATA_FILE = "images.u8"
+INDEX_FILE = "index.json"
+
+
+def cache_dir_for(imgsz, cache_root=CACHE_ROOT):
+    return Path(cache_root) / f"imgsz{imgsz}"
+
+
+def path_key(path):
+    """Normalized absolute path used to look images up in the index."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def decode_and_resize(data, imgsz):
+    """
+    Decodes JPEG bytes to BGR and resizes the long side to `imgsz`, like
+    `BaseDataset.load_image(rect_mode=True)` in ultralytics 8.3.65.
+    Returns (image, (h0, w0)).
+    """
+    im = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if im is None:
+        return None, None
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz))
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+    return im, (h0, w0)
+
+
+class ImageCache:
+    """
+    Read side of the store: looks an image path up and returns a view of its
+    pixels in the memory-mapped data file. Paths whose size or modification
+    time changed since the build are treated as missing.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        index = json.loads((self.cache_dir / INDEX_FILE).read_text())
+        self.imgsz = index["imgsz"]
+        self.entries = index["entries"]
+        self.files = index["files"]
+        self._data = None
+
+    @classmethod
+    def open(cls, imgsz, cache_root=CACHE_ROOT):
+        """The store for `imgsz`, or None if it was never built."""
+        cache_dir = cache_dir_for(imgsz, cache_root)
+        return cls(cache_dir) if (cache_dir / INDEX_FILE).exists() else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getstate__(self):
+        # Data-loader workers map the file themselves instead of receiving a copy
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def get(self, path):
+        """Returns (read-only image view, (h0, w0)) for `path`, or None if not cached or stale."""
+        record = self.files.get(path_key(path))
+        if record is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != record["size"] or stat.st_mtime_ns != record["mtime_ns"]:
+            return None
+
+        if self._data is None:
+            self._data = np.memmap(self.cache_dir / DATA_FILE, dtype=np.uint8, mode="r")
+        entry = self.entries[record["key"]]
+        h, w, c = entry["shape"]
+        start = entry["offset"]
+        im = self._data[start:start + h * w * c].reshape(h, w, c)
+        return im, tuple(entry["hw0"])
+
+
+def build_cache(image_paths, imgsz, cache_root=CACHE_ROOT, workers=8):
+    """
+    Adds every image of `image_paths` that is not cached yet (or changed
+    since) to the store for `imgsz`. Existing pixels are never rewritten,
+    so runs already reading the store are not disturbed; the new index
+    replaces the old one atomically at the end.
+
+    Returns
+    -------
+    stats : dict
+        Images seen, decoded, newly stored, unreadable, and the store size.
+    """
+    cache_dir = cache_dir_for(imgsz, cache_root)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index_path = cache_dir / INDEX_FILE
+    if index_path.exists():
+        index = json.loads(index_path.read_text())
+    else:
+        index = {"imgsz": imgsz, "entries": {}, "files": {}}
+
+    todo = []
+    for path in dict.fromkeys(path_key(p) for p in image_paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        record = index["files"].get(path)
+        if record is None or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+            todo.append((path, stat))
+
+    def load(item):
+        path, stat = item
+        with open(path, "rb") as f:
+            data = f.read()
+        key = hashlib.sha1(data).hexdigest()
+        if key in index["entries"]:
+            return path, stat, key, None, None
+        im, hw0 = decode_and_resize(data, imgsz)
+        return path, stat, key, im, hw0
+
+    stats = {"images": len(image_paths), "decoded": 0, "stored": 0, "unreadable": 0}
+    data_path = cache_dir / DATA_FILE
+    # Decoding runs on a thread pool (OpenCV releases the GIL); chunks bound the decoded images held at once
+    chunk = workers * 8
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(data_path, "ab") as data_file:
+        offset = data_file.tell()
+        for start in range(0, len(todo), chunk):
+            for path, stat, key, im, hw0 in pool.map(load, todo[start:start + chunk]):
+                if im is not None:
+                    stats["decoded"] += 1
+                    if key not in index["entries"]:
+                        im = np.ascontiguousarray(im)
+                        data_file.write(im.tobytes())
+                        index["entries"][key] = {"offset": offset, "shape": list(im.shape), "hw0": list(hw0)}
+                        offset += im.nbytes
+                        stats["stored"] += 1
+                elif key not in index["entries"]:
+                    stats["unreadable"] += 1
+                    continue
+                index["files"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "key": key}
+        data_file.flush()
+        os.fsync(data_file.fileno())
+
+    tmp_path = index_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(index))
+    os.replace(tmp_path, index_path)
+
+    stats["cached"] = len(index["entries"])
+    stats["size_MB"] = data_path.stat().st_size / (1024 ** 2)
+    return stats
+
+
+class CachedYOLODataset(YOLODataset):
+    """`YOLODataset` that reads pre-decoded images from an `ImageCache` when it has them."""
+
+    def __init__(self, *args, image_cache=None, **kwargs):
+        self.image_cache = image_cache
+        self.cache_hits = 0
+        super().__init__(*args, **kwargs)
+
+    def load_image(self, i, rect_mode=True):
+        # Images already held in RAM (buffer or cache="ram") are served by the parent
+        if self.ims[i] is None and rect_mode and self.image_cache is not None:
+            hit = self.image_cache.get(self.im_files[i])
+            if hit is not None:
+                self.cache_hits += 1
+                # Copied: augmentations may write into the image
+                im, hw0 = np.array(hit[0]), hit[1]
+                # Same buffer bookkeeping as BaseDataset.load_image (8.3.65): Mosaic and
+                # MixUp draw their partner images from self.buffer
+                if self.augment:
+                    self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, im.shape[:2]
+                    self.buffer.append(i)
+                    if 1 < len(self.buffer) >= self.max_buffer_length:  # prevent empty buffer
+                        j = self.buffer.pop(0)
+                        if self.cache != "ram":
+                            self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+                return im, hw0, im.shape[:2]
+        return super().load_image(i, rect_mode)
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """
+    Detection trainer whose train and val datasets read from the image
+    cache for the run's imgsz. Without a cache it trains exactly like
+    `DetectionTrainer`. Pass it as `YOLO(...).train(trainer=CachedDetectionTrainer, ...)`.
+    """
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        image_cache = ImageCache.open(self.args.imgsz)
+        if image_cache is None:
+            print(f"⚠️ No image cache for imgsz={self.args.imgsz} in {CACHE_ROOT}; decoding JPEGs. "
+                  f"Build it with: python -m pre_training.image_cache build --imgsz {self.args.imgsz}")
+            return super().build_dataset(img_path, mode, batch)
+
+        # Same arguments as ultralytics' build_yolo_dataset (8.3.65)
+        cfg = self.args
+        stride = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return CachedYOLODataset(
+            img_path=img_path,
+            imgsz=cfg.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=cfg,
+            rect=cfg.rect or mode == "val",
+            cache=cfg.cache or None,
+            single_cls=cfg.single_cls or False,
+            stride=int(stride),
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=cfg.task,
+            classes=cfg.classes,
+            data=self.data,
+            fraction=cfg.fraction if mode == "train" else 1.0,
+            image_cache=image_cache,
+        )
+
+
+def benchmark_loading(image_paths, imgsz):
+    """Mean ms per image to load from JPEG (as ultralytics does) and from the cache."""
+    from ultralytics.utils.patches import imread
+
+    image_cache = ImageCache.open(imgsz)
+    if image_cache is None:
+        raise FileNotFoundError(f"No image cache for imgsz={imgsz}; run: python -m pre_training.image_cache build")
+    t0 = time.perf_counter()
+    for path in image_paths:
+        im = imread(str(path))
+        h0, w0 = im.shape[:2]
+        r = imgsz / max(h0, w0)
+        if r != 1:
+            cv2.resize(im, (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)),
+                       interpolation=cv2.INTER_LINEAR)
+    t1 = time.perf_counter()
+    misses = 0
+    for path in image_paths:
+        hit = image_cache.get(path)
+        if hit is None:
+            misses += 1
+        else:
+            np.array(hit[0])
+    t2 = time.perf_counter()
+    n = len(image_paths)
+    return {"jpeg_ms": (t1 - t0) * 1000 / n, "cache_ms": (t2 - t1) * 1000 / n, "misses": misses}
+
+
+def check_mosaic_batch(data, model_name, imgsz, batch):
+    """
+    Trains one step on a mosaic batch read from the cache: builds the train
+    dataset as training does (augmentations on, mosaic=1.0), collates `batch`
+    samples and back-propagates the detection loss once.
+
+    Returns
+    -------
+    stats : dict
+        Dataset images, those missing from the cache, cache hits, the batch
+        shape and the loss.
+    """
+    from ultralytics import YOLO
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data.utils import check_det_dataset
+    from ultralytics.utils import DEFAULT_CFG
+
+    image_cache = ImageCache.open(imgsz)
+    if image_cache is None:
+        raise FileNotFoundError(f"No image cache for imgsz={imgsz}; run: python -m pre_training.image_cache build")
+    cfg = get_cfg(DEFAULT_CFG, {"imgsz": imgsz, "mosaic": 1.0})
+    data_dict = check_det_dataset(data)
+    dataset = CachedYOLODataset(img_path=data_dict["train"], imgsz=imgsz, batch_size=batch, augment=True, hyp=cfg,
+                                rect=False, stride=32, pad=0.0, prefix=colorstr("check: "), task="detect",
+                                data=data_dict, image_cache=image_cache)
+    uncached = sum(image_cache.get(path) is None for path in dataset.im_files)
+    batch_dict = CachedYOLODataset.collate_fn([dataset[i] for i in range(min(batch, len(dataset)))])
+
+    model = YOLO(model_name).model
+    model.args = cfg
+    model.train()
+    for p in model.parameters():
+        p.requires_grad = True
+    batch_dict["img"] = batch_dict["img"].float() / 255
+    loss, _ = model.loss(batch_dict)
+    loss.sum().backward()
+    return {"images": len(dataset.im_files), "uncached": uncached, "hits": dataset.cache_hits, "shape": list(batch_dict["img"].shape),
+            "loss": float(loss.sum())}
+
+
+def benchmark_epochs(data, model_name, epochs, fraction, imgsz, batch, device, workers):
+    """Trains twice (JPEG decoding, then the cache) and returns the mean epoch time of each."""
+    from ultralytics import YOLO
+
+    results = {}
+    for name, trainer in (("jpeg", None), ("cache", CachedDetectionTrainer)):
+        epoch_times = []
+        starts = {}
+        model = YOLO(model_name)
+        model.add_callback("on_train_epoch_start", lambda t: starts.update(epoch=time.perf_counter()))
+        model.add_callback("on_train_epoch_end", lambda t: epoch_times.append(time.perf_counter() - starts["epoch"]))
+        model.train(data=data, imgsz=imgsz, epochs=epochs, batch=batch, device=device, workers=workers,
+                    fraction=fraction, trainer=trainer, project="runs/image_cache_benchmark", name=name,
+                    exist_ok=True, plots=False, val=False, verbose=False)
+        # The first epoch also warms the page cache; compare the steady state when there is one
+        steady = epoch_times[1:] or epoch_times
+        results[name] = sum(steady) / len(steady)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or benchmark the shared pre-decoded image cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="decode every image listed in the split files into the cache")
+    build.add_argument("--imgsz", type=int, default=640, help="training image size the cache is built for")
+    build.add_argument("--splits", nargs="+", default=None, help="split files (default: splits/*.txt)")
+    build.add_argument("--workers", type=int, default=os.cpu_count(), help="decoding threads")
+
+    bench = sub.add_parser("benchmark", help="compare JPEG decoding with the cache, per image and per epoch")
+    bench.add_argument("--data", default=str(ROOT / "yamls" / "fold1.yaml"))
+    bench.add_argument("--split", default=str(ROOT / "splits" / "train_fold-1.txt"),
+                       help="images timed by the loading benchmark")
+    bench.add_argument("--imgsz", type=int, default=640)
+    bench.add_argument("--epochs", type=int, default=0, help="also train this many epochs each way (0 = loading only)")
+    bench.add_argument("--model", default="yolov8n.pt")
+    bench.add_argument("--fraction", type=float, default=0.3)
+    bench.add_argument("--batch", type=int, default=16)
+    bench.add_argument("--device", default="0")
+    bench.add_argument("--workers", type=int, default=8, help="data-loader workers")
+
+    check = sub.add_parser("check", help="train one step on a mosaic batch read from the cache")
+    check.add_argument("--data", default=str(ROOT / "yamls" / "fold1.yaml"))
+    check.add_argument("--imgsz", type=int, default=640)
+    check.add_argument("--model", default="yolov8n.pt")
+    check.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        split_files = args.splits or sorted(str(p) for p in (ROOT / "splits").glob("*.txt"))
+        paths = [p for split in split_files for p in read_split(split, ROOT / "images")]
+        print(f"🔁 Caching {len(paths)} split entries at imgsz={args.imgsz} into {cache_dir_for(args.imgsz)}...")
+        t0 = time.perf_counter()
+        stats = build_cache(paths, args.imgsz, workers=args.workers)
+        elapsed = time.perf_counter() - t0
+        print(f"✅ {stats['cached']} unique images cached ({stats['size_MB']:.0f} MB): {stats['decoded']} decoded, "
+              f"{stats['stored']} stored, {stats['unreadable']} unreadable, in {elapsed:.1f} s")
+        return
+
+    if args.command == "check":
+        stats = check_mosaic_batch(args.data, args.model, args.imgsz, args.batch)
+        print(f"✅ Mosaic batch {stats['shape']} trained one step (loss {stats['loss']:.3f}); "
+              f"{stats['hits']} images read from the cache")
+        if stats["uncached"]:
+            print(f"⚠️ {stats['uncached']}/{stats['images']} images are not cached, so the fully cached path "
+                  f"was only partly checked; rebuild the cache and rerun.")
+        return
+
+    paths = read_split(args.split, ROOT / "images")
+    loading = benchmark_loading(paths, args.imgsz)
+    saved_s = (loading["jpeg_ms"] - loading["cache_ms"]) * len(paths) / 1000
+    print(f"\n📏 Image loading over {len(paths)} images ({loading['misses']} not cached):")
+    print(f"  JPEG decode + resize: {loading['jpeg_ms']:.2f} ms/image")
+    print(f"  Cache read:           {loading['cache_ms']:.2f} ms/image")
+    print(f"  Saved per epoch on this split: {saved_s:.1f} s of loader work (spread over the data-loader workers)")
+
+    if args.epochs:
+        epochs = benchmark_epochs(args.data, args.model, args.epochs, args.fraction, args.imgsz,
+                                  args.batch, args.device, args.workers)
+        print(f"\n⏱️ Mean epoch time: JPEG {epochs['jpeg']:.1f} s, cache {epochs['cache']:.1f} s "
+              f"({1 - epochs['cache'] / epochs['jpeg']:.1%} saved)")
+
+
+if __name__ == "__main__":
+    main()